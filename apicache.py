@@ -0,0 +1,165 @@
+# TTL cache with request coalescing for the swagger-driven API calls
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# Seconds a response stays fresh, per swagger operationId
+DEFAULT_TTLS = {
+    "getWeatherNow": 5 * 60,
+    "getWeatherForecast": 30 * 60,
+}
+
+# Parameters that do not change the response, left out of the cache key
+IGNORED_PARAMS = ("key",)
+
+
+def normalize_value(value):
+    # "  New   York" and "new york" ask for the same city
+    return " ".join(str(value).split()).lower()
+
+
+class APIResponseCache:
+    """
+    Caches API responses by operation and normalized query parameters, with
+    a TTL per operation. Concurrent lookups of the same key while it is being
+    fetched wait for that one upstream call instead of making their own.
+    Only responses accepted by `cacheable` are stored.
+    """
+
+    def __init__(self, ttls=None, default_ttl=5 * 60, max_entries=1024, cacheable=None):
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.cacheable = cacheable or (lambda response: "error" not in response)
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> (response, expiry time), in LRU order
+        self.in_flight = {}  # key -> Future of the running sync fetch
+        self.in_flight_async = {}  # key -> Task of the running async fetch
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def make_key(self, operation_id, parameters):
+        params = tuple(sorted(
+            (name, normalize_value(value))
+            for name, value in parameters.items()
+            if name not in IGNORED_PARAMS
+        ))
+        return operation_id, params
+
+    def ttl(self, operation_id):
+        return self.ttls.get(operation_id, self.default_ttl)
+
+    def get(self, key):
+        """
+        Return the fresh cached response for the key, or None.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            response, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return response
+
+    def put(self, key, response):
+        if not self.cacheable(response):
+            return
+        with self.lock:
+            self.entries[key] = (response, time.monotonic() + self.ttl(key[0]))
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def fetch(self, operation_id, parameters, fetcher):
+        """
+        Return the cached response, or call `fetcher()` once for all
+        concurrent callers of the same key and cache its result.
+        """
+        key = self.make_key(operation_id, parameters)
+        response = self.get(key)
+        if response is not None:
+            with self.lock:
+                self.hits += 1
+            return response
+
+        with self.lock:
+            future = self.in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self.in_flight[key] = Future()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+
+        try:
+            response = fetcher()
+            self.put(key, response)
+            future.set_result(response)
+            return response
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+
+    async def afetch(self, operation_id, parameters, fetcher):
+        """
+        Async variant of fetch; `fetcher` is a coroutine function.
+        """
+        key = self.make_key(operation_id, parameters)
+        response = self.get(key)
+        if response is not None:
+            with self.lock:
+                self.hits += 1
+            return response
+
+        task = self.in_flight_async.get(key)
+        if task is not None:
+            with self.lock:
+                self.coalesced += 1
+            # Shielded, so one cancelled caller does not cancel the others
+            return await asyncio.shield(task)
+
+        with self.lock:
+            self.misses += 1
+
+        async def fetch_and_store():
+            try:
+                response = await fetcher()
+                self.put(key, response)
+                return response
+            finally:
+                del self.in_flight_async[key]
+
+        task = self.in_flight_async[key] = asyncio.ensure_future(fetch_and_store())
+        return await asyncio.shield(task)
+
+    def invalidate(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        """
+        Hit/miss counters, lookups served by another caller's fetch, and the
+        current size of the cache.
+        """
+        with self.lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+                "upstream_calls": self.misses,
+                "size": len(self.entries),
+            }
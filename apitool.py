@@ -1,29 +1,31 @@
-import spacy
-import yaml
-import requests
 import os
+import re
 from dotenv import load_dotenv
-from spacy.cli import download  # Import for downloading spaCy models if not installed
+from modelregistry import get_entity_extractor, get_operation_index
+from asyncrunner import run_cpu, ask_console
+from apicache import APIResponseCache
+from httpclient import APIClient
+from specindex import SPEC_DIR
+from tracing import span
 
 # Load environment variables from .env file
 load_dotenv()
 
 class APITool:
-    def __init__(self):
-        # Check if the model is already installed
-        try:
-            print("Model 'en_core_web_sm' is already loaded!")
-            self.nlp = spacy.load("en_core_web_sm")
-        except OSError:
-            # If not, download the model
-            print("Model 'en_core_web_sm' not found. Downloading now...")
-            download("en_core_web_sm")
-            self.nlp = spacy.load("en_core_web_sm")
-        
-        # Load Swagger specification from the local YAML file
-        with open("swagger_specs/weather.yaml", "r") as file:
-            self.swagger_spec = yaml.safe_load(file)
-            self.base_url = self.swagger_spec['servers'][0]['url']  # Extract base URL
+    def __init__(self, base_url=None, cache_ttls=None, spec_dir=SPEC_DIR):
+        """
+        Parameters:
+            base_url (str): API base URL for every spec, overriding the swagger `servers`
+                entries and the <SPEC>_API_BASE_URL environment variables (e.g. a local stub server).
+            cache_ttls (dict): Seconds responses stay cached, per operationId.
+            spec_dir (str): Folder with the swagger specs.
+        """
+        # Shared NER-only spaCy pipeline, downloaded on first use if not installed
+        self.entity_extractor = get_entity_extractor("en_core_web_sm")
+
+        # Operations of every swagger spec, parsed once per process
+        self.operation_index = get_operation_index(spec_dir)
+        self.base_url = base_url
 
         # Load the API key from environment variables
         self.api_key = os.getenv("API_KEY")
@@ -31,6 +33,12 @@ class APITool:
             print("Error: API key is not set in the .env file")
             exit(1)
 
+        # Pooled, retrying clients with a circuit breaker, one per API base URL
+        self.http_clients = {}
+
+        # Responses shared between users asking about the same place
+        self.response_cache = APIResponseCache(ttls=cache_ttls)
+
     def extract_intent(self, user_message):
         """
         Use keyword matching to extract the intent from the user's message.
@@ -46,61 +54,156 @@ class APITool:
         
         return None
     
-    def get_api_endpoint(self, intent):
+    def select_operation(self, user_message):
         """
-        Extract the API endpoint from Swagger JSON based on the user's intent.
-        For simplicity, we assume 'weather' intent will be matched with the '/v1/current' endpoint.
+        Pick the GET operation, across all specs, whose summary best matches
+        the user's message (e.g. the forecast rather than the current weather).
+
+        Returns:
+            dict: The operation from the operation index, or None.
         """
-        if intent == "weather":
-            # Extract weather-related API path from Swagger documentation
-            for path, details in self.swagger_spec['paths'].items():
-                if "get" in details:
-                    # if "weather" in details['summary'].lower():
-                    return path, details['get']
-        return None, None
+        with span("operation_selection") as stage:
+            results = self.operation_index.search(user_message, k=1, method="get")
+            if not results:
+                stage.fail("no matching operation")
+                return None
+            score, operation = results[0]
+            stage.set("operation", operation["operation_id"])
+            stage.set("score", round(float(score), 4))
+        return operation
+
+    def get_base_url(self, operation):
+        return self.base_url or os.getenv(f"{operation['spec'].upper()}_API_BASE_URL") or operation["base_url"]
+
+    def get_http_client(self, operation):
+        base_url = self.get_base_url(operation)
+        client = self.http_clients.get(base_url)
+        if client is None:
+            client = self.http_clients[base_url] = APIClient(base_url)
+        return client
     
     def get_parameters(self, endpoint_details, user_message):
         """
         Extract the parameters required for the API request from the Swagger documentation.
         Attempts to fill in parameters automatically from user input and .env file.
         """
-        doc = self.nlp(user_message.lower())
+        parameters, missing = self.fill_parameters(endpoint_details, user_message)
+        for param_name, param_in in missing:
+            parameters[param_name] = input(f"Please provide the value for {param_name} ({param_in}): ")
+        return parameters
+
+    async def aget_parameters(self, endpoint_details, user_message, ask=ask_console):
+        """
+        Async variant of get_parameters. NER runs in the CPU pool and missing
+        values are asked for through the `ask` coroutine.
+        """
+        parameters, missing = await run_cpu(self.fill_parameters, endpoint_details, user_message)
+        for param_name, param_in in missing:
+            parameters[param_name] = await ask(f"Please provide the value for {param_name} ({param_in}): ")
+        return parameters
+
+    def fill_parameters(self, endpoint_details, user_message):
+        """
+        Fill in the parameters that can be taken from the .env file or the user's message.
+
+        Returns:
+            tuple: (parameters, missing), where missing lists the (name, location)
+                of the parameters the user still has to provide.
+        """
         parameters = {}
+        missing = []
 
-        if "parameters" in endpoint_details:
-            for param in endpoint_details["parameters"]:
+        with span("parameter_fill") as stage:
+            for param in endpoint_details.get("parameters", []):
                 param_name = param["name"]
                 param_in = param["in"]
 
+                schema = param.get("schema", {})
+                # A count in the message, e.g. "3 days" for the forecast's `days`
+                count = re.search(rf"(\d+)\s*{re.escape(param_name)}", user_message, re.IGNORECASE)
+
                 # First priority: auto-fill from environment variables or user message
                 if param_name == "key" and self.api_key:  # For the API key
                     parameters[param_name] = self.api_key
                 elif param_name == "q":  # For location
-                    location = next((ent.text for ent in doc.ents if ent.label_ == "GPE"), None)
+                    location = self.entity_extractor.first_entity(user_message.lower(), "GPE")
                     if location:
-                        print(f"location detected: {location}")
+                        stage.set("location", location)
                         parameters[param_name] = location
                     else:
-                        value = input(f"Please provide the value for {param_name} ({param_in}): ")
-                        parameters[param_name] = value    
+                        missing.append((param_name, param_in))
+                elif schema.get("type") == "integer" and count:
+                    parameters[param_name] = int(count.group(1))
+                elif "default" in schema:
+                    parameters[param_name] = schema["default"]
+                elif param.get("required"):
+                    missing.append((param_name, param_in))
+            # The key is left out, traces are written to a file
+            stage.set("filled", sorted(name for name in parameters if name != "key"))
+            stage.set("missing", [name for name, _ in missing])
 
-        return parameters
-    def make_api_request(self, endpoint, parameters):
+        return parameters, missing
+
+    def make_api_request(self, operation, parameters):
         """
-        Make an API request to the weather API using the endpoint and parameters extracted.
+        Make an API request for the selected operation with the parameters extracted.
         """
-        url = f"{self.base_url}{endpoint}"
-
         # Add the API key to the parameters
         parameters["key"] = self.api_key
 
-        response = requests.get(url, params=parameters)
+        return self.response_cache.fetch(operation["operation_id"], parameters, lambda: self.request_json(operation, parameters))
+
+    def request_json(self, operation, parameters):
+        """
+        Call the API, bypassing the response cache.
+        """
+        with span("http_request", operation=operation["operation_id"]) as stage:
+            try:
+                response = self.get_http_client(operation).get(operation["path"], params=parameters, operation_id=operation["operation_id"])
+            except Exception as e:
+                print(f"Weather API request failed: {e}")
+                stage.fail(e)
+                return {"error": "Could not fetch weather data."}
+            stage.set("status", response.status_code)
+            if response.status_code >= 400:
+                stage.fail(f"HTTP {response.status_code}")
         
         if response.status_code == 200:
             return response.json()
         else:
             return {"error": "Could not fetch weather data."}
 
+    async def amake_api_request(self, operation, parameters):
+        """
+        Async variant of make_api_request.
+        """
+        parameters["key"] = self.api_key
+
+        return await self.response_cache.afetch(operation["operation_id"], parameters, lambda: self.arequest_json(operation, parameters))
+
+    async def arequest_json(self, operation, parameters):
+        """
+        Async variant of request_json.
+        """
+        with span("http_request", operation=operation["operation_id"]) as stage:
+            try:
+                response = await self.get_http_client(operation).aget(operation["path"], params=parameters, operation_id=operation["operation_id"])
+            except Exception as e:
+                stage.fail(e)
+                return {"error": "Could not fetch weather data."}
+            stage.set("status", response.status_code)
+            if response.status_code >= 400:
+                stage.fail(f"HTTP {response.status_code}")
+
+        if response.status_code == 200:
+            return response.json()
+        else:
+            return {"error": "Could not fetch weather data."}
+
+    async def aclose(self):
+        for client in self.http_clients.values():
+            await client.aclose()
+
     def format_weather_response(self, weather_data):
         """
         Format the JSON weather data into a natural language message.
@@ -114,29 +217,38 @@ class APITool:
             humidity = weather_data["current"]["humidity"]
             wind_kph = weather_data["current"]["wind_kph"]
 
-            return (
+            response = (
                 f"The current weather in {location}, {region}, {country} is {temp_c}°C with {condition} condition. "
                 f"Humidity is at {humidity}% and wind speed is {wind_kph} kph."
             )
+            for forecast_day in weather_data.get("forecast", {}).get("forecastday", []):
+                day = forecast_day["day"]
+                response += (
+                    f"\n{forecast_day.get('date', 'Forecast')}: {day['condition']['text']}, "
+                    f"{day['mintemp_c']}°C to {day['maxtemp_c']}°C."
+                )
+            return response
         else:
             return "Sorry, I couldn't retrieve weather information at the moment."
 
-    def process_request(self, user_message):
+    def process_request(self, user_message, intent=None):
         """
         Process the user's message, extract intent, query API, and return response.
+        `intent` is the already classified intent; without it the message is checked here.
         """
-        intent = self.extract_intent(user_message)
+        if intent is None:
+            intent = self.extract_intent(user_message)
         
         if intent == "weather":
-            # Get the appropriate API endpoint and details
-            endpoint, endpoint_details = self.get_api_endpoint(intent)
+            # Get the API operation that matches the message
+            operation = self.select_operation(user_message)
             
-            if endpoint:
+            if operation:
                 # Get the required parameters from the user
-                parameters = self.get_parameters(endpoint_details, user_message)
+                parameters = self.get_parameters(operation, user_message)
                 
                 # Make the API request and get the data
-                weather_data = self.make_api_request(endpoint, parameters)
+                weather_data = self.make_api_request(operation, parameters)
                 
                 if "error" in weather_data:
                     print("Error: Could not fetch weather data.")
@@ -150,6 +262,28 @@ class APITool:
             
         return "continue"    
 
+    async def aprocess_request(self, user_message, intent=None, ask=ask_console):
+        """
+        Async variant of process_request.
+
+        Returns:
+            str: The response to show the user.
+        """
+        if intent is None:
+            intent = self.extract_intent(user_message)
+        if intent != "weather":
+            return "Sorry, I couldn't understand your request."
+
+        operation = await run_cpu(self.select_operation, user_message)
+        if not operation:
+            return "Sorry, I couldn't find a weather API to process this request."
+
+        parameters = await self.aget_parameters(operation, user_message, ask)
+        weather_data = await self.amake_api_request(operation, parameters)
+        if "error" in weather_data:
+            return "Error: Could not fetch weather data."
+        return self.format_weather_response(weather_data)
+
 if __name__ == "__main__":
     api_tool = APITool()
     
@@ -0,0 +1,42 @@
+# Executors for the blocking parts of the async conversation engine
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+_cpu_executor = None
+_executor_lock = threading.Lock()
+
+
+def cpu_executor():
+    """
+    Thread pool for embedding and NER. Both spend their time in native code
+    that releases the GIL, so threads keep them off the event loop without
+    copying the models into worker processes.
+    """
+    global _cpu_executor
+    if _cpu_executor is None:
+        with _executor_lock:
+            if _cpu_executor is None:
+                _cpu_executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="cpu")
+    return _cpu_executor
+
+
+async def run_cpu(func, *args, **kwargs):
+    """
+    Run a CPU-heavy call (embedding, NER, FAISS search) in the CPU pool.
+    The caller's context variables (e.g. the request's trace) are kept.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(cpu_executor(), functools.partial(context.run, func, *args, **kwargs))
+
+
+async def ask_console(prompt):
+    """
+    Default `ask` of the async entry points: read the answer from stdin
+    without blocking the event loop. Servers pass their own coroutine.
+    """
+    return await asyncio.to_thread(input, prompt)
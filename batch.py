@@ -0,0 +1,248 @@
+# Answer a JSONL file of queued questions without a user at the console
+#
+#   python batch.py queries.jsonl -o answers.jsonl --workers 16
+#   python batch.py queries.jsonl -o answers.jsonl --resume    # skip items already answered
+#
+# Every input line is a JSON object such as {"id": "q1", "query": "What is Cassandra?"}
+# ("message" or "text" work too, as does a bare JSON string). An "intent" field
+# skips routing. Each line is routed like a chat turn and answered by the RAG,
+# generic or weather tool; email and meeting requests need follow-up questions
+# and are written back as skipped. Results are written as they finish, one
+# JSON line per input line, so the output order follows completion.
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+from chatbot import Chatbot
+from stats import percentile
+from tracing import count, trace
+
+QUERY_FIELDS = ("query", "message", "text")
+# Intents whose tools cannot finish without asking the user
+INTERACTIVE_INTENTS = ("send_email", "schedule_meeting")
+PROGRESS_EVERY = 100
+
+
+class InputRequired(Exception):
+    """
+    A tool asked a follow-up question that a batch has nobody to answer.
+    """
+
+
+async def no_input(prompt):
+    # The `ask` of batch items: fail the item instead of waiting on stdin
+    raise InputRequired(prompt.strip())
+
+
+def parse_line(line_number, line):
+    """
+    Turn one input line into an item.
+
+    Returns:
+        dict: The item, with its "id" (the line number when the line has none)
+            and "query". Raises ValueError for lines that hold no query.
+    """
+    data = json.loads(line)
+    if isinstance(data, str):
+        data = {"query": data}
+    if not isinstance(data, dict):
+        raise ValueError("expected a JSON object or string")
+    query = next((data[field] for field in QUERY_FIELDS if isinstance(data.get(field), str)), None)
+    if not query or not query.strip():
+        raise ValueError(f"no {', '.join(QUERY_FIELDS)} field")
+    return {"id": data.get("id", line_number), "line": line_number, "query": query.strip(), "intent": data.get("intent")}
+
+
+def read_done(output_path):
+    """
+    What an earlier run already wrote to `output_path`, so --resume can skip
+    it. Items that failed or timed out are run again.
+
+    Returns:
+        tuple: (ids of the answered items, line numbers of the input lines
+            reported as invalid, which have no id of their own)
+    """
+    done, invalid_lines = set(), set()
+    try:
+        with open(output_path) as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    continue  # A line cut short when the earlier run was stopped
+                if result.get("status") == "invalid":
+                    invalid_lines.add(result.get("line"))
+                elif result.get("status") not in ("error", "timeout"):
+                    done.add(json.dumps(result.get("id")))
+    except FileNotFoundError:
+        pass
+    return done, invalid_lines
+
+
+class BatchRunner:
+    """
+    Streams items from an input file through a fixed number of workers.
+    The queue between the reader and the workers is bounded, so a file of
+    any size is read only as fast as it is answered.
+    """
+
+    def __init__(self, chatbot=None, workers=8, timeout=None):
+        self.chatbot = chatbot or Chatbot()
+        self.workers = workers
+        self.timeout = timeout
+        self.statuses = Counter()
+        self.intents = Counter()
+        self.latencies_ms = []
+        self.start_time = None
+
+    async def answer(self, item):
+        """
+        Route one item and run its tool.
+
+        Returns:
+            dict: The result line for the item.
+        """
+        result = {"id": item["id"], "query": item["query"]}
+        start_time = time.perf_counter()
+        with trace("batch_item") as item_span:
+            try:
+                intent, confidence = item["intent"], None
+                if not intent:
+                    intent, confidence = await self.chatbot.aextract_intent(item["query"])
+                route_time = time.perf_counter()
+                result["intent"] = intent
+                if confidence is not None:
+                    result["confidence"] = round(float(confidence), 4)
+                item_span.set("intent", intent)
+                result["timings_ms"] = {"route": round((route_time - start_time) * 1000, 3)}
+
+                if intent in INTERACTIVE_INTENTS:
+                    result["status"] = "skipped"
+                    result["error"] = "needs a conversation"
+                else:
+                    try:
+                        reply = await asyncio.wait_for(self.chatbot.arespond(item["query"], intent, ask=no_input), self.timeout)
+                        result["status"] = "ok"
+                        result["reply"] = reply
+                    except InputRequired as e:
+                        result["status"] = "needs_input"
+                        result["error"] = str(e)
+                    except asyncio.TimeoutError:
+                        result["status"] = "timeout"
+                        item_span.fail("timeout")
+                    result["timings_ms"]["tool"] = round((time.perf_counter() - route_time) * 1000, 3)
+            except Exception as e:
+                result["status"] = "error"
+                result["error"] = f"{type(e).__name__}: {e}"
+                item_span.fail(result["error"])
+
+        total_ms = (time.perf_counter() - start_time) * 1000
+        result.setdefault("timings_ms", {})["total"] = round(total_ms, 3)
+        self.latencies_ms.append(total_ms)
+        self.statuses[result["status"]] += 1
+        self.intents[result.get("intent")] += 1
+        count("batch_items_total", status=result["status"])
+        return result
+
+    async def worker(self, queue, output):
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            if "error" in item:
+                result = item  # A line that could not be parsed
+                self.statuses[result["status"]] += 1
+            else:
+                queued_ms = (time.perf_counter() - item.pop("queued_at")) * 1000
+                result = await self.answer(item)
+                result["timings_ms"]["queued"] = round(queued_ms, 3)
+            output.write(json.dumps(result, default=str) + "\n")
+            output.flush()
+            completed = sum(self.statuses.values())
+            if completed % PROGRESS_EVERY == 0:
+                elapsed = time.perf_counter() - self.start_time
+                print(f"{completed} items, {completed / elapsed:.1f}/s", file=sys.stderr)
+
+    async def run(self, input_path, output, skip_ids=(), skip_lines=()):
+        """
+        Answer every item of `input_path` and write the results to the
+        open file `output`, leaving out the items whose id is in `skip_ids`
+        and the invalid lines whose number is in `skip_lines`.
+        """
+        self.start_time = time.perf_counter()
+        # The router is needed by every item, so build it before the workers start
+        await self.chatbot.aget_tool("intent_router")
+
+        queue = asyncio.Queue(maxsize=self.workers * 2)
+        workers = [asyncio.create_task(self.worker(queue, output)) for _ in range(self.workers)]
+        try:
+            with open(input_path) as f:
+                for line_number, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        item = parse_line(line_number, line)
+                    except ValueError as e:
+                        if line_number in skip_lines:
+                            continue
+                        item = {"id": line_number, "line": line_number, "status": "invalid", "error": str(e)}
+                    else:
+                        if json.dumps(item["id"]) in skip_ids:
+                            continue
+                        item["queued_at"] = time.perf_counter()
+                    await queue.put(item)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+            await self.chatbot.aclose()
+        return time.perf_counter() - self.start_time
+
+    def summary(self, seconds):
+        completed = sum(self.statuses.values())
+        lines = [f"{completed} items in {seconds:.1f} s ({completed / seconds if seconds else 0:.1f} items/s)"]
+        lines.append("status: " + ", ".join(f"{status} {n}" for status, n in self.statuses.most_common()))
+        lines.append("intent: " + ", ".join(f"{intent} {n}" for intent, n in self.intents.most_common()))
+        if self.latencies_ms:
+            lines.append(
+                f"latency: p50 {percentile(self.latencies_ms, 0.5):.1f} ms, p95 {percentile(self.latencies_ms, 0.95):.1f} ms, "
+                f"max {max(self.latencies_ms):.1f} ms"
+            )
+        return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of queries without a user at the console")
+    parser.add_argument("input", help="JSONL file of queries")
+    parser.add_argument("-o", "--output", help="JSONL file for the results (default: <input>.results.jsonl)")
+    parser.add_argument("--workers", type=int, default=8, help="Items answered at the same time")
+    parser.add_argument("--timeout", type=float, help="Seconds an item's tool may take before it is given up")
+    parser.add_argument("--resume", action="store_true", help="Append to the output and skip the items already in it")
+    parser.add_argument("--verbose", action="store_true", help="Show the tools' output")
+    args = parser.parse_args()
+
+    output_path = args.output or args.input.rsplit(".", 1)[0] + ".results.jsonl"
+    skip_ids, skip_lines = read_done(output_path) if args.resume else (set(), set())
+    if skip_ids or skip_lines:
+        print(f"Skipping {len(skip_ids)} items and {len(skip_lines)} invalid lines already in {output_path}")
+
+    runner = BatchRunner(workers=args.workers, timeout=args.timeout)
+    with contextlib.ExitStack() as stack:
+        output = stack.enter_context(open(output_path, "a" if args.resume else "w"))
+        if not args.verbose:
+            # Not a StringIO: a night's worth of tool output would pile up in memory
+            stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, "w"))))
+        seconds = asyncio.run(runner.run(args.input, output, skip_ids, skip_lines))
+    print(runner.summary(seconds))
+    print(f"Results written to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
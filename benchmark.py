@@ -0,0 +1,334 @@
+# Latency and throughput of the chatbot's tools on fixed query sets, runnable
+# offline against the local stubs so results are comparable across commits
+#
+#   python benchmark.py                         # all suites, stub LLM
+#   python benchmark.py --suites rag generic --concurrency 1 8
+#   python benchmark.py --llm ollama            # a real Ollama server
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from benchmark_queries import QUERY_SETS
+from stats import percentile
+from stubservers import ollama_stub, smtp_stub, weather_stub
+
+RESULTS_DIR = "benchmark_results"
+
+
+class StageTimer:
+    """
+    Milliseconds spent in each stage of one request.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.last_time = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.stages[stage] = (now - self.last_time) * 1000
+        self.last_time = now
+
+
+# Each setup function builds a tool and returns the function that answers
+# one query and returns its stage timings
+
+def setup_generic(args):
+    from generictool import GenericTool
+
+    tool = GenericTool()  # No embedding model, so no response cache
+
+    def run(query):
+        timer = StageTimer()
+        tool.get_response(query)
+        timer.lap("llm")
+        return timer.stages
+
+    return run
+
+
+def setup_rag(args):
+    from ragtool import RAGTool
+
+    tool = RAGTool(response_cache=args.cache, context_budget=args.context_budget)
+
+    def run(query):
+        timer = StageTimer()
+        _, answer, context = tool.prepare_response(query)
+        timer.lap("retrieve")
+        if answer is None:
+            tool.chain.invoke({"question": query, "context": context})
+            timer.lap("llm")
+        return timer.stages
+
+    return run
+
+
+def setup_routing(args):
+    from modelregistry import get_intent_router
+
+    router = get_intent_router()
+
+    def run(query):
+        timer = StageTimer()
+        embedding = router.encode(query)
+        timer.lap("encode")
+        router.classify(query, embedding=embedding)
+        timer.lap("classify")
+        return timer.stages
+
+    return run
+
+
+def setup_ner(args):
+    from modelregistry import get_entity_extractor
+
+    extractor = get_entity_extractor()
+    entities = extractor.entities if args.cache else extractor._entities
+
+    def run(query):
+        timer = StageTimer()
+        entities(query)
+        timer.lap("ner")
+        return timer.stages
+
+    return run
+
+
+def setup_api(args):
+    from apicache import APIResponseCache
+    from apitool import APITool
+
+    tool = APITool(base_url=args.weather_url)
+    if not args.cache:
+        tool.response_cache = APIResponseCache(ttls={}, default_ttl=0)
+
+    def run(query):
+        timer = StageTimer()
+        operation = tool.select_operation(query)
+        timer.lap("select")
+        parameters, missing = tool.fill_parameters(operation, query)
+        for name, _ in missing:
+            parameters[name] = "London"  # What the user would be asked for
+        timer.lap("parameters")
+        response = tool.make_api_request(operation, parameters)
+        timer.lap("request")
+        if "error" in response:
+            raise RuntimeError(response["error"])
+        tool.format_weather_response(response)
+        timer.lap("format")
+        return timer.stages
+
+    return run
+
+
+def setup_email(args):
+    from emailtool import EmailTool
+
+    tool = EmailTool()
+
+    def run(query):
+        timer = StageTimer()
+        subject, body = tool.craft_email("recipient@example.com", query)
+        timer.lap("draft")
+        tool.send_email("recipient@example.com", subject or "Hello", body or query)
+        timer.lap("send")
+        return timer.stages
+
+    return run
+
+
+SUITES = {
+    "routing": setup_routing,
+    "ner": setup_ner,
+    "api": setup_api,
+    "generic": setup_generic,
+    "rag": setup_rag,
+    "email": setup_email,
+}
+
+
+def summarize(latencies_ms):
+    if not latencies_ms:
+        return {}
+    return {
+        "count": len(latencies_ms),
+        "mean_ms": sum(latencies_ms) / len(latencies_ms),
+        "min_ms": min(latencies_ms),
+        "p50_ms": percentile(latencies_ms, 0.5),
+        "p95_ms": percentile(latencies_ms, 0.95),
+        "p99_ms": percentile(latencies_ms, 0.99),
+        "max_ms": max(latencies_ms),
+    }
+
+
+def timed_call(run, query):
+    start_time = time.perf_counter()
+    try:
+        stages = run(query)
+        error = None
+    except Exception as e:
+        stages, error = {}, f"{type(e).__name__}: {e}"
+    return (time.perf_counter() - start_time) * 1000, stages, error
+
+
+def run_level(run, queries, concurrency):
+    """
+    Answer every query with `concurrency` threads.
+
+    Returns:
+        dict: Latency percentiles, per-stage percentiles, errors and throughput.
+    """
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda query: timed_call(run, query), queries))
+    elapsed = time.perf_counter() - start_time
+
+    latencies = [latency for latency, _, error in results if error is None]
+    errors = [error for _, _, error in results if error is not None]
+    stages = {}
+    for _, request_stages, _ in results:
+        for stage, ms in request_stages.items():
+            stages.setdefault(stage, []).append(ms)
+    return {
+        "concurrency": concurrency,
+        "requests": len(queries),
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "seconds": elapsed,
+        "throughput_rps": len(latencies) / elapsed if elapsed > 0 else 0.0,
+        "latency": summarize(latencies),
+        "stages": {stage: summarize(values) for stage, values in stages.items()},
+    }
+
+
+def run_suite(name, args):
+    """
+    Cold start (building the tool and its first answer), then warm-up
+    passes, then the query set at each concurrency level.
+    """
+    queries = QUERY_SETS[name]
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with quiet:
+        start_time = time.perf_counter()
+        try:
+            run = SUITES[name](args)
+        except BaseException as e:  # Includes the exit() of tools missing their configuration
+            return {"error": f"setup failed: {type(e).__name__}: {e}"}
+        setup_seconds = time.perf_counter() - start_time
+        first_ms, _, first_error = timed_call(run, queries[0])
+
+        for _ in range(args.warmup):
+            for query in queries:
+                timed_call(run, query)
+
+        levels = [run_level(run, queries * args.repeat, concurrency) for concurrency in args.concurrency]
+    return {
+        "queries": len(queries),
+        "cold": {"setup_seconds": setup_seconds, "first_request_ms": first_ms, "error": first_error},
+        "levels": levels,
+    }
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True).stdout.strip())
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_results(results):
+    for name, suite in results["suites"].items():
+        if "error" in suite:
+            print(f"{name:<9}{suite['error']}")
+            continue
+        cold = suite["cold"]
+        print(f"{name:<9}cold: setup {cold['setup_seconds']:.2f} s, first request {cold['first_request_ms']:.1f} ms")
+        for level in suite["levels"]:
+            latency = level["latency"]
+            if not latency:
+                print(f"{'':<9}x{level['concurrency']:<4}all {level['requests']} requests failed: {level['first_error']}")
+                continue
+            stages = "  ".join(f"{stage} {stats['p50_ms']:.2f}" for stage, stats in level["stages"].items())
+            print(f"{'':<9}x{level['concurrency']:<4}p50 {latency['p50_ms']:8.2f}  p95 {latency['p95_ms']:8.2f}  "
+                  f"p99 {latency['p99_ms']:8.2f} ms  {level['throughput_rps']:8.1f} req/s  "
+                  f"{level['errors']} errors  [p50 {stages}]")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency and throughput benchmarks of the chatbot's tools")
+    parser.add_argument("--suites", nargs="+", choices=list(SUITES), default=list(SUITES))
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16], help="Concurrency levels")
+    parser.add_argument("--repeat", type=int, default=3, help="Passes over the query set per level")
+    parser.add_argument("--warmup", type=int, default=1, help="Unmeasured passes after the cold start")
+    parser.add_argument("--cache", action="store_true", help="Keep the response caches enabled")
+    parser.add_argument("--llm", choices=["stub", "ollama"], default="stub",
+                        help="Answer LLM calls with the local Ollama stub or the configured Ollama server")
+    parser.add_argument("--llm-delay", type=float, default=0.05, help="Stub time to first token, seconds")
+    parser.add_argument("--llm-token-delay", type=float, default=0.005, help="Stub time per token, seconds")
+    parser.add_argument("--llm-tokens", type=int, default=32, help="Tokens per stub reply")
+    parser.add_argument("--llm-prompt-token-delay", type=float, default=0.0, help="Stub prefill time per prompt word, seconds")
+    parser.add_argument("--context-budget", type=int, help="RAG context tokens (default: the model's budget, 0: top 3 chunks as they are)")
+    parser.add_argument("--offline", action="store_true", help="Do not download models (they must be cached)")
+    parser.add_argument("--json", help=f"Results file (default: {RESULTS_DIR}/<time>-<commit>.json)")
+    parser.add_argument("--verbose", action="store_true", help="Show the tools' output")
+    args = parser.parse_args()
+
+    if args.offline:
+        os.environ["HF_HUB_OFFLINE"] = "1"
+
+    commit = git_commit()
+    results = {
+        "commit": commit,
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": {key: value for key, value in vars(args).items() if key not in ("json", "verbose")},
+        "suites": {},
+    }
+
+    with contextlib.ExitStack() as stack:
+        # Every external service is a local stub, set up before the tools read their configuration
+        if args.llm == "stub":
+            llm = stack.enter_context(ollama_stub(
+                delay=args.llm_delay, token_delay=args.llm_token_delay, tokens=args.llm_tokens,
+                prompt_token_delay=args.llm_prompt_token_delay,
+            ))
+            os.environ["OLLAMA_BASE_URL"] = llm.url
+        weather = stack.enter_context(weather_stub())
+        args.weather_url = weather.url + "/v1"
+        os.environ.setdefault("API_KEY", "benchmark-key")
+        smtp = stack.enter_context(smtp_stub())
+        os.environ["SMTP_SERVER"], os.environ["SMTP_PORT"] = smtp.address[0], str(smtp.address[1])
+        os.environ.setdefault("EMAIL_USER", "benchmark@example.com")
+        os.environ.setdefault("EMAIL_PASSWORD", "benchmark")
+
+        for name in args.suites:
+            print(f"Running {name}...", flush=True)
+            results["suites"][name] = run_suite(name, args)
+
+    from modelregistry import report
+    results["model_loads"] = report()
+    results["finished_at"] = datetime.now().isoformat(timespec="seconds")
+    print_results(results)
+
+    path = args.json or os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}-{commit}.json")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+# Retrieval hit rate and prompt size of the structure-aware chunker against
+# the old fixed-size chunks, on questions whose answers are known
+#
+#   python benchmark_chunking.py                        # 128-token chunks vs 500 characters
+#   python benchmark_chunking.py --max-tokens 64 128 256 --overlap 16 --k 1 2 3
+import argparse
+import json
+import re
+import time
+import unicodedata
+
+import faiss
+import numpy as np
+
+from chunking import Chunker, FixedSizeChunker, count_tokens
+from modelregistry import get_embedding_model
+from pdfextract import iter_pdf_texts
+
+# (question, document holding the answer, phrases of which one must be in a retrieved chunk)
+EVAL_QUERIES = [
+    ("What API methods does Cassandra provide?", "cassandra.pdf", ["insert(table, key, rowmutation)"]),
+    ("How does Cassandra replicate data?", "cassandra.pdf", ["each data item is replicated at n hosts"]),
+    ("How does Cassandra partition data across the cluster?", "cassandra.pdf", ["order preserving hash function"]),
+    ("How does Cassandra elect a leader?", "cassandra.pdf", ["elects a leader amongst its nodes"]),
+    ("How is cluster membership handled in Cassandra?", "cassandra.pdf", ["membership in cassandra is based on scuttlebutt"]),
+    ("What is the data model of Cassandra?", "cassandra.pdf", ["distributed multi dimensional map indexed by a key"]),
+    ("What happens on a write in Cassandra?", "cassandra.pdf", ["write into a commit log"]),
+    ("How does Dynamo detect conflicting updates?", "cassandra.pdf", ["vector clock scheme"]),
+    ("What is Spring Boot?", "spring_boot_tutorial.pdf", ["java-based framework used to create a micro service"]),
+    ("What is application runner?", "spring_boot_tutorial.pdf", ["application runner is an interface used to execute the code"]),
+    ("When is an interceptor used in Spring Boot?", "spring_boot_tutorial.pdf", ["interceptor to add the request header"]),
+    ("How do I handle exceptions globally in Spring Boot?", "spring_boot_tutorial.pdf", ["annotation, to handle the exceptions globally"]),
+    ("What is a Eureka server?", "spring_boot_tutorial.pdf", ["eureka server is an application that holds the information"]),
+    ("What is Zuul server?", "spring_boot_tutorial.pdf", ["zuul server is a gateway application"]),
+    ("What does Hystrix do?", "spring_boot_tutorial.pdf", ["hystrix isolates the points of access"]),
+    ("How do I enable scheduling in Spring Boot?", "spring_boot_tutorial.pdf", ["@enablescheduling annotation is used to enable the scheduler"]),
+    ("What does Spring Boot auto configuration do?", "spring_boot_tutorial.pdf", ["automatically configures your spring application based on the jar dependencies"]),
+    ("How do I change the port of a Spring Boot application?", "spring_boot_tutorial.pdf", ["server.port=9090"]),
+    ("How do I create a new Angular project?", "angular.pdf", ["ng new project_name", "ng new my-app"]),
+    ("How do I build an Angular app with Ahead-of-Time compilation?", "angular.pdf", ["ng build --prod --aot"]),
+    ("How do I create a custom pipe in Angular?", "angular.pdf", ["implements pipetransform"]),
+    ("How does a child component send data to its parent in Angular?", "angular.pdf", ["@output() selected"]),
+    ("How do I pass data from a parent component to a child component?", "angular.pdf", ["@input() mylistfromparent"]),
+    ("What is Angular?", "angular.pdf", ["web framework led by the angular team"]),
+]
+
+HYPHENATED = re.compile(r"(\w)-\s*\n\s*(\w)")
+
+
+def normalize(text):
+    # Compare text regardless of ligatures, line wrapping and words hyphenated across lines
+    text = unicodedata.normalize("NFKC", text)
+    text = HYPHENATED.sub(r"\1\2", text)
+    return " ".join(text.split()).lower()
+
+
+def build_index(embedding_model, chunks):
+    embeddings = embedding_model.encode([text for text, _ in chunks], batch_size=64, normalize_embeddings=True)
+    faiss_index = faiss.IndexFlatIP(embeddings.shape[1])
+    faiss_index.add(np.asarray(embeddings, dtype=np.float32))
+    return faiss_index
+
+
+def evaluate(name, chunker, documents, embedding_model, ks):
+    """
+    Chunk and embed the documents, then search every eval question.
+
+    Returns:
+        dict: Chunk statistics and, per k, the hit rate and the average
+            number of tokens of the k chunks that would go into the prompt.
+    """
+    start_time = time.perf_counter()
+    chunks = [(text, source) for source, document in documents.items() for text, _, _ in chunker.split(document)]
+    chunk_seconds = time.perf_counter() - start_time
+    chunk_tokens = count_tokens(embedding_model.tokenizer, [text for text, _ in chunks])
+    normalized = [normalize(text) for text, _ in chunks]
+
+    start_time = time.perf_counter()
+    faiss_index = build_index(embedding_model, chunks)
+    embed_seconds = time.perf_counter() - start_time
+
+    questions = [question for question, _, _ in EVAL_QUERIES]
+    query_embeddings = embedding_model.encode(questions, normalize_embeddings=True)
+    _, results = faiss_index.search(np.asarray(query_embeddings, dtype=np.float32), max(ks))
+
+    report = {
+        "chunker": chunker.config(),
+        "chunks": len(chunks),
+        "avg_chunk_tokens": float(np.mean(chunk_tokens)),
+        "max_chunk_tokens": int(max(chunk_tokens)),
+        "chunk_seconds": chunk_seconds,
+        "embed_seconds": embed_seconds,
+        "k": {},
+    }
+    for k in ks:
+        hits, context_tokens = 0, []
+        for (question, source, phrases), ids in zip(EVAL_QUERIES, results):
+            top = [int(i) for i in ids[:k] if i >= 0]
+            hits += any(chunks[i][1] == source and any(phrase in normalized[i] for phrase in phrases) for i in top)
+            context_tokens.append(sum(chunk_tokens[i] for i in top))
+        report["k"][k] = {"hit_rate": hits / len(EVAL_QUERIES), "avg_context_tokens": float(np.mean(context_tokens))}
+
+    # Answers the chunking itself cut in half can never be found
+    report["answers_split"] = sum(
+        not any(chunks[i][1] == source and any(phrase in normalized[i] for phrase in phrases) for i in range(len(chunks)))
+        for _, source, phrases in EVAL_QUERIES
+    )
+    print(f"{name:<24}{len(chunks):>7} chunks  {report['avg_chunk_tokens']:>6.1f} tokens/chunk  "
+          f"{report['answers_split']} answers split  chunked in {chunk_seconds * 1000:.0f} ms")
+    for k, result in report["k"].items():
+        print(f"{'':<24}k={k}  hit rate {result['hit_rate']:.2f}  context {result['avg_context_tokens']:>6.1f} tokens")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrieval quality and prompt size of the RAG chunking strategies")
+    parser.add_argument("--docs", default="docs", help="Folder with the PDFs of the eval questions")
+    parser.add_argument("--chunk-size", type=int, default=500, help="Characters per fixed-size chunk (the baseline)")
+    parser.add_argument("--max-tokens", type=int, nargs="+", default=[128], help="Token limits of the structure-aware chunker")
+    parser.add_argument("--overlap", type=int, default=16, help="Overlap tokens of the structure-aware chunker")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 2, 3], help="Numbers of retrieved chunks to score")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    sources = sorted({source for _, source, _ in EVAL_QUERIES})
+    documents = {}
+    for doc_path, text in iter_pdf_texts([f"{args.docs}/{source}" for source in sources]):
+        documents[doc_path.rsplit("/", 1)[-1]] = text
+    embedding_model = get_embedding_model()
+    tokenizer = embedding_model.tokenizer
+
+    chunkers = {f"fixed {args.chunk_size} chars": FixedSizeChunker(args.chunk_size)}
+    for max_tokens in args.max_tokens:
+        chunkers[f"structure {max_tokens} tokens"] = Chunker(tokenizer, max_tokens=max_tokens, overlap_tokens=args.overlap)
+
+    print(f"{len(EVAL_QUERIES)} questions over {', '.join(sources)}; tokens counted with the embedding model's tokenizer")
+    results = {name: evaluate(name, chunker, documents, embedding_model, args.k) for name, chunker in chunkers.items()}
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# Recall@k vs latency report for the FAISS index types supported by RAGTool
+import argparse
+import json
+import random
+import time
+
+import numpy as np
+
+from ragindex import index_spec, create_index, set_search_params
+from ragtool import RAGTool, INDEX_METRIC
+
+# Questions from test_chatbot.py, extended with sampled chunk text below
+QUERIES = [
+    "What is Cassandra?",
+    "What are the differences between Cassandra and Dynamo?",
+    "what is spring boot?",
+    "What is Angular?",
+    "What files and folder structure does ng new generate by default, and why are they important?",
+    "how to Create Spring Cloud Configuration Server?",
+    "Can I run multiple Angular projects simultaneously on the same machine? If so, how?",
+    "What are the benefits of Ahead-of-Time (AOT) compilation, and when should it be used?",
+    "What API methods does Cassandra provide?",
+    "What is application runner?",
+    "How does Cassandra handle high availability?",
+    "when is interceptor used in spring boot?",
+]
+
+# (index type, build parameters, search parameter name, values to sweep)
+CONFIGS = [
+    ("flat", {}, None, [None]),
+    ("ivf_flat", {}, "nprobe", [1, 2, 4, 8, 16, 32]),
+    ("ivf_pq", {"pq_m": 16, "pq_nbits": 8}, "nprobe", [1, 2, 4, 8, 16, 32]),
+    ("hnsw", {"hnsw_m": 32}, "efSearch", [16, 32, 64, 128]),
+]
+
+
+def sample_queries(rag_tool, count, seed=0):
+    """
+    Use the fixed questions plus the opening words of randomly sampled chunks.
+    """
+    rng = random.Random(seed)
+    texts = list(rag_tool.documents.values())
+    sampled = [" ".join(text.split()[:12]) for text in rng.sample(texts, min(count, len(texts)))]
+    return QUERIES + [text for text in sampled if text]
+
+
+def time_searches(faiss_index, query_embeddings, k):
+    """
+    Search the queries one by one, as RAGTool does.
+
+    Returns:
+        tuple: (ids of the results, per-query latencies in milliseconds)
+    """
+    results = np.empty((len(query_embeddings), k), dtype=np.int64)
+    latencies = []
+    for i in range(len(query_embeddings)):
+        start_time = time.perf_counter()
+        _, indices = faiss_index.search(query_embeddings[i:i + 1], k)
+        latencies.append((time.perf_counter() - start_time) * 1000)
+        results[i] = indices[0]
+    return results, np.array(latencies)
+
+
+def recall_at_k(results, ground_truth):
+    hits = [len(set(row) & set(truth)) / len(truth) for row, truth in zip(results, ground_truth)]
+    return float(np.mean(hits))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@k vs latency of the FAISS index types on the docs corpus")
+    parser.add_argument("--docs", default="docs", help="Folder with the PDFs to index")
+    parser.add_argument("--k", type=int, default=3, help="Number of neighbours, RAGTool uses 3")
+    parser.add_argument("--queries", type=int, default=300, help="Number of sampled chunk queries")
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    # Embed the corpus once through RAGTool with the exact (flat) index
+    rag_tool = RAGTool(folder_path=args.docs, index_type="flat")
+    flat_index = rag_tool.faiss_index
+    embeddings = flat_index.index.reconstruct_n(0, flat_index.ntotal)
+    ids = np.arange(len(embeddings), dtype=np.int64)
+
+    queries = sample_queries(rag_tool, args.queries)
+    query_embeddings = np.asarray(rag_tool.embedding_model.encode(queries, normalize_embeddings=True), dtype=np.float32)
+
+    baseline = create_index(rag_tool.dimension, index_spec("flat", INDEX_METRIC))
+    baseline.add_with_ids(embeddings, ids)
+    ground_truth, _ = time_searches(baseline, query_embeddings, args.k)
+
+    print(f"{len(embeddings)} chunks, {len(queries)} queries, recall@{args.k} against the flat index\n")
+    print(f"{'index':<10}{'param':<14}{'recall':>8}{'mean ms':>10}{'p95 ms':>10}{'build s':>10}")
+    report = []
+    for index_type, build_params, param_name, values in CONFIGS:
+        spec = index_spec(index_type, INDEX_METRIC, **build_params)
+        start_time = time.perf_counter()
+        faiss_index = create_index(rag_tool.dimension, spec, train_size=len(embeddings))
+        if not faiss_index.is_trained:
+            faiss_index.train(embeddings)
+        faiss_index.add_with_ids(embeddings, ids)
+        build_seconds = time.perf_counter() - start_time
+
+        for value in values:
+            if param_name:
+                set_search_params(faiss_index, spec, {param_name: value})
+            results, latencies = time_searches(faiss_index, query_embeddings, args.k)
+            row = {
+                "index": index_type,
+                "build_params": build_params,
+                "search_params": {param_name: value} if param_name else {},
+                "recall": recall_at_k(results, ground_truth),
+                "mean_ms": float(latencies.mean()),
+                "p95_ms": float(np.percentile(latencies, 95)),
+                "build_seconds": build_seconds,
+            }
+            report.append(row)
+            param = f"{param_name}={value}" if param_name else "-"
+            print(f"{index_type:<10}{param:<14}{row['recall']:>8.3f}{row['mean_ms']:>10.3f}{row['p95_ms']:>10.3f}{build_seconds:>10.2f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"chunks": len(embeddings), "queries": len(queries), "k": args.k, "results": report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
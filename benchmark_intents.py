@@ -0,0 +1,77 @@
+# Accuracy and latency of the embedding intent router vs the old keyword chain
+import argparse
+import json
+import time
+
+from benchmark_queries import LABELED_MESSAGES
+from intentrouter import IntentRouter
+from modelregistry import get_embedding_model
+from stats import percentile
+
+
+def keyword_intent(user_message):
+    """
+    The keyword chain Chatbot.extract_intent used before the router.
+    """
+    if "meeting" in user_message or "schedule" in user_message:
+        return "schedule_meeting"
+    if "email" in user_message or "send" in user_message:
+        return "send_email"
+    if "weather" in user_message:
+        return "call_api"
+    if "document" in user_message or "search" in user_message:
+        return "search_rag"
+    return "generic"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Accuracy and latency of the embedding intent router")
+    parser.add_argument("--threshold", type=float, default=0.35, help="Router confidence threshold")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    router = IntentRouter(get_embedding_model(), threshold=args.threshold)
+    router.classify("warm up")
+
+    encode_ms, classify_ms, rows = [], [], []
+    for message, label in LABELED_MESSAGES:
+        start_time = time.perf_counter()
+        embedding = router.encode(message)
+        encoded_time = time.perf_counter()
+        intent, confidence = router.classify(message, embedding=embedding)
+        end_time = time.perf_counter()
+        encode_ms.append((encoded_time - start_time) * 1000)
+        classify_ms.append((end_time - encoded_time) * 1000)
+        rows.append({
+            "message": message,
+            "label": label,
+            "router": intent,
+            "confidence": confidence,
+            "keywords": keyword_intent(message),
+        })
+
+    router_accuracy = sum(row["router"] == row["label"] for row in rows) / len(rows)
+    keyword_accuracy = sum(row["keywords"] == row["label"] for row in rows) / len(rows)
+    print(f"Router accuracy:   {router_accuracy:.1%}")
+    print(f"Keyword accuracy:  {keyword_accuracy:.1%}")
+    print(f"Encode latency:    p50 {percentile(encode_ms, 0.5):.3f} ms, p95 {percentile(encode_ms, 0.95):.3f} ms")
+    print(f"Classify latency:  p50 {percentile(classify_ms, 0.5):.4f} ms, p95 {percentile(classify_ms, 0.95):.4f} ms")
+
+    for row in rows:
+        if row["router"] != row["label"]:
+            print(f"  misrouted: {row['message']!r} -> {row['router']} ({row['confidence']:.2f}), expected {row['label']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "threshold": args.threshold,
+                "router_accuracy": router_accuracy,
+                "keyword_accuracy": keyword_accuracy,
+                "encode_ms": encode_ms,
+                "classify_ms": classify_ms,
+                "rows": rows,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# Rendering and delivery throughput of bulk meeting invites against the SMTP stub
+import argparse
+import email.policy
+import json
+import smtplib
+import time
+from datetime import datetime, timedelta
+
+from invites import Invite, build_rrule
+from mailtransport import BATCH_SIZE, MailTransport
+from stubservers import smtp_stub
+
+
+def make_invite(count):
+    attendees = [(f"Attendee {i}", f"attendee{i}@example.com") for i in range(count)]
+    return Invite(
+        "organizer@example.com", "Weekly all-hands",
+        datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=1), 30,
+        attendees=attendees, agenda="Team updates, questions; demos", location="Main hall",
+        rrule=build_rrule("weekly", count=12),
+    )
+
+
+def render_per_message(invite):
+    """
+    Build and serialize a full MIME tree for every recipient.
+    """
+    messages = []
+    for name, address in invite.attendees:
+        msg = invite.build_message(to=address, ics=invite.render_ics(attendees=[(name, address)]))
+        messages.append((msg.as_bytes(policy=email.policy.SMTP), invite.organizer, [address]))
+    return messages
+
+
+def render_template(invite):
+    """
+    Render the invite once and substitute each recipient.
+    """
+    return list(invite.template(list_attendees=False).messages())
+
+
+def send_connection_per_message(host, port, messages):
+    # What MeetingTool did before the pooled transport
+    for msg, from_addr, to_addrs in messages:
+        with smtplib.SMTP(host, port) as server:
+            server.ehlo()
+            server.sendmail(from_addr, to_addrs, msg)
+    return 0
+
+
+def send_one_connection(host, port, messages):
+    transport = MailTransport(host, port)
+    try:
+        return sum(error is not None for error in transport.send_many(messages))
+    finally:
+        transport.close()
+
+
+def send_pooled_batches(host, port, messages, pool_size=4):
+    transport = MailTransport(host, port, pool_size=pool_size)
+    try:
+        # Enough batches to keep every connection busy
+        futures = transport.submit_many(messages, batch_size=min(BATCH_SIZE, -(-len(messages) // pool_size)))
+        return sum(error is not None for future in futures for error in future.result())
+    finally:
+        transport.close()
+
+
+SENDERS = {
+    "connection per message": send_connection_per_message,
+    "one pooled connection": send_one_connection,
+    "4 pooled connections": send_pooled_batches,
+}
+
+
+def timed(func, *args):
+    start_time = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput of bulk meeting invites")
+    parser.add_argument("--invites", type=int, default=1000, help="Number of recipients")
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds the stub adds to every message")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    invite = make_invite(args.invites)
+    results = {"invites": args.invites, "render": {}, "send": {}}
+
+    messages, seconds = timed(render_per_message, invite)
+    results["render"]["mime per message"] = seconds
+    messages, seconds = timed(render_template, invite)
+    results["render"]["template"] = seconds
+    for name, seconds in results["render"].items():
+        print(f"Render {name:<24}{seconds * 1000:>9.1f} ms  {args.invites / seconds:>9.0f} invites/s")
+
+    for name, sender in SENDERS.items():
+        with smtp_stub(delay=args.delay) as stub:
+            host, port = stub.address
+            failed, seconds = timed(sender, host, port, messages)
+            delivered = len(stub.messages)
+        results["send"][name] = {"seconds": seconds, "delivered": delivered, "failed": failed}
+        print(f"Send   {name:<24}{seconds * 1000:>9.1f} ms  {delivered / seconds:>9.0f} invites/s  ({failed} failed)")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
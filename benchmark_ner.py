@@ -0,0 +1,117 @@
+# Latency and throughput of the trimmed NER pipeline vs the full spaCy pipeline
+import argparse
+import json
+import time
+
+from entityextractor import EntityExtractor
+from modelregistry import get_spacy
+from stats import percentile
+
+# Messages like the ones the chatbot extracts recipients and locations from
+MESSAGES = [
+    "Send an email to John about the project update",
+    "Can you email Sarah Connor the quarterly report?",
+    "Write a mail to Priya asking for the invoice",
+    "Draft an email to Michael Scott about the meeting tomorrow",
+    "What's the weather in London?",
+    "weather forecast for new york this weekend",
+    "Is it raining in Paris right now?",
+    "How hot is it in Mumbai today?",
+    "Schedule a meeting with Alice in Berlin next Monday",
+    "Set up a call with David from the Tokyo office",
+    "What is Cassandra?",
+    "Tell me a joke",
+]
+
+
+def time_calls(nlp, messages, repeat):
+    """
+    Run the messages one by one, as the tools do.
+
+    Returns:
+        list: Per-message latencies in milliseconds.
+    """
+    latencies = []
+    for _ in range(repeat):
+        for message in messages:
+            start_time = time.perf_counter()
+            nlp(message)
+            latencies.append((time.perf_counter() - start_time) * 1000)
+    return latencies
+
+
+def summarize(name, latencies):
+    return {
+        "pipeline": name,
+        "calls": len(latencies),
+        "mean_ms": sum(latencies) / len(latencies),
+        "p50_ms": percentile(latencies, 0.5),
+        "p95_ms": percentile(latencies, 0.95),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-message latency of the trimmed NER pipeline vs the full spaCy pipeline")
+    parser.add_argument("--model", default="en_core_web_sm", help="spaCy package to load")
+    parser.add_argument("--repeat", type=int, default=50, help="Passes over the sample messages")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    full_nlp = get_spacy(args.model)
+    extractor = EntityExtractor(args.model)
+    messages = MESSAGES
+    print(f"Full pipeline:    {full_nlp.pipe_names}")
+    print(f"Trimmed pipeline: {extractor.nlp.pipe_names}")
+
+    # Warm both pipelines up before timing
+    time_calls(full_nlp, messages, 1)
+    time_calls(extractor.nlp, messages, 1)
+
+    results = [
+        summarize("full", time_calls(full_nlp, messages, args.repeat)),
+        summarize("trimmed", time_calls(extractor.nlp, messages, args.repeat)),
+    ]
+
+    # Repeated messages are answered from the extractor's cache
+    cached = []
+    for _ in range(args.repeat):
+        for message in messages:
+            start_time = time.perf_counter()
+            extractor.entities(message)
+            cached.append((time.perf_counter() - start_time) * 1000)
+    results.append(summarize("trimmed, cached", cached))
+
+    # Batched extraction with nlp.pipe
+    texts = messages * args.repeat
+    start_time = time.perf_counter()
+    extractor.extract_many(texts)
+    pipe_seconds = time.perf_counter() - start_time
+    results.append({
+        "pipeline": "trimmed, nlp.pipe",
+        "calls": len(texts),
+        "mean_ms": pipe_seconds * 1000 / len(texts),
+        "p50_ms": None,
+        "p95_ms": None,
+    })
+
+    print(f"{'pipeline':<20}{'calls':>8}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for result in results:
+        p50 = f"{result['p50_ms']:.3f}" if result["p50_ms"] is not None else "-"
+        p95 = f"{result['p95_ms']:.3f}" if result["p95_ms"] is not None else "-"
+        print(f"{result['pipeline']:<20}{result['calls']:>8}{result['mean_ms']:>10.3f}{p50:>10}{p95:>10}")
+
+    # The trimmed pipeline must find the same entities
+    full_entities = [tuple((ent.text, ent.label_) for ent in full_nlp(message).ents) for message in messages]
+    trimmed_entities = extractor.extract_many(messages)
+    mismatches = [message for message, a, b in zip(messages, full_entities, trimmed_entities) if a != b]
+    print(f"Entity agreement: {len(messages) - len(mismatches)}/{len(messages)} messages")
+    for message in mismatches:
+        print(f"  differs: {message!r}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"model": args.model, "results": results, "mismatches": mismatches}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# Query sets shared by the benchmark scripts and test_chatbot.py, so every
+# suite measures the same messages
+
+# Labeled messages, none of them used as router prototypes
+LABELED_MESSAGES = [
+    ("Send an email to Tom about tomorrow's demo", "send_email"),
+    ("please mail the invoice to accounts", "send_email"),
+    ("write to Jane and tell her the build is green", "send_email"),
+    ("Can you email my landlord about the broken heater?", "send_email"),
+    ("drop a note to the team that I'm out sick", "send_email"),
+    ("send a thank you mail to the interviewers", "send_email"),
+    ("Schedule a meeting with Bob on Thursday", "schedule_meeting"),
+    ("book a 30 minute slot with the design team", "schedule_meeting"),
+    ("set up an appointment with the dentist next week", "schedule_meeting"),
+    ("invite Carol and Dan to a review on Monday at 2pm", "schedule_meeting"),
+    ("can we get a call on the calendar for Friday?", "schedule_meeting"),
+    ("plan a kickoff meeting for the new project", "schedule_meeting"),
+    ("What's the weather like in Tokyo?", "call_api"),
+    ("is it going to snow in Chicago tomorrow", "call_api"),
+    ("how cold is it in Moscow right now", "call_api"),
+    ("send me the weather forecast for Sydney", "call_api"),
+    ("what's the temperature in Delhi", "call_api"),
+    ("should I bring a jacket in Seattle today?", "call_api"),
+    ("How does Cassandra handle high availability?", "search_rag"),
+    ("What API methods does Cassandra provide?", "search_rag"),
+    ("What is application runner?", "search_rag"),
+    ("What are the benefits of Ahead-of-Time (AOT) compilation?", "search_rag"),
+    ("Can I run multiple Angular projects on the same machine?", "search_rag"),
+    ("What files does ng new generate by default?", "search_rag"),
+    ("Hello!", "generic"),
+    ("How's it going?", "generic"),
+    ("Tell me something funny", "generic"),
+    ("What's your name?", "generic"),
+    ("thank you", "generic"),
+    ("I'm bored", "generic"),
+]
+
+QUERY_SETS = {
+    "generic": [
+        "Hello!",
+        "How's the weather today?",
+        "What's your favorite color?",
+        "Tell me a joke.",
+        "What are you?",
+    ],
+    "rag": [
+        "What is Cassandra?",
+        "What are the differences between Cassandra and Dynamo?",
+        "what is spring boot?",
+        "What is Angular?",
+        "What files and folder structure does ng new generate by default, and why are they important?",
+        "how to Create Spring Cloud Configuration Server?",
+        "Can I run multiple Angular projects simultaneously on the same machine? If so, how?",
+        "What are the benefits of Ahead-of-Time (AOT) compilation, and when should it be used?",
+        "What API methods does Cassandra provide?",
+        "What is application runner?",
+        "How does Cassandra handle high availability?",
+        "when is interceptor used in spring boot?",
+    ],
+    "routing": [message for message, _ in LABELED_MESSAGES],
+    "ner": [
+        "Send an email to John Smith about the quarterly report",
+        "What's the weather like in Tokyo?",
+        "Schedule a meeting with Priya and Carlos in Berlin on Monday",
+        "please mail Angela Merkel's office about the visit to Paris",
+        "is it going to snow in Chicago tomorrow",
+        "tell Dr. Watson that the results from London are in",
+    ],
+    "api": [
+        "What's the weather in London?",
+        "current temperature in Paris",
+        "weather forecast for Tokyo for the next 3 days",
+        "what is the weather like in New York right now",
+        "forecast for Sydney for 5 days",
+        "how is the climate in Mumbai today",
+    ],
+    "email": [
+        "Thank you for the great presentation yesterday",
+        "The release is postponed to next Friday",
+        "Can we move our 1:1 to Thursday afternoon?",
+        "Please review the budget draft before Monday",
+    ],
+}
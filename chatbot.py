@@ -1,69 +1,232 @@
-# Import the necessary tools
-from apitool import APITool
-from emailtool import EmailTool
-from ragtool import RAGTool
-from generictool import GenericTool
-from schedulemeeting import MeetingTool
+# The tool modules are imported when a tool is first used, so the heavy
+# libraries behind them (sentence_transformers, faiss, fitz, spacy, langchain)
+# are not loaded before the prompt is shown
+import asyncio
+import threading
+
+from asyncrunner import run_cpu, ask_console
+from tracing import count, trace
+
 
 class Chatbot:
-    def __init__(self):
+    def __init__(self, prewarm=False):
+        """
+        Tools are built on first use. With `prewarm`, the slow ones (the
+        embedding model, intent router, RAG and generic tools) are built in a
+        background thread.
+        """
+        self.tools = {}
+        self.tool_locks = {name: threading.Lock() for name in self.TOOL_FACTORIES}
+        if prewarm:
+            threading.Thread(target=self.prewarm, daemon=True).start()
+
+    def build_embedding_model(self):
+        from modelregistry import get_embedding_model
+        return get_embedding_model()
+
+    def build_intent_router(self):
+        from modelregistry import get_intent_router
+        return get_intent_router()
+
+    def build_generictool(self):
         print("initialising generic tool...")
-        self.generictool = GenericTool()
+        from generictool import GenericTool
+        # Share the RAG embedding model for the generic tool's response cache
+        return GenericTool(embedding_model=self.get_tool("embedding_model"))
+
+    def build_ragtool(self):
         print("initialising RAG tool...")
-        self.ragtool = RAGTool()
+        from ragtool import RAGTool
+        return RAGTool(embedding_model=self.get_tool("embedding_model"))
+
+    def build_emailtool(self):
         print("initialising email tool...")
-        self.emailtool = EmailTool()
+        from emailtool import EmailTool
+        return EmailTool()
+
+    def build_schedule_meeting_tool(self):
         print("initialising meeting tool...")
-        self.schedule_meeting_tool = MeetingTool()
+        from schedulemeeting import MeetingTool
+        return MeetingTool()
+
+    def build_apitool(self):
         print("initialising API tool...")
-        self.apitool = APITool()
+        from apitool import APITool
+        return APITool()
+
+    TOOL_FACTORIES = {
+        "embedding_model": build_embedding_model,
+        "intent_router": build_intent_router,
+        "generictool": build_generictool,
+        "ragtool": build_ragtool,
+        "emailtool": build_emailtool,
+        "schedule_meeting_tool": build_schedule_meeting_tool,
+        "apitool": build_apitool,
+    }
+
+    def get_tool(self, name):
+        """
+        Return the named tool, building it on first use. Concurrent callers
+        (e.g. the pre-warm thread) wait for the same instance.
+        """
+        tool = self.tools.get(name)
+        if tool is None:
+            with self.tool_locks[name]:
+                tool = self.tools.get(name)
+                if tool is None:
+                    tool = self.TOOL_FACTORIES[name](self)
+                    self.tools[name] = tool
+        return tool
+
+    async def aget_tool(self, name):
+        """
+        Async variant of get_tool. A tool that is not built yet is built in a
+        worker thread, so loading models does not stall other sessions.
+        """
+        tool = self.tools.get(name)
+        if tool is None:
+            tool = await asyncio.to_thread(self.get_tool, name)
+        return tool
+
+    async def aclose(self):
+        """
+        Close the connections the built tools keep open: the API tool's
+        pooled HTTP clients. Tools that were never built are left alone.
+        """
+        apitool = self.tools.get("apitool")
+        if apitool is not None:
+            await apitool.aclose()
+
+    def prewarm(self):
+        for name in ("embedding_model", "intent_router", "generictool", "ragtool"):
+            try:
+                self.get_tool(name)
+            except Exception as e:
+                print(f"Pre-warming {name} failed: {e}")
+
+    @property
+    def intent_router(self):
+        return self.get_tool("intent_router")
+
+    @property
+    def generictool(self):
+        return self.get_tool("generictool")
+
+    @property
+    def ragtool(self):
+        return self.get_tool("ragtool")
+
+    @property
+    def emailtool(self):
+        return self.get_tool("emailtool")
+
+    @property
+    def schedule_meeting_tool(self):
+        return self.get_tool("schedule_meeting_tool")
+
+    @property
+    def apitool(self):
+        return self.get_tool("apitool")
 
     def extract_intent(self, user_message):
         """
-        Detect the user's intent based on keywords for different tools.
+        Classify the user's message against the intent prototypes. Messages
+        that match no intent confidently enough go to the generic tool.
+
+        Returns:
+            tuple: (intent, confidence)
+        """
+        return self.intent_router.classify(user_message)
+
+    async def aextract_intent(self, user_message):
+        """
+        Async variant of extract_intent, encoding the message in the CPU pool.
+        """
+        intent_router = await self.aget_tool("intent_router")
+        return await run_cpu(intent_router.classify, user_message)
+
+    async def ahandle_conversation(self, user_message, ask=ask_console):
+        """
+        Async conversation handler, so one process can serve many users at
+        once. Follow-up questions of the tools go through the `ask` coroutine,
+        which reads from the console unless a caller passes its own.
+
+        Returns:
+            str: The reply to show the user.
         """
-        if "meeting" in user_message or "schedule" in user_message:
-            return "schedule_meeting"
-        if "email" in user_message or "send" in user_message:
-            return "send_email"
-        if "weather" in user_message:
-            return "call_api"
-        if "document" in user_message or "search" in user_message:
-            return "search_rag"
-        return "generic"
+        # One trace per turn, follow-up questions included
+        with trace("chat_turn") as turn:
+            intent, confidence = await self.aextract_intent(user_message)
+            turn.set("intent", intent)
+            turn.set("confidence", round(float(confidence), 4))
+            count("chat_turns_total", intent=intent)
+            return await self.arespond(user_message, intent, ask=ask)
+
+    async def arespond(self, user_message, intent, ask=ask_console):
+        """
+        Run the tool for an intent that is already known, e.g. one that
+        ahandle_conversation or the batch runner classified.
+
+        Returns:
+            str: The reply to show the user.
+        """
+        if intent == "send_email":
+            emailtool = await self.aget_tool("emailtool")
+            return await emailtool.ahandle_email_conversation_with_initial_message(user_message, ask=ask)
+
+        if intent == "search_rag":
+            ragtool = await self.aget_tool("ragtool")
+            return await ragtool.arag_response(user_message)
+
+        if intent == "schedule_meeting":
+            # The meeting details are kept on the tool, so every conversation gets its own
+            from schedulemeeting import MeetingTool
+            return await MeetingTool().aschedule(user_message, intent=intent, ask=ask)
+
+        if intent == "call_api":
+            apitool = await self.aget_tool("apitool")
+            return await apitool.aprocess_request(user_message, intent="weather", ask=ask)
+
+        generictool = await self.aget_tool("generictool")
+        return await generictool.aget_response(user_message)
 
     def handle_conversation(self, user_message):
         """
         Main conversation handler that routes to the correct tool based on intent.
         """
         
-        # Extract user intent
-        intent = self.extract_intent(user_message)
+        with trace("chat_turn") as turn:
+            # Extract user intent
+            intent, confidence = self.extract_intent(user_message)
+            turn.set("intent", intent)
+            turn.set("confidence", round(float(confidence), 4))
+            count("chat_turns_total", intent=intent)
         
-        if intent == "send_email":
-            # Pass the user message to the email tool
-            print("routing to email bot...")
-            result = self.emailtool.handle_email_conversation_with_initial_message(user_message)
+            if intent == "send_email":
+                # Pass the user message to the email tool
+                print("routing to email bot...")
+                result = self.emailtool.handle_email_conversation_with_initial_message(user_message)
         
-        elif intent == "search_rag":
-            # Pass the user message to the RAG tool
-            print("routing to rag bot...")
-            result = self.ragtool.handle_rag_conversation()
+            elif intent == "search_rag":
+                # Pass the user message to the RAG tool
+                print("routing to rag bot...")
+                result = self.ragtool.handle_rag_conversation()
         
-        elif intent == "schedule_meeting":
-            # Pass the user message to the schedule meeting tool
-            print("routing to scheduler bot...")
-            result = self.schedule_meeting_tool.schedule(user_message)
+            elif intent == "schedule_meeting":
+                # Pass the user message to the schedule meeting tool
+                print("routing to scheduler bot...")
+                result = self.schedule_meeting_tool.schedule(user_message, intent=intent)
         
-        elif intent == "call_api":
-            # Call the API tool method
-            print("routing to api bot...")
-            result = self.apitool.process_request(user_message)
+            elif intent == "call_api":
+                # Call the API tool method
+                print("routing to api bot...")
+                result = self.apitool.process_request(user_message, intent="weather")
         
-        else:
-            # Use generic tool if no specific intent is detected
-            print("routing to generic bot...")
-            result = self.generictool.handle_conversation_with_initial_message(user_message)
+            else:
+                # Use generic tool if no specific intent is detected
+                print("routing to generic bot...")
+                result = self.generictool.handle_conversation_with_initial_message(user_message)
+            
             
         # After each tool completes its action, continue the conversation
         if result == "continue":
@@ -73,7 +236,7 @@ class Chatbot:
 
 
 if __name__ == "__main__":
-    chatbot = Chatbot()
+    chatbot = Chatbot(prewarm=True)
     # Print a welcome message to the user.
     print("Welcome to the Virtual Assistant! Type 'exit' to quit.")
     while True:
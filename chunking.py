@@ -0,0 +1,311 @@
+# Splitting extracted document text into chunks for the RAG index
+#
+# Text from pdfextract separates pages with PAGE_BREAK and the text blocks
+# of a page with a blank line. Chunks are returned as (text, first_page,
+# last_page) with 1-based page numbers, so answers can cite their pages.
+import bisect
+import re
+import unicodedata
+from collections import Counter
+
+PAGE_BREAK = "\f"
+BLOCK_BREAK = "\n\n"
+
+# "5.1" or "3." on a line of its own, followed by the section title
+SECTION_NUMBER = re.compile(r"^\d+(\.\d+)*\.?$")
+# End of a sentence: punctuation, whitespace, then something that can start one
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[]?[A-Z0-9@•])")
+CODE_LINE = re.compile(r"(^\s*(import|package|public|private|protected|return|@\w+|<\w|</|//|#include)\b)|([;{}]\s*$)|(^\s*[})\]]+;?\s*$)")
+WORD_PIECE = re.compile(r"\w+|[^\w\s]")
+DIGITS = re.compile(r"\d+")
+# Dot leaders of a table of contents
+LEADER = re.compile(r"\s*(\.\s*){4,}")
+
+
+class RegexTokenizer:
+    """
+    Rough stand-in for an embedding model's tokenizer: one token per word
+    or punctuation mark, which undercounts word pieces by about a third.
+    """
+
+    name_or_path = "regex"
+
+    def __call__(self, texts, add_special_tokens=False, **kwargs):
+        return {"input_ids": [WORD_PIECE.findall(text) for text in texts]}
+
+
+def count_tokens(tokenizer, texts):
+    """
+    Number of tokens of each text, without the special tokens the model
+    adds around a whole input.
+    """
+    if not texts:
+        return []
+    encoded = tokenizer(list(texts), add_special_tokens=False, verbose=False)
+    return [len(ids) for ids in encoded["input_ids"]]
+
+
+def split_pages(text):
+    return text.split(PAGE_BREAK)
+
+
+class FixedSizeChunker:
+    """
+    The original chunking: a slice every `chunk_size` characters of the
+    concatenated pages, regardless of words or sentences. Kept as the
+    baseline of benchmark_chunking.py.
+    """
+
+    def __init__(self, chunk_size=500):
+        self.chunk_size = chunk_size
+
+    def config(self):
+        return {"type": "fixed", "chunk_size": self.chunk_size}
+
+    def split(self, text):
+        # Block breaks count as the single newline they used to be, page breaks as nothing
+        pages = [page.replace(BLOCK_BREAK, "\n") for page in split_pages(text)]
+        page_ends = []
+        for page in pages:
+            page_ends.append((page_ends[-1] if page_ends else 0) + len(page))
+        flat = "".join(pages)
+
+        def page_at(offset):
+            return bisect.bisect_right(page_ends, offset) + 1
+
+        return [
+            (flat[i:i + self.chunk_size], page_at(i), page_at(min(i + self.chunk_size, len(flat)) - 1))
+            for i in range(0, len(flat), self.chunk_size)
+        ]
+
+
+class Chunker:
+    """
+    Splits text on its structure instead of every N characters. Text is
+    broken into units (headings, sentences, lines of code) that are never
+    cut, and the units are packed into chunks of at most `max_tokens`
+    tokens of the embedding model's tokenizer:
+
+    - a heading starts a new chunk, so a chunk covers one section (runs of
+      headings, like a table of contents, stay together)
+    - when a chunk is full, it ends at the last paragraph or page boundary
+      if that keeps it at least half full, otherwise after the last sentence
+    - a new chunk after a full one repeats up to `overlap_tokens` of the
+      previous chunk's last sentences
+    - page headers and footers repeated on many pages are dropped
+
+    A single unit longer than `max_tokens` (a run-on table, a long code
+    line) is the only thing split between words.
+    """
+
+    def __init__(self, tokenizer=None, max_tokens=128, overlap_tokens=16, min_tokens=None):
+        self.tokenizer = tokenizer if tokenizer is not None else RegexTokenizer()
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        # Chunks are not ended for a heading until they hold this much
+        self.min_tokens = max_tokens // 4 if min_tokens is None else min_tokens
+
+    def config(self):
+        """
+        The settings that decide the chunks, stored in the index manifest.
+        """
+        return {
+            "type": "structure",
+            "tokenizer": getattr(self.tokenizer, "name_or_path", type(self.tokenizer).__name__),
+            "max_tokens": self.max_tokens,
+            "overlap_tokens": self.overlap_tokens,
+            "min_tokens": self.min_tokens,
+        }
+
+    def split(self, text):
+        """
+        Chunk the text of one document.
+
+        Returns:
+            list: (text, first_page, last_page) for every chunk.
+        """
+        units = self.units(text)
+        counts = count_tokens(self.tokenizer, [unit[1] for unit in units])
+        sized = []
+        for (kind, unit_text, page, starts_block), tokens in zip(units, counts):
+            if tokens > self.max_tokens:
+                sized.extend(self.split_long_unit(kind, unit_text, page, starts_block, tokens))
+            else:
+                sized.append((kind, unit_text, page, starts_block, tokens))
+        return self.pack(sized)
+
+    def units(self, text):
+        """
+        Break the text into (kind, text, page, starts_block) units, where kind
+        is "heading", "sentence" or "code".
+        """
+        # NFKC turns the ligatures of typeset PDFs (ﬁ, ﬂ) back into letters
+        text = unicodedata.normalize("NFKC", text)
+        pages = [[block for block in page.split(BLOCK_BREAK) if block.strip()] for page in split_pages(text)]
+        boilerplate = self.repeated_blocks(pages)
+
+        units = []
+        for page_number, blocks in enumerate(pages, 1):
+            for block in blocks:
+                if self.block_key(block) in boilerplate:
+                    continue
+                lines = [LEADER.sub(" ", line).strip() for line in block.strip().split("\n")]
+                lines = [line for line in lines if line]
+                if not lines:
+                    continue
+
+                if len(lines) > 1 and SECTION_NUMBER.match(lines[0]):
+                    # "5.1" / "Partitioning" / paragraph text
+                    units.append(("heading", f"{lines[0]} {lines[1]}", page_number, True))
+                    lines = lines[2:]
+                    if not lines:
+                        continue
+                elif self.is_heading(lines):
+                    units.append(("heading", lines[0], page_number, True))
+                    continue
+
+                if self.is_code(lines):
+                    units.extend(("code", line, page_number, i == 0) for i, line in enumerate(lines))
+                    continue
+
+                paragraph = self.join_lines(lines)
+                sentences = SENTENCE_END.split(paragraph)
+                units.extend(("sentence", sentence, page_number, i == 0) for i, sentence in enumerate(sentences))
+        return units
+
+    @staticmethod
+    def block_key(block):
+        # Running headers and footers differ only in the page number
+        return DIGITS.sub("#", " ".join(block.split()))
+
+    def repeated_blocks(self, pages):
+        """
+        Short blocks found on at least a third of the pages (and on three or
+        more) are running headers or footers.
+        """
+        if len(pages) < 3:
+            return set()
+        seen = Counter()
+        for blocks in pages:
+            seen.update({self.block_key(block) for block in blocks if len(block) < 80})
+        return {key for key, pages_with_block in seen.items() if pages_with_block >= max(3, len(pages) / 3)}
+
+    @staticmethod
+    def is_heading(lines):
+        line = lines[0]
+        return (
+            len(lines) == 1
+            and len(line) <= 60
+            and line[-1] not in ".,;:!?"
+            and any(char.isalpha() for char in line)
+            and not CODE_LINE.search(line)
+        )
+
+    @staticmethod
+    def is_code(lines):
+        return sum(bool(CODE_LINE.search(line)) for line in lines) * 2 >= len(lines)
+
+    @staticmethod
+    def join_lines(lines):
+        # Undo the line wrapping of the PDF, including words hyphenated across lines
+        text = lines[0]
+        for line in lines[1:]:
+            if text.endswith("-") and len(text) > 1 and text[-2].isalpha() and line[:1].islower():
+                text = text[:-1] + line
+            else:
+                text = f"{text} {line}"
+        return text
+
+    def split_long_unit(self, kind, text, page, starts_block, tokens):
+        """
+        Split a unit longer than max_tokens between words, into pieces of
+        about the same size.
+        """
+        words = text.split()
+        pieces = -(-tokens // self.max_tokens)
+        # Word pieces are not spread evenly over the words, so count them per word
+        word_tokens = count_tokens(self.tokenizer, words)
+        limit = min(self.max_tokens, -(-tokens // pieces) + 8)
+        units, current, current_tokens = [], [], 0
+        for word, word_count in zip(words, word_tokens):
+            if current and current_tokens + word_count > limit:
+                units.append((kind, " ".join(current), page, starts_block and not units, current_tokens))
+                current, current_tokens = [], 0
+            current.append(word)
+            current_tokens += word_count
+        if current:
+            units.append((kind, " ".join(current), page, starts_block and not units, current_tokens))
+        return units
+
+    def pack(self, units):
+        chunks = []
+        current = []  # (kind, text, page, starts_block, tokens) of the chunk being filled
+        current_tokens = 0
+        previous_page = None
+
+        for unit in units:
+            kind, text, page, starts_block, tokens = unit
+            if page != previous_page:
+                # A page boundary is a place to split just like a paragraph
+                unit = (kind, text, page, True, tokens)
+                previous_page = page
+
+            if kind == "heading" and current_tokens >= self.min_tokens and any(item[0] != "heading" for item in current):
+                chunks.append(self.render(current))
+                current = []
+            elif current and current_tokens + tokens > self.max_tokens:
+                cut = self.cut_position(current, tokens)
+                chunks.append(self.render(current[:cut]))
+                rest = current[cut:]
+                current = self.overlap(current[:cut], rest, tokens) + rest
+            current.append(unit)
+            current_tokens = sum(item[4] for item in current)
+
+        if current:
+            chunks.append(self.render(current))
+        return chunks
+
+    def cut_position(self, current, next_tokens):
+        """
+        Where to end a full chunk: at its last block boundary if that leaves
+        at least half of it and the rest fits with the next unit, otherwise
+        after its last unit.
+        """
+        total = sum(unit[4] for unit in current)
+        before = total
+        for position in range(len(current) - 1, 0, -1):
+            before -= current[position][4]
+            if before * 2 < total or total - before + next_tokens > self.max_tokens:
+                break
+            if current[position][3]:
+                return position
+        return len(current)
+
+    def overlap(self, emitted, rest, next_tokens):
+        """
+        The last sentences of the chunk just emitted to repeat at the start
+        of the next one, within overlap_tokens and the room left.
+        """
+        room = self.max_tokens - next_tokens - sum(unit[4] for unit in rest)
+        budget = min(self.overlap_tokens, room)
+        repeated = []
+        for unit in reversed(emitted):
+            if unit[0] == "heading" or unit[4] > budget:
+                break
+            repeated.insert(0, unit)
+            budget -= unit[4]
+        # The repeated text continues a block, so the next chunk does not start one with it
+        return [(kind, text, page, False, tokens) for kind, text, page, _, tokens in repeated]
+
+    @staticmethod
+    def render(units):
+        parts = []
+        for index, (kind, text, _, starts_block, _) in enumerate(units):
+            if index:
+                previous_kind = units[index - 1][0]
+                if kind == "code" or previous_kind in ("heading", "code") or starts_block:
+                    parts.append("\n")
+                else:
+                    parts.append(" ")
+            parts.append(text)
+        return "".join(parts), units[0][2], units[-1][2]
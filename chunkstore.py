@@ -0,0 +1,158 @@
+# Compact, memory-mapped storage for the RAG chunk texts
+import json
+import mmap
+import os
+
+import numpy as np
+
+# One row per live chunk, sorted by chunk id; pages are 1-based, 0 when unknown
+TABLE_DTYPE = np.dtype([("id", "<i8"), ("offset", "<i8"), ("length", "<i4"), ("source", "<i4"),
+                        ("first_page", "<i4"), ("last_page", "<i4")])
+
+
+class ChunkStore:
+    """
+    Stores chunk texts as UTF-8 in a single append-only blob, addressed by a
+    table of (id, offset, length, source, first_page, last_page) rows. Both files are memory-mapped
+    read-only, so the texts cost no Python objects until they are read and
+    several worker processes share the same pages. New chunks are buffered
+    in memory until save(); removed chunks leave garbage in the blob, which
+    is compacted once it makes up more than half of the file.
+
+    Reads like a mapping of chunk id to text.
+    """
+
+    BLOB_FILE = "chunks.bin"
+    TABLE_FILE = "chunks.npy"
+    SOURCES_FILE = "chunks.sources.json"
+
+    def __init__(self):
+        self.table = np.zeros(0, dtype=TABLE_DTYPE)
+        self.sources = []
+        self.blob = b""
+        self.blob_size = 0  # Bytes of the blob already on disk
+        self.pending = bytearray()  # Appended texts that are not saved yet
+
+    @classmethod
+    def open(cls, directory):
+        """
+        Map a store previously written with save().
+        """
+        store = cls()
+        store.table = np.load(os.path.join(directory, cls.TABLE_FILE), mmap_mode="r")
+        with open(os.path.join(directory, cls.SOURCES_FILE), "r") as f:
+            store.sources = json.load(f)
+        store.blob, store.blob_size = store._map_blob(directory)
+        return store
+
+    def _map_blob(self, directory):
+        path = os.path.join(directory, self.BLOB_FILE)
+        size = os.path.getsize(path)
+        if size == 0:
+            return b"", 0
+        with open(path, "rb") as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), size
+
+    def __len__(self):
+        return len(self.table)
+
+    def __iter__(self):
+        return iter(self.table["id"].tolist())
+
+    def __contains__(self, chunk_id):
+        return self._row(chunk_id) is not None
+
+    def __getitem__(self, chunk_id):
+        row = self._row(chunk_id)
+        if row is None:
+            raise KeyError(chunk_id)
+        return self._text(self.table[row])
+
+    def _row(self, chunk_id):
+        row = int(np.searchsorted(self.table["id"], chunk_id))
+        if row < len(self.table) and self.table["id"][row] == chunk_id:
+            return row
+        return None
+
+    def _text(self, entry):
+        offset, length = int(entry["offset"]), int(entry["length"])
+        if offset >= self.blob_size:
+            start = offset - self.blob_size
+            return self.pending[start:start + length].decode("utf-8")
+        return self.blob[offset:offset + length].decode("utf-8")
+
+    def values(self):
+        for entry in self.table:
+            yield self._text(entry)
+
+    def metadata(self, chunk_id):
+        row = self._row(chunk_id)
+        if row is None:
+            raise KeyError(chunk_id)
+        entry = self.table[row]
+        return {"source": self.sources[entry["source"]], "pages": (int(entry["first_page"]), int(entry["last_page"]))}
+
+    def add(self, chunk_ids, texts, source=None, pages=None):
+        """
+        Append chunks. Ids must be larger than every id already stored.
+        `pages` holds the (first_page, last_page) of each text.
+        """
+        if source not in self.sources:
+            self.sources.append(source)
+        source_index = self.sources.index(source)
+
+        rows = np.zeros(len(texts), dtype=TABLE_DTYPE)
+        for row, (chunk_id, text, (first_page, last_page)) in enumerate(zip(chunk_ids, texts, pages or [(0, 0)] * len(texts))):
+            data = text.encode("utf-8")
+            rows[row] = (chunk_id, self.blob_size + len(self.pending), len(data), source_index, first_page, last_page)
+            self.pending += data
+        self.table = np.concatenate([self.table, rows])
+
+    def remove(self, chunk_ids):
+        keep = ~np.isin(self.table["id"], np.asarray(chunk_ids, dtype=np.int64))
+        self.table = self.table[keep]
+
+    def garbage_ratio(self):
+        total = self.blob_size + len(self.pending)
+        if total == 0:
+            return 0.0
+        return 1 - int(self.table["length"].sum()) / total
+
+    def save(self, directory):
+        """
+        Append the pending texts to the blob (rewriting it when it is mostly
+        garbage), write the table and map both files again.
+        """
+        os.makedirs(directory, exist_ok=True)
+        blob_path = os.path.join(directory, self.BLOB_FILE)
+        if self.garbage_ratio() > 0.5 or not os.path.exists(blob_path) or os.path.getsize(blob_path) != self.blob_size:
+            self._compact(blob_path)
+        elif self.pending:
+            with open(blob_path, "ab") as f:
+                f.write(self.pending)
+
+        table_path = os.path.join(directory, self.TABLE_FILE)
+        with open(table_path + ".tmp", "wb") as f:
+            np.save(f, np.ascontiguousarray(self.table))
+        os.replace(table_path + ".tmp", table_path)
+        sources_path = os.path.join(directory, self.SOURCES_FILE)
+        with open(sources_path + ".tmp", "w") as f:
+            json.dump(self.sources, f)
+        os.replace(sources_path + ".tmp", sources_path)
+
+        self.pending = bytearray()
+        self.table = np.load(table_path, mmap_mode="r")
+        self.blob, self.blob_size = self._map_blob(directory)
+
+    def _compact(self, blob_path):
+        # Rewrite the blob with only the live texts, in id order
+        table = np.array(self.table)
+        offset = 0
+        with open(blob_path + ".tmp", "wb") as f:
+            for row in range(len(table)):
+                data = self._text(table[row]).encode("utf-8")
+                f.write(data)
+                table["offset"][row] = offset
+                offset += len(data)
+        os.replace(blob_path + ".tmp", blob_path)
+        self.table = table
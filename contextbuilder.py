@@ -0,0 +1,179 @@
+# Assembling the RAG prompt context from the retrieved chunks within a token budget
+import re
+
+import numpy as np
+
+from chunking import RegexTokenizer, SENTENCE_END, count_tokens
+
+# Tokens of retrieved text each model gets in its prompt. The small models
+# spend most of a response on prefill, so they get the least.
+CONTEXT_BUDGETS = {
+    "tinydolphin": 256,
+    "orca-mini": 384,
+    "dolphin-phi": 512,
+}
+DEFAULT_CONTEXT_BUDGET = 384
+
+PASSAGE_SEPARATOR = "\n\n"
+LINE_BREAK = re.compile(r"\n+")
+
+
+def model_budget(model):
+    """
+    Context token budget for an Ollama model name such as "orca-mini:3b".
+    """
+    return CONTEXT_BUDGETS.get(model.split(":")[0], DEFAULT_CONTEXT_BUDGET)
+
+
+def split_sentences(text):
+    """
+    Sentences of a chunk as (line number, sentence); chunks keep headings
+    and code on lines of their own.
+    """
+    return [
+        (line_number, sentence)
+        for line_number, line in enumerate(LINE_BREAK.split(text))
+        for sentence in SENTENCE_END.split(line) if sentence.strip()
+    ]
+
+
+def join_sentences(sentences):
+    parts = []
+    for index, (line_number, sentence) in enumerate(sentences):
+        if index:
+            parts.append(" " if line_number == sentences[index - 1][0] else "\n")
+        parts.append(sentence)
+    return "".join(parts)
+
+
+class ContextBuilder:
+    """
+    Picks what goes into the prompt from the retrieved candidate chunks:
+
+    - chunks are chosen by maximal marginal relevance (MMR), trading their
+      similarity to the query against their similarity to the chunks already
+      chosen, so overlapping or repeated passages do not fill the prompt
+    - chunks nearly identical to a chosen one are dropped outright
+    - when the chosen chunks exceed `budget` tokens, their sentences least
+      similar to the query are removed until they fit, then whole chunks
+      from the least relevant one
+
+    Similarities use the embeddings already in the index, so only trimming
+    embeds anything (the sentences of the chosen chunks, in one batch).
+    """
+
+    def __init__(self, embedding_model, budget=DEFAULT_CONTEXT_BUDGET, max_chunks=3, mmr_lambda=0.7,
+                 duplicate_threshold=0.92, tokenizer=None):
+        self.embedding_model = embedding_model
+        self.budget = budget
+        self.max_chunks = max_chunks
+        self.mmr_lambda = mmr_lambda
+        self.duplicate_threshold = duplicate_threshold
+        if tokenizer is None:
+            tokenizer = getattr(embedding_model, "tokenizer", None) or RegexTokenizer()
+        self.tokenizer = tokenizer
+
+    def select(self, embeddings, scores):
+        """
+        MMR selection over the candidates, best first.
+
+        Args:
+            embeddings (np.ndarray): Normalized candidate embeddings, shape (n, d).
+            scores (list): Similarity of each candidate to the query.
+
+        Returns:
+            tuple: (positions of the chosen candidates, number of near-duplicates dropped)
+        """
+        relevance = np.asarray(scores, dtype=np.float32)
+        similarity = embeddings @ embeddings.T
+        chosen, duplicates = [], 0
+        remaining = list(range(len(scores)))
+        while remaining and len(chosen) < self.max_chunks:
+            if chosen:
+                redundancy = similarity[np.ix_(remaining, chosen)].max(axis=1)
+            else:
+                redundancy = np.zeros(len(remaining), dtype=np.float32)
+            mmr = self.mmr_lambda * relevance[remaining] - (1 - self.mmr_lambda) * redundancy
+            best = int(np.argmax(mmr))
+            position = remaining.pop(best)
+            if redundancy[best] >= self.duplicate_threshold:
+                duplicates += 1
+                continue
+            chosen.append(position)
+        return chosen, duplicates
+
+    def trim(self, query_embedding, passages):
+        """
+        Drop the sentences least similar to the query until the passages fit
+        the budget. Sentences keep their order and every passage keeps at
+        least its best sentence.
+
+        Returns:
+            tuple: (passages, dropped sentences)
+        """
+        sentences = [(index, line) for index, passage in enumerate(passages) for line in split_sentences(passage)]
+        texts = [sentence for _, (_, sentence) in sentences]
+        sentence_tokens = count_tokens(self.tokenizer, texts)
+        embeddings = np.asarray(self.embedding_model.encode(texts, normalize_embeddings=True), dtype=np.float32)
+        relevance = embeddings @ query_embedding[0]
+
+        keep = [True] * len(sentences)
+        best_of_passage = {}
+        for position, (index, _) in enumerate(sentences):
+            if index not in best_of_passage or relevance[position] > relevance[best_of_passage[index]]:
+                best_of_passage[index] = position
+        protected = set(best_of_passage.values())
+
+        total = sum(sentence_tokens)
+        dropped = 0
+        for position in np.argsort(relevance):
+            if total <= self.budget:
+                break
+            if position in protected:
+                continue
+            keep[position] = False
+            total -= sentence_tokens[position]
+            dropped += 1
+
+        trimmed = [[] for _ in passages]
+        for position, (index, line) in enumerate(sentences):
+            if keep[position]:
+                trimmed[index].append(line)
+        return [join_sentences(parts) for parts in trimmed], dropped
+
+    def build(self, query_embedding, candidates, embeddings):
+        """
+        Assemble the context for one query.
+
+        Args:
+            query_embedding (np.ndarray): The normalized query, shape (1, d).
+            candidates (list): (score, text) of the retrieved chunks, best first.
+            embeddings (np.ndarray): Normalized embeddings of the candidates.
+
+        Returns:
+            tuple: (context, stats) where stats counts the candidates, the
+            chunks used, the near-duplicates and sentences dropped, and the
+            context tokens before and after trimming.
+        """
+        chosen, duplicates = self.select(embeddings, [score for score, _ in candidates])
+        passages = [candidates[position][1] for position in chosen]
+        passage_tokens = count_tokens(self.tokenizer, passages)
+        stats = {
+            "candidates": len(candidates),
+            "chunks": len(passages),
+            "duplicates_dropped": duplicates,
+            "sentences_dropped": 0,
+            "selected_tokens": sum(passage_tokens),
+        }
+        if self.budget and stats["selected_tokens"] > self.budget:
+            passages, stats["sentences_dropped"] = self.trim(query_embedding, passages)
+            passage_tokens = count_tokens(self.tokenizer, passages)
+            # Still over when every passage is down to its best sentence: drop the passages least
+            # similar to the query (not the last MMR picks) and keep the others in their order
+            relevance = [candidates[position][0] for position in chosen]
+            while len(passages) > 1 and sum(passage_tokens) > self.budget:
+                weakest = relevance.index(min(relevance))
+                del passages[weakest], passage_tokens[weakest], relevance[weakest]
+            stats["chunks"] = len(passages)
+        stats["context_tokens"] = sum(passage_tokens)
+        return PASSAGE_SEPARATOR.join(passages), stats
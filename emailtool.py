@@ -1,34 +1,22 @@
+import concurrent.futures
 import os
-import smtplib
 from email.message import EmailMessage
 from dotenv import load_dotenv
-import spacy
-from langchain_ollama import OllamaLLM
-from langchain_core.prompts import ChatPromptTemplate
-from spacy.cli import download  # Import for downloading spaCy models if not installed
+from modelregistry import get_entity_extractor, get_llm
+from llmstream import StreamStats, timed_stream, atimed_stream, print_stream
+from asyncrunner import run_cpu, ask_console
+from mailtransport import get_mail_transport
 
 # Load environment variables
 load_dotenv()
-SMTP_SERVER = os.getenv("SMTP_SERVER")
-SMTP_PORT = os.getenv("SMTP_PORT")
 SMTP_EMAIL = os.getenv("EMAIL_USER")
-SMTP_PASSWORD = os.getenv("EMAIL_PASSWORD")
 
 class EmailTool:
     def __init__(self):
-        # Load the "tinydolphin" model
-        self.model = OllamaLLM(model="orca-mini")
-        
-        # Check if the model is already installed
-        try:
-            print("Model 'en_core_web_sm' is already loaded!")
-            self.nlp = spacy.load("en_core_web_sm")
-        except OSError:
-            # If not, download the model
-            print("Model 'en_core_web_sm' not found. Downloading now...")
-            download("en_core_web_sm")
-            self.nlp = spacy.load("en_core_web_sm")
-            
+        # Shared "orca-mini" client and NER-only spaCy pipeline
+        self.model = get_llm("orca-mini")
+        self.entity_extractor = get_entity_extractor("en_core_web_sm")
+
         self.recipient_name = None    
 
     def extract_intent(self, user_message):
@@ -46,11 +34,7 @@ class EmailTool:
         """
         Use spaCy NER to extract the recipient's name from the user's message.
         """
-        doc = self.nlp(user_message)
-        for ent in doc.ents:
-            if ent.label_ == "PERSON":
-                return ent.text
-        return None
+        return self.entity_extractor.first_entity(user_message, "PERSON")
 
     def get_user_input(self):
         """
@@ -67,12 +51,13 @@ class EmailTool:
         
         return recipient_email, user_message
 
-    def craft_email(self, recipient_email, user_message):
+    def build_email_prompt(self, user_message, recipient_name=None):
         """
-        Uses LLM to craft an email subject and body based on the recipient's email and user's message.
+        Build the LLM prompt for an email based on the user's message.
+        `recipient_name` defaults to `self.recipient_name`.
         """
-        prompt = f"""
-Create a short friendly email addressed to {self.recipient_name} based on the message: "{user_message}". 
+        return f"""
+Create a short friendly email addressed to {recipient_name or self.recipient_name} based on the message: "{user_message}". 
 Provide only the subject and body of the email in the following format:
 
 Subject: [Insert subject here, relevant to the user message]
@@ -82,9 +67,41 @@ Sign off at the end under my name- {os.getenv("USER_NAME")}
 Do not include any additional text, instructions, or clarifications. The email should be polite and clear, fitting the message context.
         """
 
-        # Pass the prompt as a list to `generate`
-        response = self.model.invoke(prompt)
+    def craft_email(self, recipient_email, user_message):
+        """
+        Uses LLM to craft an email subject and body based on the recipient's email and user's message.
+        """
+        response = self.model.invoke(self.build_email_prompt(user_message))
+        return self.parse_email(response)
+
+    async def acraft_email(self, recipient_email, user_message, recipient_name=None):
+        """
+        Async variant of craft_email using ainvoke.
+        """
+        response = await self.model.ainvoke(self.build_email_prompt(user_message, recipient_name))
+        return self.parse_email(response)
+
+    def stream_email(self, recipient_email, user_message):
+        """
+        Generator variant of craft_email that yields the raw draft as the LLM
+        produces it; pass the joined text to parse_email. Timing of the call is
+        kept in `self.last_stream_stats`.
+        """
+        self.last_stream_stats = StreamStats()
+        yield from timed_stream(self.model.stream(self.build_email_prompt(user_message)), self.last_stream_stats)
 
+    async def astream_email(self, recipient_email, user_message):
+        """
+        Async iterator variant of stream_email.
+        """
+        self.last_stream_stats = StreamStats()
+        async for chunk in atimed_stream(self.model.astream(self.build_email_prompt(user_message)), self.last_stream_stats):
+            yield chunk
+
+    def parse_email(self, response):
+        """
+        Split the LLM output into the email subject and body.
+        """
         subject, body = "", ""
         lines = response.splitlines()
 
@@ -97,6 +114,14 @@ Do not include any additional text, instructions, or clarifications. The email s
 
         return subject.strip(), body.strip()
 
+    def draft_email(self, recipient_email, user_message):
+        """
+        Print the draft while the LLM writes it, then return its subject and body.
+        """
+        draft = print_stream("Drafting email: ", self.stream_email(recipient_email, user_message))
+        print(f"({self.last_stream_stats.summary()})")
+        return self.parse_email(draft)
+
     def confirm_and_send_email(self, recipient_email, subject, body):
         """
         Confirm with the user and send the email using SMTP.
@@ -108,33 +133,55 @@ Do not include any additional text, instructions, or clarifications. The email s
         
         confirm = input("Do you want to send this email? (yes/no): ").strip().lower()
         if confirm == "yes":
+            # Sent through the transport's workers; only report once the server accepted it
             try:
-                # Setup email message
-                msg = EmailMessage()
-                msg["From"] = SMTP_EMAIL
-                msg["To"] = recipient_email
-                msg["Subject"] = subject
-                msg.set_content(body)
-                
-                # Send email using SMTP
-                with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as smtp:
-                    smtp.starttls()
-                    smtp.login(SMTP_EMAIL, SMTP_PASSWORD)
-                    smtp.send_message(msg)
-                
-                print("Email sent successfully!")
+                future = self.queue_email(recipient_email, subject, body)
+                print("Sending email...")
+                concurrent.futures.wait([future])
+                report_delivery(future)
             except Exception as e:
                 print("Failed to send email:", str(e))
         else:
             print("Email sending cancelled.")
 
+    def build_message(self, recipient_email, subject, body):
+        msg = EmailMessage()
+        msg["From"] = SMTP_EMAIL
+        msg["To"] = recipient_email
+        msg["Subject"] = subject
+        msg.set_content(body)
+        return msg
+
+    def send_email(self, recipient_email, subject, body):
+        """
+        Send the email over the shared SMTP connection pool and wait for the
+        server. Errors are raised to the caller.
+        """
+        get_mail_transport().send(self.build_message(recipient_email, subject, body))
+
+    def queue_email(self, recipient_email, subject, body):
+        """
+        Queue the email for the transport's background workers.
+
+        Returns:
+            concurrent.futures.Future: Resolves once the email is sent.
+        """
+        return get_mail_transport().submit(self.build_message(recipient_email, subject, body))
+
+    async def asend_email(self, recipient_email, subject, body):
+        """
+        Send the email through the background queue and wait for it without
+        blocking the event loop.
+        """
+        await get_mail_transport().asend(self.build_message(recipient_email, subject, body))
+
     def handle_email_conversation(self):
         """
         Main method to handle the email conversation and process the email request.
         """
         print("Let's get started with sending an email!")
         recipient_email, user_message = self.get_user_input()
-        subject, body = self.craft_email(recipient_email, user_message)
+        subject, body = self.draft_email(recipient_email, user_message)
         self.confirm_and_send_email(recipient_email, subject, body)
 
     def handle_email_conversation_with_initial_message(self, first_message):
@@ -150,11 +197,48 @@ Do not include any additional text, instructions, or clarifications. The email s
             recipient_name = input("Please provide recipient's name: ")
             
         user_message = first_message
-        subject, body = self.craft_email(recipient_email, user_message)
+        self.recipient_name = recipient_name
+        subject, body = self.draft_email(recipient_email, user_message)
         self.confirm_and_send_email(recipient_email, subject, body)
         
         return "continue"
 
+    async def ahandle_email_conversation_with_initial_message(self, first_message, ask=ask_console):
+        """
+        Async variant of handle_email_conversation_with_initial_message. Follow-up
+        questions go through the `ask` coroutine, and the conversation state
+        stays local so concurrent sessions can share the tool.
+
+        Returns:
+            str: The outcome to show the user.
+        """
+        recipient_name = await run_cpu(self.extract_name, first_message)
+        if recipient_name:
+            recipient_email = await ask(f"Please provide {recipient_name}'s email address: ")
+        else:
+            recipient_email = await ask("Please provide the recipient's email address: ")
+            recipient_name = await ask("Please provide recipient's name: ")
+
+        subject, body = await self.acraft_email(recipient_email, first_message, recipient_name)
+        confirm = await ask(
+            f"Please review the email details:\nTo: {recipient_email}\nSubject: {subject}\nBody:\n{body}\n\n"
+            "Do you want to send this email? (yes/no): "
+        )
+        if confirm.strip().lower() != "yes":
+            return "Email sending cancelled."
+        try:
+            await self.asend_email(recipient_email, subject, body)
+        except Exception as e:
+            return f"Failed to send email: {e}"
+        return "Email sent successfully!"
+
+def report_delivery(future):
+    # Outcome of a queued email
+    if future.exception() is not None:
+        print(f"\nFailed to send email: {future.exception()}")
+    else:
+        print("\nEmail sent successfully!")
+
 # Example usage of the EmailTool
 if __name__ == "__main__":
     email_tool = EmailTool()
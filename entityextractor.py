@@ -0,0 +1,61 @@
+# Named-entity extraction on a spaCy pipeline trimmed down to NER
+import threading
+from functools import lru_cache
+
+from modelregistry import get_spacy
+from tracing import span
+
+# Components of the en_core_web_* pipelines that NER does not need
+NON_NER_COMPONENTS = ("tagger", "parser", "attribute_ruler", "lemmatizer", "senter")
+
+
+def load_ner_pipeline(name="en_core_web_sm"):
+    """
+    Shared spaCy pipeline without the components NER does not need. The
+    shared tok2vec is disabled as well when nothing listens to it any more
+    (the ner component of the sm pipelines has its own).
+    """
+    nlp = get_spacy(name, exclude=NON_NER_COMPONENTS)
+    if "tok2vec" in nlp.pipe_names and not nlp.get_pipe("tok2vec").listening_components:
+        nlp.disable_pipe("tok2vec")
+    return nlp
+
+
+class EntityExtractor:
+    """
+    Finds named entities (GPE, PERSON, ...) in messages. Results are cached
+    per message and extract_many runs nlp.pipe for bulk/offline use.
+    """
+
+    def __init__(self, model_name="en_core_web_sm", cache_size=1024):
+        self.nlp = load_ner_pipeline(model_name)
+        self.entities = lru_cache(maxsize=cache_size)(self._entities)
+        # spaCy pipelines are not guaranteed to be thread-safe
+        self.lock = threading.Lock()
+
+    def _entities(self, text):
+        with span("ner"), self.lock:
+            doc = self.nlp(text)
+        return tuple((ent.text, ent.label_) for ent in doc.ents)
+
+    def first_entity(self, text, label):
+        """
+        Return the text of the first entity with the given label, or None.
+        """
+        return next((entity for entity, entity_label in self.entities(text) if entity_label == label), None)
+
+    def extract_many(self, texts, batch_size=64, n_process=1):
+        """
+        Extract the entities of many messages with nlp.pipe.
+
+        Returns:
+            list: A tuple of (text, label) pairs per message.
+        """
+        results = []
+        with span("ner", batch=len(texts)), self.lock:
+            for doc in self.nlp.pipe(texts, batch_size=batch_size, n_process=n_process):
+                results.append(tuple((ent.text, ent.label_) for ent in doc.ents))
+        return results
+
+    def cache_info(self):
+        return self.entities.cache_info()
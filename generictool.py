@@ -1,10 +1,18 @@
 # Import necessary classes for integrating with Ollama and LangChain
-from langchain_ollama import OllamaLLM
 from langchain_core.prompts import ChatPromptTemplate
+from modelregistry import get_llm
+from semanticcache import SemanticCache
+from llmstream import StreamStats, timed_stream, atimed_stream, print_stream
+from asyncrunner import run_cpu
 
 
 class GenericTool:
-    def __init__(self):
+    def __init__(self, embedding_model=None):
+        """
+        Parameters:
+            embedding_model (SentenceTransformer): Optional embedding model. When
+                given, responses are cached by the semantic similarity of questions.
+        """
         # Define the template for the assistant's response
         self.template = """
         You are an assistant. Respond to the user's message as directly and concisely as possible. 
@@ -13,17 +21,33 @@ class GenericTool:
         User message: {question}
         """
         
-        # Initialize the model with the specified "tinydolphin" model
-        self.model = OllamaLLM(model="dolphin-phi")
-        # self.model = OllamaLLM(model="tinydolphin")
-        # self.model = OllamaLLM(model="orca-mini")
+        # Use the shared client for the "dolphin-phi" model
+        self.model = get_llm("dolphin-phi")
+        # self.model = get_llm("tinydolphin")
+        # self.model = get_llm("orca-mini")
         
         # Create a ChatPromptTemplate using the defined template
         self.prompt = ChatPromptTemplate.from_template(template=self.template)
         
         # Combine the prompt template with the model to create a processing chain
         self.chain = self.prompt | self.model
+
+        # Cache answers to repeated questions, reusing an already loaded embedding model
+        self.embedding_model = embedding_model
+        self.response_cache = SemanticCache() if embedding_model is not None else None
         
+    def lookup_cache(self, question):
+        """
+        Look the question up in the response cache.
+
+        Returns:
+            tuple: (query embedding, cached response), both None without a cache.
+        """
+        if not self.response_cache:
+            return None, None
+        query_embedding = self.embedding_model.encode([question], normalize_embeddings=True)
+        return query_embedding, self.response_cache.lookup(query_embedding)
+
     def get_response(self, question):
         """
         Method to get a response from the LLM based on the provided question.
@@ -34,10 +58,73 @@ class GenericTool:
         Returns:
             str: The response from the LLM.
         """
+        query_embedding, cached = self.lookup_cache(question)
+        if cached is not None:
+            return cached
+
         # Use the model chain to generate a response based on the user's question.
         result = self.chain.invoke({"question": question})
+        if self.response_cache:
+            self.response_cache.store(query_embedding, result)
         return result
 
+    async def aget_response(self, question):
+        """
+        Async variant of get_response. The query embedding is computed in the
+        CPU pool and the LLM is called with ainvoke.
+        """
+        query_embedding, cached = await run_cpu(self.lookup_cache, question)
+        if cached is not None:
+            return cached
+
+        result = await self.chain.ainvoke({"question": question})
+        if self.response_cache:
+            self.response_cache.store(query_embedding, result)
+        return result
+
+    def stream_response(self, question):
+        """
+        Generator variant of get_response that yields the response as the LLM
+        produces it. Timing of the call is kept in `self.last_stream_stats`.
+        
+        Args:
+            question (str): The question to be answered by the assistant.
+
+        Yields:
+            str: Chunks of the response.
+        """
+        self.last_stream_stats = StreamStats()
+        query_embedding, cached = self.lookup_cache(question)
+        if cached is not None:
+            yield from timed_stream([cached], self.last_stream_stats)
+            return
+
+        parts = []
+        for chunk in timed_stream(self.chain.stream({"question": question}), self.last_stream_stats):
+            parts.append(chunk)
+            yield chunk
+        if self.response_cache:
+            self.response_cache.store(query_embedding, "".join(parts))
+
+    async def astream_response(self, question):
+        """
+        Async iterator variant of stream_response.
+        """
+        self.last_stream_stats = StreamStats()
+        query_embedding, cached = await run_cpu(self.lookup_cache, question)
+        if cached is not None:
+            self.last_stream_stats.record(cached)
+            self.last_stream_stats.finish()
+            yield cached
+            return
+
+        parts = []
+        async for chunk in atimed_stream(self.chain.astream({"question": question}), self.last_stream_stats):
+            parts.append(chunk)
+            yield chunk
+        if self.response_cache:
+            self.response_cache.store(query_embedding, "".join(parts))
+
     def handle_conversation(self):
         """
         Function to handle the user interaction with the virtual assistant.
@@ -54,9 +141,9 @@ class GenericTool:
             if user_input.lower() == 'exit':
                 break
             
-            result = self.get_response(user_input)
-            # Print the assistant's response.
-            print("Generic Bot:", result)
+            # Print the assistant's response as it is generated.
+            print_stream("Generic Bot: ", self.stream_response(user_input))
+            print(f"({self.last_stream_stats.summary()})")
     
     def handle_conversation_with_initial_message(self, first_message):
         """
@@ -69,8 +156,8 @@ class GenericTool:
         
         # Process the initial message first
         user_input = first_message
-        result = self.get_response(user_input)
-        print("Generic Bot:", result)       
+        print_stream("Generic Bot: ", self.stream_response(user_input))
+        print(f"({self.last_stream_stats.summary()})")
             
         return "continue"    
 
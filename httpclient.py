@@ -0,0 +1,283 @@
+# Pooled, retrying HTTP client for the swagger-driven API calls
+import asyncio
+import bisect
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+CONNECT_TIMEOUT = 3.05  # Seconds, slightly above a TCP retransmission window
+READ_TIMEOUT = 10.0
+RETRIES = 3
+BACKOFF_FACTOR = 0.3  # Sleeps 0.3 s, 0.6 s, 1.2 s between attempts
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+POOL_SIZE = 20
+
+_breakers = {}
+_histograms = {}
+_registry_lock = threading.Lock()
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling a base URL whose circuit breaker is open.
+    """
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing service. After `failure_threshold` consecutive
+    failures the circuit opens and calls fail fast for `reset_timeout`
+    seconds; then a single trial call is let through (half-open), which
+    closes the circuit again on success.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+        self.trial_started_at = None
+
+    @property
+    def state(self):
+        with self.lock:
+            return self._state()
+
+    def _state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow_request(self):
+        with self.lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            # One trial at a time; a trial that never reported back (e.g. a
+            # cancelled call) is replaced after another reset_timeout
+            now = time.monotonic()
+            if state == "half-open" and (self.trial_started_at is None or now - self.trial_started_at >= self.reset_timeout):
+                self.trial_started_at = now
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_started_at = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_started_at = None
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class LatencyHistogram:
+    """
+    Cumulative latency histogram with fixed millisecond buckets.
+    """
+
+    BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float("inf"))
+
+    def __init__(self, buckets_ms=None):
+        if buckets_ms is not None:
+            self.BUCKETS_MS = tuple(buckets_ms)
+        self.lock = threading.Lock()
+        self.counts = [0] * len(self.BUCKETS_MS)
+        self.count = 0
+        self.total_ms = 0.0
+        self.errors = 0
+
+    def observe(self, latency_ms, error=False):
+        with self.lock:
+            self.counts[bisect.bisect_left(self.BUCKETS_MS, latency_ms)] += 1
+            self.count += 1
+            self.total_ms += latency_ms
+            if error:
+                self.errors += 1
+
+    def percentile(self, fraction):
+        """
+        Upper bound of the bucket holding the given fraction of the calls.
+        """
+        with self.lock:
+            if self.count == 0:
+                return None
+            rank = fraction * self.count
+            seen = 0
+            for bound, count in zip(self.BUCKETS_MS, self.counts):
+                seen += count
+                if seen >= rank:
+                    return bound
+            return self.BUCKETS_MS[-1]
+
+    def snapshot(self):
+        with self.lock:
+            count, total_ms, errors, counts = self.count, self.total_ms, self.errors, list(self.counts)
+        return {
+            "count": count,
+            "errors": errors,
+            "mean_ms": total_ms / count if count else 0.0,
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "buckets": dict(zip([str(bound) for bound in self.BUCKETS_MS], counts)),
+        }
+
+
+def get_circuit_breaker(base_url):
+    """
+    Circuit breaker shared by every client of the base URL.
+    """
+    with _registry_lock:
+        return _breakers.setdefault(base_url.rstrip("/"), CircuitBreaker())
+
+
+def get_latency_histogram(operation_id):
+    with _registry_lock:
+        return _histograms.setdefault(operation_id, LatencyHistogram())
+
+
+def latency_report():
+    """
+    Latency histogram snapshot per operationId.
+    """
+    with _registry_lock:
+        histograms = dict(_histograms)
+    return {operation_id: histogram.snapshot() for operation_id, histogram in histograms.items()}
+
+
+def print_latency_report():
+    for operation_id, stats in latency_report().items():
+        print(f"{operation_id:<28}{stats['count']:>6} calls{stats['errors']:>5} errors"
+              f"  mean {stats['mean_ms']:.1f} ms  p50 <= {stats['p50_ms']} ms  p95 <= {stats['p95_ms']} ms")
+
+
+class APIClient:
+    """
+    HTTP client for one API base URL. Connections are pooled and kept alive,
+    every call has connect/read timeouts, idempotent calls are retried with
+    exponential backoff on connection errors and 429/5xx responses, and a
+    circuit breaker per base URL fails fast while the service is down.
+    Latencies are recorded per operationId.
+    """
+
+    def __init__(self, base_url, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT,
+                 retries=RETRIES, backoff_factor=BACKOFF_FACTOR, pool_size=POOL_SIZE):
+        self.base_url = base_url.rstrip("/")
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.pool_size = pool_size
+        self.breaker = get_circuit_breaker(self.base_url)
+
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(["GET", "HEAD"]),
+            raise_on_status=False,  # Hand the last response to the caller
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        # httpx client for the async calls, created on first use
+        self.async_client = None
+
+    def url(self, path):
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def get(self, path, params=None, operation_id=None):
+        """
+        GET a path of the API.
+
+        Returns:
+            requests.Response: The response after retries.
+
+        Raises:
+            CircuitOpenError: The base URL is failing and is not called.
+            requests.RequestException: The call failed after the retries.
+        """
+        if not self.breaker.allow_request():
+            raise CircuitOpenError(f"Circuit open for {self.base_url}")
+        histogram = get_latency_histogram(operation_id or path)
+        start_time = time.perf_counter()
+        try:
+            response = self.session.get(self.url(path), params=params, timeout=(self.connect_timeout, self.read_timeout))
+        except requests.RequestException:
+            histogram.observe((time.perf_counter() - start_time) * 1000, error=True)
+            self.breaker.record_failure()
+            raise
+        self.record_response(histogram, start_time, response.status_code)
+        return response
+
+    def get_async_client(self):
+        if self.async_client is None:
+            import httpx
+            self.async_client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+            )
+        return self.async_client
+
+    async def aget(self, path, params=None, operation_id=None):
+        """
+        Async variant of get on a pooled httpx client, with the same retry
+        policy, breaker and histograms.
+
+        Returns:
+            httpx.Response: The response after retries.
+        """
+        import httpx
+
+        if not self.breaker.allow_request():
+            raise CircuitOpenError(f"Circuit open for {self.base_url}")
+        histogram = get_latency_histogram(operation_id or path)
+        start_time = time.perf_counter()
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(self.backoff_factor * 2 ** (attempt - 1))
+            try:
+                response = await self.get_async_client().get(self.url(path), params=params)
+            except httpx.TransportError:
+                if attempt < self.retries:
+                    continue
+                histogram.observe((time.perf_counter() - start_time) * 1000, error=True)
+                self.breaker.record_failure()
+                raise
+            if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                break
+        self.record_response(histogram, start_time, response.status_code)
+        return response
+
+    def record_response(self, histogram, start_time, status_code):
+        # Client errors mean a bad request, not a failing service
+        failed = status_code >= 500 or status_code == 429
+        histogram.observe((time.perf_counter() - start_time) * 1000, error=failed)
+        if failed:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def close(self):
+        self.session.close()
+
+    async def aclose(self):
+        if self.async_client is not None:
+            await self.async_client.aclose()
+            self.async_client = None
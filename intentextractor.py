@@ -1,16 +1,5 @@
 import re
-from langchain_ollama import OllamaLLM
-import spacy
-from spacy.cli import download
-
-# Check if the model is already installed
-try:
-    nlp = spacy.load("en_core_web_sm")
-except OSError:
-    # If not, download the model
-    print("Model 'en_core_web_sm' not found. Downloading now...")
-    download("en_core_web_sm")
-    nlp = spacy.load("en_core_web_sm")
+from modelregistry import get_entity_extractor, get_intent_router, get_llm
 
 # # Now you can use `nlp` as usual
 # doc = nlp("Steve's Apple is opening a new office in New York on January 15.")
@@ -21,24 +10,23 @@ except OSError:
 class UnifiedExtractor:
     def __init__(self):
         # Initialize LLM for more complex parsing
-        self.llm = OllamaLLM(model="tinydolphin")
+        self.llm = get_llm("tinydolphin")
         
+    # Router intents handled by this extractor
+    ROUTER_INTENTS = {"send_email": "SEND_EMAIL", "call_api": "WEATHER_CHECK"}
+
     def extract_intent(self, user_message):
-        # Simple intent extraction logic (this could be enhanced)
-        if "email" in user_message or "send" in user_message:
-            return "SEND_EMAIL"
-        elif "weather" in user_message or "hot" in user_message or "cold" in user_message:
-            return "WEATHER_CHECK"
-        else:
-            return "UNKNOWN"
+        # Classify with the shared embedding router
+        intent, _ = get_intent_router().classify(user_message)
+        return self.ROUTER_INTENTS.get(intent, "UNKNOWN")
 
     def extract_metadata(self, user_message, intent):
-        doc = nlp(user_message)
+        entity_extractor = get_entity_extractor("en_core_web_sm")
         metadata = {}
         
         if intent == "SEND_EMAIL":
             # Extract recipient's name (Assume the format "to {name}")
-            recipient = next((ent.text for ent in doc.ents if ent.label_ == "PERSON"), None)
+            recipient = entity_extractor.first_entity(user_message, "PERSON")
             metadata['recipient'] = recipient
             
             # Ask for email address if not provided
@@ -51,7 +39,7 @@ class UnifiedExtractor:
 
         elif intent == "WEATHER_CHECK":
             # Extract location
-            location = next((ent.text for ent in doc.ents if ent.label_ == "GPE"), None)
+            location = entity_extractor.first_entity(user_message, "GPE")
             metadata['location'] = location if location else input("Please provide a location for the weather check: ")
 
         return metadata
@@ -80,5 +68,6 @@ class APITool:
         print(f"Checking weather for {metadata['location']}")
 
 # Example usage
-user_message = input("Enter your message: ")
-UnifiedExtractor().process_request(user_message)
+if __name__ == "__main__":
+    user_message = input("Enter your message: ")
+    UnifiedExtractor().process_request(user_message)
@@ -0,0 +1,123 @@
+# Single-pass intent classification with the shared MiniLM embedding model
+import numpy as np
+
+from tracing import span
+
+# Example messages per intent. Their normalized mean embedding is the
+# prototype the messages are compared with.
+INTENT_EXAMPLES = {
+    "send_email": [
+        "send an email to John",
+        "email Sarah about the project update",
+        "write a mail to my manager",
+        "draft an email asking for the invoice",
+        "compose a message to the team about the release",
+        "can you send a mail to Priya",
+        "reply to the client by email",
+        "email the report to Michael",
+    ],
+    "schedule_meeting": [
+        "schedule a meeting with Alice",
+        "set up a call with the team tomorrow",
+        "book an appointment for next Monday",
+        "send a meeting invite for Friday at 3pm",
+        "arrange a meeting with the client next week",
+        "put a sync with David on my calendar",
+        "create a calendar invite for the standup",
+        "organise a meeting at 10 am",
+    ],
+    "call_api": [
+        "what's the weather in London",
+        "weather forecast for New York this weekend",
+        "is it raining in Paris right now",
+        "how hot is it in Mumbai today",
+        "what is the temperature outside",
+        "will it be sunny tomorrow",
+        "current weather conditions in Berlin",
+        "do I need an umbrella today",
+    ],
+    "search_rag": [
+        "what is Cassandra",
+        "what are the differences between Cassandra and Dynamo",
+        "what is spring boot",
+        "what is Angular",
+        "how to create a Spring Cloud configuration server",
+        "when is an interceptor used in spring boot",
+        "search the documents for ahead-of-time compilation",
+        "what does the documentation say about high availability",
+    ],
+    "generic": [
+        "hello",
+        "how are you",
+        "tell me a joke",
+        "what are you",
+        "what's your favorite color",
+        "thanks, that's all",
+        "who made you",
+        "good morning",
+    ],
+}
+
+# Tool used when no prototype is similar enough
+FALLBACK_INTENT = "generic"
+
+
+class IntentRouter:
+    """
+    Nearest-centroid intent classifier. Each intent is represented by the
+    normalized mean embedding of its examples, so classifying a message is
+    one encode plus a (intents x dimension) matrix-vector product.
+    """
+
+    def __init__(self, embedding_model, examples=None, threshold=0.35, fallback=FALLBACK_INTENT):
+        """
+        Parameters:
+            embedding_model (SentenceTransformer): Model used for the prototypes and the messages.
+            examples (dict): Intent name to example messages, INTENT_EXAMPLES by default.
+            threshold (float): Minimum cosine similarity to a prototype, below it
+                the message is routed to `fallback`.
+            fallback (str): Intent returned for messages no prototype matches.
+        """
+        self.embedding_model = embedding_model
+        self.threshold = threshold
+        self.fallback = fallback
+        examples = examples or INTENT_EXAMPLES
+
+        self.intents = list(examples)
+        texts = [text for intent in self.intents for text in examples[intent]]
+        embeddings = np.asarray(self.embedding_model.encode(texts, normalize_embeddings=True), dtype=np.float32)
+
+        # One normalized centroid per intent
+        self.prototypes = np.zeros((len(self.intents), embeddings.shape[1]), dtype=np.float32)
+        start = 0
+        for row, intent in enumerate(self.intents):
+            end = start + len(examples[intent])
+            centroid = embeddings[start:end].mean(axis=0)
+            self.prototypes[row] = centroid / np.linalg.norm(centroid)
+            start = end
+
+    def encode(self, user_message):
+        with span("query_embedding", model="intent_router"):
+            return np.asarray(self.embedding_model.encode([user_message], normalize_embeddings=True), dtype=np.float32)
+
+    def classify(self, user_message, embedding=None):
+        """
+        Classify a message in a single pass.
+
+        Args:
+            user_message (str): The user's message.
+            embedding (numpy.ndarray): Normalized embedding of the message, if already computed.
+
+        Returns:
+            tuple: (intent, confidence), where confidence is the cosine
+                similarity to the closest prototype.
+        """
+        with span("intent_routing") as stage:
+            if embedding is None:
+                embedding = self.encode(user_message)
+            similarities = self.prototypes @ np.asarray(embedding, dtype=np.float32).reshape(-1)
+            best = int(np.argmax(similarities))
+            confidence = float(similarities[best])
+            intent = self.intents[best] if confidence >= self.threshold else self.fallback
+            stage.set("intent", intent)
+            return intent, confidence
@@ -0,0 +1,294 @@
+# iCalendar (RFC 5545) invites and templated per-recipient invite emails
+import email.policy
+import uuid
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+from email.utils import formataddr, make_msgid
+
+PRODID = "-//AIChatbot//Meeting Invites//EN"
+MAX_LINE_OCTETS = 75  # Content lines longer than this are folded
+CRLF = "\r\n"
+
+FREQUENCIES = {
+    "daily": "DAILY",
+    "weekly": "WEEKLY",
+    "monthly": "MONTHLY",
+    "yearly": "YEARLY",
+}
+UNITS = {"day": "daily", "week": "weekly", "month": "monthly", "year": "yearly"}
+
+# Placeholders in the rendered template, replaced per recipient
+TO_TOKEN = "x-invite-to-placeholder"
+MESSAGE_ID_TOKEN = "x-invite-message-id-placeholder"
+ATTENDEES_TOKEN = "X-INVITE-ATTENDEES-PLACEHOLDER"
+
+
+def escape_text(value):
+    # TEXT values escape backslashes, separators and newlines
+    return (str(value).replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+
+def fold_line(line):
+    """
+    Fold a content line into chunks of at most 75 octets, continued on the
+    next line after a single space, without splitting UTF-8 sequences.
+    """
+    encoded = line.encode("utf-8")
+    if len(encoded) <= MAX_LINE_OCTETS:
+        return line
+    chunks = []
+    start = 0
+    limit = MAX_LINE_OCTETS
+    while start < len(encoded):
+        end = min(start + limit, len(encoded))
+        # Step back off UTF-8 continuation bytes
+        while end < len(encoded) and encoded[end] & 0xC0 == 0x80:
+            end -= 1
+        chunks.append(encoded[start:end].decode("utf-8"))
+        start = end
+        limit = MAX_LINE_OCTETS - 1  # Continuation lines start with a space
+    return (CRLF + " ").join(chunks)
+
+
+def format_utc(value):
+    # Naive datetimes are local time, as entered by the user
+    return value.astimezone(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def new_uid(organizer=None):
+    """
+    Globally unique UID for a new event, in the organizer's domain.
+    """
+    domain = organizer.rpartition("@")[2] if organizer and "@" in organizer else "aichatbot.local"
+    return f"{uuid.uuid4()}@{domain}"
+
+
+def build_rrule(frequency, count=None, until=None, interval=1, by_day=None):
+    """
+    Build an RRULE value, e.g. build_rrule("weekly", count=10) -> "FREQ=WEEKLY;COUNT=10".
+
+    Args:
+        frequency (str): daily, weekly, monthly or yearly.
+        count (int): Number of occurrences.
+        until (datetime): Last possible start of an occurrence.
+        interval (int): Repeat every `interval` periods.
+        by_day (list): Weekdays, e.g. ["MO", "WE"].
+    """
+    parts = [f"FREQ={FREQUENCIES[frequency.lower()]}"]
+    if interval and interval != 1:
+        parts.append(f"INTERVAL={int(interval)}")
+    if count:
+        parts.append(f"COUNT={int(count)}")
+    elif until is not None:
+        parts.append(f"UNTIL={format_utc(until)}")
+    if by_day:
+        parts.append("BYDAY=" + ",".join(day.upper() for day in by_day))
+    return ";".join(parts)
+
+
+def parse_recurrence(text):
+    """
+    Parse an answer like "weekly 10" or "every 2 weeks 6" into an RRULE
+    value. A number right after "every" is the interval, any other number
+    ("weekly 10", "every 2 weeks for 6 times") the number of meetings;
+    without one the meeting repeats with no end. An empty answer or "no"
+    means a single meeting.
+
+    Returns:
+        str: The RRULE value, or None.
+    """
+    words = text.lower().replace(",", " ").split()
+    if not words or words[0] in ("no", "none", "once"):
+        return None
+    frequency, interval, count = None, 1, None
+    for position, word in enumerate(words):
+        if word.isdigit():
+            if position and words[position - 1] == "every":
+                interval = int(word)
+            else:
+                count = int(word)
+            continue
+        word = word.rstrip("s") if word.endswith("s") and word[:-1] in UNITS else word
+        frequency = word if word in FREQUENCIES else UNITS.get(word, frequency)
+    if frequency is None:
+        raise ValueError(f"unknown recurrence {text!r}, expected daily, weekly, monthly or yearly")
+    return build_rrule(frequency, count=count, interval=interval)
+
+
+def attendee_line(address, name=None, rsvp=True):
+    params = ["CUTYPE=INDIVIDUAL", "ROLE=REQ-PARTICIPANT", "PARTSTAT=NEEDS-ACTION", f"RSVP={'TRUE' if rsvp else 'FALSE'}"]
+    if name:
+        params.insert(0, f'CN="{name.replace(chr(34), chr(39))}"')
+    return fold_line(f"ATTENDEE;{';'.join(params)}:mailto:{address}")
+
+
+class Invite:
+    """
+    A meeting request. The event keeps one UID for all recipients and all
+    occurrences, so updates and replies are matched to the same event.
+    """
+
+    def __init__(self, organizer, subject, start_time, duration, attendees=(), agenda="", location="",
+                 rrule=None, uid=None, sequence=0, organizer_name=None):
+        """
+        Parameters:
+            organizer (str): Email address of the organizer, used as the sender.
+            subject (str): Meeting title.
+            start_time (datetime): Start of the (first) meeting; naive values are local time.
+            duration (int): Length in minutes.
+            attendees (list): Email addresses, or (name, address) pairs.
+            rrule (str): Recurrence rule value, see build_rrule.
+            uid (str): UID of an existing event, to update it; a new one by default.
+        """
+        self.organizer = organizer
+        self.organizer_name = organizer_name
+        self.subject = subject
+        self.start_time = start_time
+        self.duration = int(duration)
+        self.attendees = [attendee if isinstance(attendee, tuple) else (None, attendee) for attendee in attendees]
+        self.agenda = agenda
+        self.location = location
+        self.rrule = rrule
+        self.uid = uid or new_uid(organizer)
+        self.sequence = sequence
+
+    @property
+    def end_time(self):
+        return self.start_time + timedelta(minutes=self.duration)
+
+    def attendee_lines(self, attendees=None):
+        return CRLF.join(attendee_line(address, name) for name, address in (self.attendees if attendees is None else attendees))
+
+    def render_ics(self, attendees=None, attendees_block=None):
+        """
+        Render the VCALENDAR text with CRLF line endings.
+
+        Args:
+            attendees (list): (name, address) pairs to list; all attendees by default.
+            attendees_block (str): Already rendered ATTENDEE lines, used instead.
+        """
+        organizer = f"ORGANIZER;CN=\"{self.organizer_name}\":mailto:{self.organizer}" if self.organizer_name \
+            else f"ORGANIZER:mailto:{self.organizer}"
+        lines = [
+            "BEGIN:VCALENDAR",
+            "VERSION:2.0",
+            f"PRODID:{PRODID}",
+            "CALSCALE:GREGORIAN",
+            "METHOD:REQUEST",
+            "BEGIN:VEVENT",
+            f"UID:{self.uid}",
+            f"SEQUENCE:{self.sequence}",
+            f"DTSTAMP:{format_utc(datetime.now(timezone.utc))}",
+            f"DTSTART:{format_utc(self.start_time)}",
+            f"DTEND:{format_utc(self.end_time)}",
+        ]
+        if self.rrule:
+            lines.append(f"RRULE:{self.rrule}")
+        lines += [
+            f"SUMMARY:{escape_text(self.subject)}",
+            f"DESCRIPTION:{escape_text(self.agenda)}",
+            f"LOCATION:{escape_text(self.location)}",
+            "STATUS:CONFIRMED",
+            "TRANSP:OPAQUE",
+            organizer,
+        ]
+        folded = [fold_line(line) for line in lines]
+        block = attendees_block if attendees_block is not None else self.attendee_lines(attendees)
+        if block:
+            folded.append(block)
+        folded += ["END:VEVENT", "END:VCALENDAR"]
+        return CRLF.join(folded) + CRLF
+
+    def body_text(self):
+        repeats = f"\nRepeats: {self.rrule}" if self.rrule else ""
+        return (f"Hello,\n\nYou are invited to the following meeting:\n\nSubject: {self.subject}\n"
+                f"Location: {self.location}\nStart Time: {self.start_time}\nDuration: {self.duration} minutes{repeats}"
+                f"\n\nAgenda: {self.agenda}")
+
+    def build_message(self, to=None, ics=None):
+        """
+        Build the invite email: a plain text part and the text/calendar
+        request, which calendar clients show as the invitation.
+        """
+        msg = EmailMessage()
+        msg["From"] = formataddr((self.organizer_name, self.organizer)) if self.organizer_name else self.organizer
+        msg["To"] = to if to is not None else ", ".join(address for _, address in self.attendees)
+        msg["Subject"] = self.subject
+        msg.set_content(self.body_text())
+        # 8bit keeps the folded ICS lines byte for byte, so placeholders can be substituted in the output
+        msg.add_alternative(ics if ics is not None else self.render_ics(), subtype="calendar", cte="8bit",
+                            params={"method": "REQUEST"}, disposition="inline", filename="invite.ics")
+        return msg
+
+    def template(self, list_attendees=True):
+        return InviteTemplate(self, list_attendees)
+
+
+class InviteTemplate:
+    """
+    An invite email rendered once, with placeholders for the recipient.
+    Each recipient's copy is produced by joining the pre-rendered segments
+    with that recipient's To header, Message-ID and, if attendees are not
+    listed, their own ATTENDEE line, instead of rebuilding the MIME tree.
+    """
+
+    def __init__(self, invite, list_attendees=True):
+        """
+        Parameters:
+            invite (Invite): The meeting request.
+            list_attendees (bool): List every attendee in each copy. When False
+                each copy lists only its recipient, which keeps the copies
+                small for large invites and does not reveal the list.
+        """
+        self.invite = invite
+        self.list_attendees = list_attendees
+        ics = invite.render_ics(attendees_block=None if list_attendees else ATTENDEES_TOKEN)
+        msg = invite.build_message(to=TO_TOKEN, ics=ics)
+        msg["Message-ID"] = MESSAGE_ID_TOKEN
+        rendered = msg.as_bytes(policy=email.policy.SMTP)
+
+        # Split the bytes once into literal segments and the placeholder between them
+        self.segments = []
+        self.fields = []
+        tokens = {TO_TOKEN.encode(): "to", MESSAGE_ID_TOKEN.encode(): "message_id", ATTENDEES_TOKEN.encode(): "attendee"}
+        position = 0
+        while True:
+            found = [(rendered.find(token, position), token) for token in tokens]
+            found = [(index, token) for index, token in found if index >= 0]
+            if not found:
+                break
+            index, token = min(found)
+            self.segments.append(rendered[position:index])
+            self.fields.append(tokens[token])
+            position = index + len(token)
+        self.segments.append(rendered[position:])
+        self.domain = invite.uid.rpartition("@")[2]
+
+    def render(self, address, name=None):
+        """
+        The recipient's copy of the invite.
+
+        Returns:
+            bytes: The message, ready to pass to SMTP.sendmail.
+        """
+        # The To header is substituted after the policy encoded the headers, so encode a
+        # non-ASCII display name here (RFC 2047); the ICS body is 8bit and takes UTF-8
+        values = {
+            "to": formataddr((name, address), charset="utf-8").encode("utf-8") if name else address.encode("utf-8"),
+            "message_id": make_msgid(domain=self.domain).encode(),
+            "attendee": attendee_line(address, name).encode("utf-8"),
+        }
+        parts = [self.segments[0]]
+        for field, segment in zip(self.fields, self.segments[1:]):
+            parts.append(values[field])
+            parts.append(segment)
+        return b"".join(parts)
+
+    def messages(self):
+        """
+        One (message, from address, recipient addresses) item per attendee,
+        as taken by MailTransport.send_many.
+        """
+        for name, address in self.invite.attendees:
+            yield self.render(address, name), self.invite.organizer, [address]
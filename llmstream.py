@@ -0,0 +1,129 @@
+# Timing helpers for streamed LLM responses
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+import tracing
+
+
+class StreamStats:
+    """
+    Time-to-first-token and throughput of one streamed LLM call. Ollama
+    streams roughly one token per chunk, so chunks are counted as tokens.
+    """
+
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.first_token_time = None
+        self.end_time = None
+        self.tokens = 0
+
+    def record(self, chunk):
+        if self.first_token_time is None:
+            self.first_token_time = time.perf_counter()
+        self.tokens += 1
+
+    def finish(self):
+        self.end_time = time.perf_counter()
+
+    @property
+    def time_to_first_token(self):
+        if self.first_token_time is None:
+            return None
+        return self.first_token_time - self.start_time
+
+    @property
+    def total_time(self):
+        return (self.end_time or time.perf_counter()) - self.start_time
+
+    @property
+    def tokens_per_second(self):
+        # Generation speed after the first token, prompt processing excluded
+        if self.first_token_time is None or self.tokens < 2:
+            return 0.0
+        generation_time = (self.end_time or time.perf_counter()) - self.first_token_time
+        return (self.tokens - 1) / generation_time if generation_time > 0 else 0.0
+
+    def summary(self):
+        ttft = self.time_to_first_token
+        ttft_text = f"{ttft:.2f}s" if ttft is not None else "n/a"
+        return f"first token {ttft_text}, {self.tokens} tokens in {self.total_time:.2f}s, {self.tokens_per_second:.1f} tokens/sec"
+
+
+def timed_stream(chunks, stats):
+    """
+    Pass the chunks of a stream through while recording them in `stats`.
+    """
+    try:
+        for chunk in chunks:
+            stats.record(chunk)
+            yield chunk
+    finally:
+        stats.finish()
+
+
+async def atimed_stream(chunks, stats):
+    """
+    Async variant of timed_stream for LangChain's astream.
+    """
+    try:
+        async for chunk in chunks:
+            stats.record(chunk)
+            yield chunk
+    finally:
+        stats.finish()
+
+
+def print_stream(prefix, chunks):
+    """
+    Print a streamed response as it arrives and return the full text.
+    """
+    print(prefix, end="", flush=True)
+    parts = []
+    for chunk in chunks:
+        print(chunk, end="", flush=True)
+        parts.append(chunk)
+    print()
+    return "".join(parts)
+
+
+class LLMCallTracer(BaseCallbackHandler):
+    """
+    Records every call of an LLM client as an "llm_call" span with the
+    prompt and completion token counts Ollama reports, and adds the counts
+    to the token counters (see tracing.py). While tracing is off, calls
+    are not recorded.
+    """
+
+    run_inline = True  # Called in the caller's context, so the span joins the request's trace
+
+    def __init__(self, model):
+        self.model = model
+        self.spans = {}  # run id -> span of the running call
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        if not tracing.ENABLED:
+            return
+        self.spans[run_id] = tracing.span("llm_call", model=self.model).start(activate=False)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        span = self.spans.pop(run_id, None)
+        if span is None:
+            return
+        prompt_tokens = completion_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                info = generation.generation_info or {}
+                prompt_tokens += info.get("prompt_eval_count") or 0
+                completion_tokens += info.get("eval_count") or 0
+        span.set("prompt_tokens", prompt_tokens)
+        span.set("completion_tokens", completion_tokens)
+        span.finish()
+        tracing.count("llm_calls_total", model=self.model)
+        tracing.count("llm_prompt_tokens_total", prompt_tokens, model=self.model)
+        tracing.count("llm_completion_tokens_total", completion_tokens, model=self.model)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        span = self.spans.pop(run_id, None)
+        if span is not None:
+            span.finish(f"{type(error).__name__}: {error}")
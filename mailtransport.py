@@ -0,0 +1,377 @@
+# Pooled SMTP connections and a background send queue shared by the mail tools
+import asyncio
+import atexit
+import os
+import queue
+import smtplib
+import socket
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+
+from httpclient import LatencyHistogram
+from tracing import count, span
+
+POOL_SIZE = 2
+MAX_IDLE = 60.0  # Seconds an idle connection is reused without a NOOP check
+RETRIES = 3
+BACKOFF = 1.0  # Seconds, doubled after every failed attempt
+TIMEOUT = 30.0
+BATCH_SIZE = 100  # Messages a worker sends over one connection per batch
+DEFAULT_PORT = 587  # Mail submission with STARTTLS, when SMTP_PORT is not set
+
+# Connection-level errors after which the message is sent again on a fresh
+# connection. Not OSError: smtplib.SMTPException derives from it.
+TRANSIENT_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, socket.timeout)
+
+_transports = {}
+_transports_lock = threading.Lock()
+_open_transports = weakref.WeakSet()  # Every transport, for the exit hook
+
+
+def is_transient(error):
+    if isinstance(error, smtplib.SMTPResponseException):
+        # 4xx replies are temporary failures, 5xx are permanent
+        return 400 <= error.smtp_code < 500
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPException) and not isinstance(error, smtplib.SMTPServerDisconnected):
+        # E.g. SMTPNotSupportedError, or no usable AUTH method: retrying cannot help
+        return False
+    return isinstance(error, TRANSIENT_ERRORS)
+
+
+def deliver(connection, msg, from_addr=None, to_addrs=None):
+    if isinstance(msg, (bytes, str)):
+        connection.sendmail(from_addr, to_addrs, msg)
+    else:
+        connection.send_message(msg, from_addr=from_addr, to_addrs=to_addrs)
+
+
+class SMTPPool:
+    """
+    Keeps up to `size` authenticated SMTP connections open. A connection
+    that was idle for longer than `max_idle` is checked with NOOP before it
+    is handed out, and replaced when the server closed it.
+    """
+
+    def __init__(self, host, port, username=None, password=None, size=POOL_SIZE, max_idle=MAX_IDLE, timeout=TIMEOUT):
+        self.host = host
+        self.port = int(port)
+        self.username = username
+        self.password = password
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self.idle = queue.LifoQueue(maxsize=size)  # (connection, released at)
+        self.connections_opened = 0
+
+    def connect(self):
+        connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        connection.ehlo()
+        # Only upgrade and log in when the server offers it (local relays and stubs often do not)
+        if connection.has_extn("starttls"):
+            connection.starttls()
+            connection.ehlo()
+        if self.username and self.password and connection.has_extn("auth"):
+            connection.login(self.username, self.password)
+        self.connections_opened += 1
+        return connection
+
+    def acquire(self):
+        while True:
+            try:
+                connection, released_at = self.idle.get_nowait()
+            except queue.Empty:
+                return self.connect()
+            if time.monotonic() - released_at < self.max_idle or self.is_alive(connection):
+                return connection
+            self.discard(connection)
+
+    def release(self, connection):
+        try:
+            self.idle.put_nowait((connection, time.monotonic()))
+        except queue.Full:
+            self.discard(connection)
+
+    def is_alive(self, connection):
+        try:
+            return connection.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def discard(self, connection):
+        try:
+            connection.quit()
+        except (smtplib.SMTPException, OSError):
+            connection.close()
+
+    def close(self):
+        while True:
+            try:
+                connection, _ = self.idle.get_nowait()
+            except queue.Empty:
+                return
+            self.discard(connection)
+
+
+class MailTransport:
+    """
+    Sends email over pooled SMTP connections. submit() queues a message for
+    the background workers, which retry transient failures with exponential
+    backoff on a fresh connection; submit_many() queues batches that reuse
+    one connection each; send() delivers synchronously through the same pool.
+    Queue depth, outcomes and send latency are reported by stats(). Queued
+    messages are still delivered at interpreter exit (see close_all).
+    """
+
+    def __init__(self, host, port, username=None, password=None, pool_size=POOL_SIZE,
+                 retries=RETRIES, backoff=BACKOFF, max_idle=MAX_IDLE, timeout=TIMEOUT):
+        self.username = username
+        self.pool = SMTPPool(host, port, username, password, pool_size, max_idle, timeout)
+        self.workers_count = pool_size
+        self.retries = retries
+        self.backoff = backoff
+        self.queue = queue.Queue()
+        self.workers = []
+        self.workers_lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.latency = LatencyHistogram()
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        _open_transports.add(self)
+
+    def send(self, msg, from_addr=None, to_addrs=None):
+        """
+        Send a message now, retrying transient failures. Errors are raised
+        to the caller after the last attempt. `msg` is an email.message.Message,
+        or the already serialized message as bytes, which then needs
+        `from_addr` and `to_addrs`.
+        """
+        start_time = time.perf_counter()
+        with span("smtp_send") as stage:
+            for attempt in range(self.retries + 1):
+                stage.set("attempts", attempt + 1)
+                connection = None
+                try:
+                    connection = self.pool.acquire()
+                    deliver(connection, msg, from_addr, to_addrs)
+                    self.pool.release(connection)
+                    self.record(start_time, ok=True)
+                    return
+                except Exception as e:
+                    if connection is not None:
+                        self.recycle(connection, e)
+                    if attempt == self.retries or not is_transient(e):
+                        self.record(start_time, ok=False)
+                        raise
+                    with self.stats_lock:
+                        self.retried += 1
+                    time.sleep(self.backoff * 2 ** attempt)
+
+    def send_many(self, messages):
+        """
+        Send messages one after another, in order, over a single pooled
+        connection. A message that fails on it is retried through send().
+
+        Args:
+            messages (iterable): Messages, or (message, from_addr, to_addrs) tuples.
+
+        Returns:
+            list: None for every delivered message, the exception otherwise.
+        """
+        results = []
+        connection = None
+        try:
+            for item in messages:
+                msg, from_addr, to_addrs = item if isinstance(item, tuple) else (item, None, None)
+                start_time = time.perf_counter()
+                try:
+                    if connection is None:
+                        connection = self.pool.acquire()
+                    with span("smtp_send", batch=True):
+                        deliver(connection, msg, from_addr, to_addrs)
+                    self.record(start_time, ok=True)
+                    results.append(None)
+                    continue
+                except Exception as e:
+                    if connection is not None and not self.recycle(connection, e, release=False):
+                        connection = None
+                    if not is_transient(e):
+                        self.record(start_time, ok=False)
+                        results.append(e)
+                        continue
+                with self.stats_lock:
+                    self.retried += 1
+                try:
+                    self.send(msg, from_addr, to_addrs)
+                    results.append(None)
+                except Exception as e:
+                    results.append(e)
+        finally:
+            if connection is not None:
+                self.pool.release(connection)
+        return results
+
+    def recycle(self, connection, error, release=True):
+        """
+        Handle the connection a send failed on: a rejected message leaves it
+        usable, anything else closes it.
+
+        Returns:
+            bool: Whether the connection is still usable.
+        """
+        if isinstance(error, (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused)) and not is_transient(error):
+            if release:
+                self.pool.release(connection)
+            return True
+        self.pool.discard(connection)
+        return False
+
+    def record(self, start_time, ok):
+        self.latency.observe((time.perf_counter() - start_time) * 1000, error=not ok)
+        count("emails_total", status="sent" if ok else "failed")
+        with self.stats_lock:
+            if ok:
+                self.sent += 1
+            else:
+                self.failed += 1
+
+    def submit(self, msg, from_addr=None, to_addrs=None):
+        """
+        Queue a message for the background workers.
+
+        Returns:
+            concurrent.futures.Future: Resolves when the message is sent, or
+                holds the error of the last attempt.
+        """
+        self.start_workers()
+        future = Future()
+        self.queue.put((msg, from_addr, to_addrs, future))
+        return future
+
+    def submit_many(self, messages, batch_size=BATCH_SIZE):
+        """
+        Queue messages for the background workers in batches. Each batch is
+        sent by one worker over one connection (see send_many), so large
+        mailings are spread over the pool.
+
+        Returns:
+            list: One concurrent.futures.Future per batch, resolving to the
+                send_many results of that batch.
+        """
+        messages = list(messages)
+        self.start_workers()
+        futures = []
+        for start in range(0, len(messages), batch_size):
+            future = Future()
+            self.queue.put((messages[start:start + batch_size], None, None, future))
+            futures.append(future)
+        return futures
+
+    async def asend(self, msg, from_addr=None, to_addrs=None):
+        """
+        Queue a message and wait for its delivery without blocking the event loop.
+        """
+        await asyncio.wrap_future(self.submit(msg, from_addr, to_addrs))
+
+    async def asend_many(self, messages, batch_size=BATCH_SIZE):
+        """
+        Async variant of submit_many that waits for all batches.
+
+        Returns:
+            list: None for every delivered message, the exception otherwise.
+        """
+        futures = self.submit_many(messages, batch_size)
+        batches = await asyncio.gather(*(asyncio.wrap_future(future) for future in futures))
+        return [result for batch in batches for result in batch]
+
+    def start_workers(self):
+        if len(self.workers) == self.workers_count:
+            return
+        with self.workers_lock:
+            while len(self.workers) < self.workers_count:
+                worker = threading.Thread(target=self.work, name=f"smtp-{len(self.workers)}", daemon=True)
+                worker.start()
+                self.workers.append(worker)
+
+    def work(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                return
+            msg, from_addr, to_addrs, future = item
+            if future.set_running_or_notify_cancel():
+                try:
+                    if isinstance(msg, list):
+                        future.set_result(self.send_many(msg))
+                    else:
+                        self.send(msg, from_addr, to_addrs)
+                        future.set_result(None)
+                except Exception as e:
+                    future.set_exception(e)
+            self.queue.task_done()
+
+    def flush(self):
+        """
+        Wait until every queued message has been handled.
+        """
+        self.queue.join()
+
+    def close(self):
+        """
+        Send the queued messages, stop the workers and close the connections.
+        """
+        with self.workers_lock:
+            for _ in self.workers:
+                self.queue.put(None)
+            for worker in self.workers:
+                worker.join()
+            self.workers = []
+        self.pool.close()
+
+    def stats(self):
+        latency = self.latency.snapshot()
+        with self.stats_lock:
+            return {
+                "queue_depth": self.queue.qsize(),
+                "sent": self.sent,
+                "failed": self.failed,
+                "retried": self.retried,
+                "connections_opened": self.pool.connections_opened,
+                "latency_mean_ms": latency["mean_ms"],
+                "latency_p95_ms": latency["p95_ms"],
+            }
+
+
+@atexit.register
+def close_all():
+    """
+    Deliver what is still queued before the interpreter exits. The workers
+    are daemon threads, so without this queued mail would be lost when the
+    program returns right after a send.
+    """
+    for transport in list(_open_transports):
+        transport.close()
+
+
+def get_mail_transport(host=None, port=None, username=None, password=None):
+    """
+    Transport shared by every tool sending through the same SMTP account.
+    Unset arguments are read from SMTP_SERVER, SMTP_PORT (587 by default),
+    EMAIL_USER and EMAIL_PASSWORD. Raises ValueError when no server is set.
+    """
+    host = host or os.getenv("SMTP_SERVER")
+    if not host:
+        raise ValueError("no SMTP server configured, set SMTP_SERVER")
+    port = int(port or os.getenv("SMTP_PORT") or DEFAULT_PORT)
+    username = username or os.getenv("EMAIL_USER")
+    password = password or os.getenv("EMAIL_PASSWORD")
+    key = (host, port, username)
+    with _transports_lock:
+        transport = _transports.get(key)
+        if transport is None:
+            transport = _transports[key] = MailTransport(host, port, username, password)
+        return transport
@@ -0,0 +1,165 @@
+# Process-wide registry of the spaCy pipelines, LLM clients and embedding models
+import os
+import resource
+import threading
+import time
+
+EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
+
+_models = {}
+_stats = {}
+_locks = {}
+_registry_lock = threading.Lock()
+
+
+def _resident_memory_mb():
+    # Current RSS on Linux, peak RSS elsewhere
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize() / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _get(key, loader):
+    """
+    Return the model stored under `key`, loading it once with `loader`.
+    Load time and the growth of resident memory during the load are recorded.
+    """
+    model = _models.get(key)
+    if model is not None:
+        return model
+    with _registry_lock:
+        lock = _locks.setdefault(key, threading.Lock())
+    with lock:
+        model = _models.get(key)
+        if model is None:
+            memory_before = _resident_memory_mb()
+            start_time = time.perf_counter()
+            model = loader()
+            _stats[key] = {
+                "load_seconds": time.perf_counter() - start_time,
+                "memory_mb": _resident_memory_mb() - memory_before,
+            }
+            _models[key] = model
+    return model
+
+
+def get_spacy(name="en_core_web_sm", exclude=()):
+    """
+    Shared spaCy pipeline, downloaded first if it is not installed.
+
+    Args:
+        name (str): Name of the spaCy package.
+        exclude (tuple): Pipeline components to leave out.
+    """
+    def load():
+        import spacy
+        from spacy.cli import download  # Import for downloading spaCy models if not installed
+        try:
+            return spacy.load(name, exclude=list(exclude))
+        except OSError:
+            # If not, download the model
+            print(f"Model '{name}' not found. Downloading now...")
+            download(name)
+            return spacy.load(name, exclude=list(exclude))
+
+    return _get(("spacy", name, tuple(exclude)), load)
+
+
+def get_entity_extractor(name="en_core_web_sm"):
+    """
+    Shared EntityExtractor running NER on a trimmed spaCy pipeline.
+    """
+    def load():
+        from entityextractor import EntityExtractor
+        return EntityExtractor(name)
+
+    return _get(("entities", name), load)
+
+
+def get_llm(model, base_url=None):
+    """
+    Shared Ollama client for the given model. The server is `base_url`, or
+    OLLAMA_BASE_URL when set (e.g. a local stub), or Ollama's default.
+    """
+    base_url = base_url or os.getenv("OLLAMA_BASE_URL")
+
+    def load():
+        from langchain_ollama import OllamaLLM
+        from llmstream import LLMCallTracer
+        # Always attached: clients are shared, and tracing can be turned on after one is built
+        return OllamaLLM(model=model, base_url=base_url, callbacks=[LLMCallTracer(model)])
+
+    return _get(("ollama", model, base_url), load)
+
+
+def get_embedding_model(name=EMBEDDING_MODEL_NAME):
+    """
+    Shared SentenceTransformer embedding model.
+    """
+    def load():
+        # Imported here, sentence_transformers (and torch) take seconds to import
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(name)
+
+    return _get(("sentence_transformers", name), load)
+
+
+def embedding_model_id(model):
+    """
+    Name of the model an embedding model object was loaded from, e.g.
+    "sentence-transformers/all-MiniLM-L6-v2", for recording what a stored
+    index was embedded with.
+    """
+    card = getattr(model, "model_card_data", None)
+    name = getattr(card, "base_model", None) or getattr(getattr(model, "tokenizer", None), "name_or_path", None)
+    return name or type(model).__name__
+
+
+def get_intent_router(name=EMBEDDING_MODEL_NAME):
+    """
+    Shared IntentRouter with its prototypes computed by the embedding model.
+    """
+    def load():
+        from intentrouter import IntentRouter
+        return IntentRouter(get_embedding_model(name))
+
+    return _get(("intent_router", name), load)
+
+
+def get_operation_index(spec_dir="swagger_specs", name=EMBEDDING_MODEL_NAME):
+    """
+    Shared index over the operations of the swagger specs in `spec_dir`.
+    """
+    def load():
+        from specindex import build_operation_index
+        return build_operation_index(spec_dir, get_embedding_model(name))
+
+    return _get(("operation_index", spec_dir), load)
+
+
+def report():
+    """
+    Load time and resident memory growth of every loaded model. Models loaded
+    concurrently in different threads share their memory growth.
+    """
+    return [
+        {"kind": key[0], "name": key[1], "options": list(key[2:]), **stats}
+        for key, stats in _stats.items()
+    ]
+
+
+def print_report():
+    for entry in report():
+        options = f" {entry['options']}" if any(entry["options"]) else ""
+        print(f"{entry['kind']:<22}{entry['name'] + options:<40}{entry['load_seconds']:>8.2f} s{entry['memory_mb']:>10.1f} MB")
+
+
+if __name__ == "__main__":
+    # Load the models used by the chatbot and show what they cost
+    get_embedding_model()
+    get_entity_extractor()
+    for llm in ("tinydolphin", "orca-mini", "dolphin-phi"):
+        get_llm(llm)
+    print_report()
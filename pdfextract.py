@@ -0,0 +1,76 @@
+# Parallel PDF text extraction
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import fitz  # PyMuPDF for PDF extraction
+
+from chunking import BLOCK_BREAK, PAGE_BREAK
+
+
+def page_text(page):
+    """
+    Text of a page with its text blocks (paragraphs, headings, table cells,
+    code lines) separated by BLOCK_BREAK, so the chunker can see them.
+    """
+    # Block tuples are (x0, y0, x1, y1, text, block_no, block_type); type 1 is an image
+    return BLOCK_BREAK.join(block[4].strip("\n") for block in page.get_text("blocks") if block[6] == 0)
+
+
+def extract_pages(doc_path, start=0, end=None):
+    """
+    Extract the text of pages [start, end) of a PDF, separated by PAGE_BREAK.
+    Runs inside the worker processes, so it only depends on PyMuPDF.
+    """
+    with fitz.open(doc_path) as doc:
+        end = doc.page_count if end is None else min(end, doc.page_count)
+        return PAGE_BREAK.join([page_text(doc[page_number]) for page_number in range(start, end)])
+
+
+def split_page_ranges(doc_path, pages_per_task):
+    """
+    Split a PDF into page ranges so large files are spread over several workers.
+    """
+    with fitz.open(doc_path) as doc:
+        page_count = doc.page_count
+    return [(start, min(start + pages_per_task, page_count)) for start in range(0, page_count, pages_per_task)] or [(0, 0)]
+
+
+def iter_pdf_texts(doc_paths, workers=None, pages_per_task=50):
+    """
+    Extract PDFs on a process pool and yield (doc_path, text) for each file as
+    soon as all of its page ranges are done, so the caller can chunk and embed
+    one file while the others are still being extracted.
+
+    Args:
+        doc_paths (list): Paths of the PDFs to extract.
+        workers (int): Number of worker processes, defaults to the CPU count.
+        pages_per_task (int): Maximum number of pages extracted by one task.
+    """
+    tasks = [(doc_path, start, end) for doc_path in doc_paths for start, end in split_page_ranges(doc_path, pages_per_task)]
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+
+    # Not worth starting a pool for a single task
+    if workers <= 1:
+        for doc_path in doc_paths:
+            yield doc_path, extract_pages(doc_path)
+        return
+
+    parts = {doc_path: {} for doc_path in doc_paths}
+    remaining = {doc_path: 0 for doc_path in doc_paths}
+    # Spawned, not forked: the caller is often a background or server thread of a process
+    # that has torch, faiss and the tokenizers loaded, and forking it can copy a held lock
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        futures = {}
+        for doc_path, start, end in tasks:
+            futures[executor.submit(extract_pages, doc_path, start, end)] = (doc_path, start)
+            remaining[doc_path] += 1
+
+        for future in as_completed(futures):
+            doc_path, start = futures[future]
+            parts[doc_path][start] = future.result()
+            remaining[doc_path] -= 1
+            if remaining[doc_path] == 0:
+                # Reassemble the page ranges in page order
+                doc_parts = parts.pop(doc_path)
+                yield doc_path, PAGE_BREAK.join([doc_parts[key] for key in sorted(doc_parts)])
@@ -0,0 +1,249 @@
+# Persistent on-disk storage for the RAG index
+import hashlib
+import json
+import os
+
+import math
+
+import faiss
+
+from chunkstore import ChunkStore
+
+MANIFEST_VERSION = 6
+
+# Training vectors per IVF list below which FAISS warns that k-means lacks data
+MIN_POINTS_PER_LIST = 39
+
+# Supported index types and their default build/search parameters
+DEFAULT_INDEX_PARAMS = {
+    "flat": {"fp16": False},  # fp16 halves the memory of the stored vectors
+    "ivf_flat": {"nlist": None},  # None picks ~4*sqrt(n) lists at training time, at most n/39
+    "ivf_pq": {"nlist": None, "pq_m": 16, "pq_nbits": 8},
+    "hnsw": {"hnsw_m": 32},
+}
+DEFAULT_SEARCH_PARAMS = {
+    "ivf_flat": {"nprobe": 8},
+    "ivf_pq": {"nprobe": 8},
+    "hnsw": {"efSearch": 64},
+}
+
+
+def index_spec(index_type="flat", metric="inner_product", **params):
+    """
+    Describe an index type together with its build parameters, filling in the
+    defaults. The spec is stored in the manifest and passed to create_index.
+    """
+    if index_type not in DEFAULT_INDEX_PARAMS:
+        raise ValueError(f"Unknown index type '{index_type}', expected one of {list(DEFAULT_INDEX_PARAMS)}")
+    return dict(DEFAULT_INDEX_PARAMS[index_type], type=index_type, metric=metric, **params)
+
+
+def needs_training(spec):
+    return spec["type"] in ("ivf_flat", "ivf_pq")
+
+
+def supports_removal(spec):
+    # HNSW graphs cannot drop vectors, changed files require a rebuild
+    return spec["type"] != "hnsw"
+
+
+def create_index(dimension, spec, train_size=None):
+    """
+    Build an empty FAISS index for the spec. Vectors are added with explicit
+    chunk ids: IVF indexes store them natively, flat and HNSW are wrapped in
+    an IndexIDMap2. IVF indexes must be trained before use; their number of
+    lists is derived from train_size unless set in the spec, and kept to at
+    most one list per MIN_POINTS_PER_LIST training vectors.
+    """
+    metric = faiss.METRIC_INNER_PRODUCT if spec["metric"] == "inner_product" else faiss.METRIC_L2
+    index_type = spec["type"]
+    if index_type == "flat":
+        description = "IDMap2,SQfp16" if spec["fp16"] else "IDMap2,Flat"
+    elif index_type == "hnsw":
+        description = f"IDMap2,HNSW{spec['hnsw_m']}"
+    else:
+        nlist = spec["nlist"] or max(1, int(4 * math.sqrt(train_size or 1)))
+        if train_size:
+            nlist = max(1, min(nlist, train_size // MIN_POINTS_PER_LIST))
+        if index_type == "ivf_flat":
+            description = f"IVF{nlist},Flat"
+        else:
+            description = f"IVF{nlist},PQ{spec['pq_m']}x{spec['pq_nbits']}"
+    return faiss.index_factory(dimension, description, metric)
+
+
+def min_train_size(spec):
+    """
+    Smallest number of vectors the index can be trained on: enough for each
+    list (one list when nlist is derived) and, for PQ, for every code.
+    """
+    if spec["type"] == "ivf_pq":
+        return max(MIN_POINTS_PER_LIST * (spec["nlist"] or 1), 2 ** spec["pq_nbits"])
+    if spec["type"] == "ivf_flat":
+        return MIN_POINTS_PER_LIST * (spec["nlist"] or 1)
+    return 0
+
+
+def owned_copy(faiss_index):
+    """
+    Copy a memory-mapped (read-only) index into process memory so it can be modified.
+    """
+    return faiss.deserialize_index(faiss.serialize_index(faiss_index))
+
+
+def set_search_params(faiss_index, spec, search_params=None):
+    """
+    Apply the search-time parameters (nprobe for IVF, efSearch for HNSW).
+    """
+    params = dict(DEFAULT_SEARCH_PARAMS.get(spec["type"], {}), **(search_params or {}))
+    parameter_space = faiss.ParameterSpace()
+    for name, value in params.items():
+        parameter_space.set_index_parameter(faiss_index, name, value)
+
+
+def file_sha256(path, block_size=1 << 20):
+    """
+    Compute the SHA-256 hex digest of a file, reading it in blocks.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def scan_docs(folder_path, known_files):
+    """
+    Compare the PDFs in the folder against the file entries of a manifest.
+    A file is only hashed when its mtime or size differ from the stored entry,
+    and it only counts as changed when its content hash differs as well.
+
+    Args:
+        folder_path (str): Folder holding the PDFs.
+        known_files (dict): Manifest entries keyed by filename.
+
+    Returns:
+        tuple: (entries, changed, deleted) where entries are the up-to-date
+        manifest entries for every PDF on disk, changed lists new or modified
+        files and deleted lists files that are no longer present.
+    """
+    entries = {}
+    changed = []
+    for filename in sorted(os.listdir(folder_path)):
+        if not filename.endswith(".pdf"):
+            continue
+        stat = os.stat(os.path.join(folder_path, filename))
+        known = known_files.get(filename)
+        if known and known["mtime"] == stat.st_mtime_ns and known["size"] == stat.st_size:
+            entries[filename] = known
+            continue
+
+        sha256 = file_sha256(os.path.join(folder_path, filename))
+        if known and known["sha256"] == sha256:
+            # Touched but not modified, only refresh the stat info
+            entries[filename] = dict(known, mtime=stat.st_mtime_ns, size=stat.st_size)
+            continue
+
+        entries[filename] = {"mtime": stat.st_mtime_ns, "size": stat.st_size, "sha256": sha256, "chunk_ids": []}
+        changed.append(filename)
+
+    deleted = [filename for filename in known_files if filename not in entries]
+    return entries, changed, deleted
+
+
+class RAGIndexStore:
+    """
+    Keeps the FAISS index, the chunk store and a manifest describing how they
+    were built (embedding model, chunker settings, per-file stat info, content hash and
+    chunk ids) in a directory, so RAGTool only re-embeds what changed. The index
+    and the chunks are memory-mapped when loaded.
+    """
+
+    INDEX_FILE = "index.faiss"
+    MANIFEST_FILE = "manifest.json"
+
+    def __init__(self, index_dir=".rag_index"):
+        self.index_dir = index_dir
+
+    def _path(self, name):
+        return os.path.join(self.index_dir, name)
+
+    def build_manifest(self, model_name, dimension, chunker_config, spec):
+        """
+        Describe an empty index built with the given model, vector dimension,
+        chunker settings and index spec.
+        """
+        return {
+            "version": MANIFEST_VERSION,
+            "model": model_name,
+            "dimension": dimension,
+            "chunker": chunker_config,
+            "index": spec,
+            "next_id": 0,
+            "files": {},
+        }
+
+    def is_compatible(self, manifest, model_name, dimension, chunker_config, spec):
+        """
+        Check whether a stored manifest can be updated incrementally, i.e. it
+        was built with the same format, embedding model and dimension, chunking
+        and index spec.
+        """
+        return (
+            manifest.get("version") == MANIFEST_VERSION
+            and manifest.get("model") == model_name
+            and manifest.get("dimension") == dimension
+            and manifest.get("chunker") == chunker_config
+            and manifest.get("index") == spec
+        )
+
+    def read_manifest(self):
+        try:
+            with open(self._path(self.MANIFEST_FILE), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def load_index(self):
+        """
+        Memory-map the stored index. The vectors stay in the page cache shared
+        by every process using the store; use owned_copy() before modifying it.
+        """
+        return faiss.read_index(self._path(self.INDEX_FILE), faiss.IO_FLAG_MMAP_IFC)
+
+    def load(self):
+        """
+        Load the stored index, chunks and manifest.
+
+        Returns:
+            tuple: (faiss_index, chunks, manifest) or None if the store is missing
+            or inconsistent. The index is memory-mapped and chunks is a ChunkStore.
+        """
+        manifest = self.read_manifest()
+        if manifest is None:
+            return None
+        try:
+            faiss_index = self.load_index()
+            chunks = ChunkStore.open(self.index_dir)
+        except (OSError, RuntimeError, ValueError):
+            return None
+        if faiss_index.ntotal != len(chunks):
+            return None
+        return faiss_index, chunks, manifest
+
+    def save(self, faiss_index, chunks, manifest):
+        """
+        Write the index, chunks and manifest. The manifest is removed first and
+        written last so a partially written store is never picked up as valid.
+        """
+        os.makedirs(self.index_dir, exist_ok=True)
+        # Invalidate the old manifest before touching the data files
+        if os.path.exists(self._path(self.MANIFEST_FILE)):
+            os.remove(self._path(self.MANIFEST_FILE))
+        faiss.write_index(faiss_index, self._path(self.INDEX_FILE + ".tmp"))
+        os.replace(self._path(self.INDEX_FILE + ".tmp"), self._path(self.INDEX_FILE))
+        chunks.save(self.index_dir)
+        tmp_path = self._path(self.MANIFEST_FILE + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self._path(self.MANIFEST_FILE))
@@ -0,0 +1,92 @@
+# Batched embedding pipeline for RAG chunk ingestion
+import time
+
+import numpy as np
+
+
+class IngestPipeline:
+    """
+    Collects chunks into batches, encodes each batch with a single
+    SentenceTransformer call into a preallocated float32 matrix and bulk-adds
+    it to the FAISS index. While the index is untrained the embeddings are
+    held back and the index is trained on all of them in finish().
+    """
+
+    def __init__(self, embedding_model, faiss_index, batch_size=64, create_index=None):
+        self.embedding_model = embedding_model
+        self.faiss_index = faiss_index
+        self.batch_size = batch_size
+        self.create_index = create_index  # Called with the training set size to replace an untrained index
+        self.held_ids = []
+        self.held_embeddings = []
+
+        dimension = embedding_model.get_sentence_embedding_dimension()
+        self.matrix = np.empty((batch_size, dimension), dtype=np.float32)
+        self.pending_ids = []
+        self.pending_texts = []
+
+        # Throughput statistics
+        self.chunk_count = 0
+        self.batch_count = 0
+        self.seconds = 0.0
+
+    def add(self, chunk_id, text):
+        """
+        Queue a chunk for embedding, flushing once a full batch is collected.
+        """
+        self.pending_ids.append(chunk_id)
+        self.pending_texts.append(text)
+        if len(self.pending_texts) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Embed and index the queued chunks.
+        """
+        if not self.pending_texts:
+            return
+        start_time = time.perf_counter()
+        count = len(self.pending_texts)
+        ids = np.array(self.pending_ids, dtype=np.int64)
+        embeddings = self.matrix[:count]
+        embeddings[:] = self.embedding_model.encode(self.pending_texts, batch_size=self.batch_size, normalize_embeddings=True)
+        if self.faiss_index.is_trained:
+            self.faiss_index.add_with_ids(embeddings, ids)
+        else:
+            self.held_ids.append(ids)
+            self.held_embeddings.append(embeddings.copy())
+        self.pending_ids = []
+        self.pending_texts = []
+
+        self.chunk_count += count
+        self.batch_count += 1
+        self.seconds += time.perf_counter() - start_time
+
+    def finish(self):
+        """
+        Flush the queued chunks and train the index on the held embeddings if
+        it still needs training.
+        """
+        self.flush()
+        if not self.held_ids:
+            return
+        start_time = time.perf_counter()
+        ids = np.concatenate(self.held_ids)
+        embeddings = np.vstack(self.held_embeddings)
+        if self.create_index:
+            self.faiss_index = self.create_index(len(embeddings))
+        if not self.faiss_index.is_trained:
+            self.faiss_index.train(embeddings)
+        self.faiss_index.add_with_ids(embeddings, ids)
+        self.held_ids = []
+        self.held_embeddings = []
+        self.seconds += time.perf_counter() - start_time
+
+    def chunks_per_second(self):
+        return self.chunk_count / self.seconds if self.seconds else 0.0
+
+    def report(self):
+        return (
+            f"Embedded {self.chunk_count} chunks in {self.batch_count} batches, "
+            f"{self.seconds:.2f} seconds ({self.chunks_per_second():.1f} chunks/sec)"
+        )
@@ -1,34 +1,66 @@
 # import necessary libraries
-import fitz  # PyMuPDF for PDF extraction
-from sentence_transformers import SentenceTransformer, util
-import faiss
 import numpy as np
 import os
-from langchain_ollama import OllamaLLM
 from langchain_core.prompts import ChatPromptTemplate
 import time
+from ragindex import (RAGIndexStore, scan_docs, index_spec, create_index, min_train_size,
+                      needs_training, owned_copy, set_search_params, supports_removal)
+from chunkstore import ChunkStore
+from chunking import Chunker
+from contextbuilder import ContextBuilder, model_budget
+from semanticcache import SemanticCache
+from llmstream import StreamStats, timed_stream, atimed_stream, print_stream
+from asyncrunner import run_cpu
+from ragingest import IngestPipeline
+from pdfextract import extract_pages, iter_pdf_texts
+from modelregistry import embedding_model_id, get_embedding_model, get_llm
+from tracing import count, span
+
+INDEX_METRIC = 'inner_product'  # Over normalized embeddings
+RETRIEVE_K = 3
+CANDIDATE_K = 6  # Retrieved for the context builder to choose from
 
 class RAGTool:
-    def __init__(self, folder_path="docs", chunk_size=500, similarity_threshold=0.45):
-        # Load embedding model
-        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+    def __init__(self, folder_path="docs", chunker=None, similarity_threshold=0.45, index_dir=".rag_index", incremental=True,
+                 batch_size=64, extract_workers=None, index_type="flat", index_params=None, search_params=None,
+                 response_cache=True, embedding_model=None, llm_model="tinydolphin", context_budget=None):
+        # Use the shared embedding model unless another one is given
+        self.embedding_model = embedding_model if embedding_model is not None else get_embedding_model()
         self.dimension = self.embedding_model.get_sentence_embedding_dimension()
-        self.faiss_index = faiss.IndexFlatL2(self.dimension)  # Initialize FAISS for similarity search
+        # Chunks are sized in tokens of the embedding model, falling back to a word count
+        self.chunker = chunker if chunker is not None else Chunker(getattr(self.embedding_model, "tokenizer", None))
+
+        # Index type (flat, ivf_flat, ivf_pq or hnsw) with its build and search parameters
+        self.index_spec = index_spec(index_type, INDEX_METRIC, **(index_params or {}))
+        self.search_params = search_params
+        self.faiss_index = self.create_index()  # Initialize FAISS for similarity search
+
+        # Initialize document storage, keyed by FAISS id
+        self.documents = ChunkStore()
+        self.index_mapped = False  # True while the index is memory-mapped read-only
 
-        # Initialize document storage
-        self.documents = []
-        self.document_embeddings = []
+        # Answers to semantically repeated questions, dropped whenever the docs change
+        self.response_cache = SemanticCache() if response_cache else None
         self.similarity_threshold = similarity_threshold
+        self.next_id = 0
+        self.batch_size = batch_size
+        self.extract_workers = extract_workers
 
         start_time = time.time()
         
-        # Load and chunk PDFs
-        self.load_and_chunk_pdfs(folder_path, chunk_size)
+        # Bring the persisted index up to date with the docs folder, only
+        # embedding new or modified files
+        self.index_store = RAGIndexStore(index_dir)
+        with span("load_documents"):
+            self.sync_documents(folder_path, incremental)
         print(f"Time taken for loading docs: {time.time() - start_time} seconds")
         # Initialize the response generation model and template
-        self.model = OllamaLLM(model="tinydolphin")
-        # self.model = OllamaLLM(model="orca-mini")
-        # self.model = OllamaLLM(model="dolphin-phi")
+        self.model = get_llm(llm_model)  # Or "orca-mini", "dolphin-phi"
+
+        # Retrieved chunks are fitted to the model's context budget; 0 joins the top 3 as they are
+        if context_budget is None:
+            context_budget = model_budget(llm_model)
+        self.context_builder = ContextBuilder(self.embedding_model, budget=context_budget) if context_budget else None
         self.template = """
         You are a helpful assistant. Answer the question below using the information provided in the context below. 
         If you are not sure what something means in the question, always reply with "I don't understand. Could you please try again?"
@@ -39,61 +71,318 @@ class RAGTool:
         self.prompt = ChatPromptTemplate.from_template(template=self.template)
         self.chain = self.prompt | self.model
 
-    def load_and_chunk_pdfs(self, folder_path, chunk_size=500):
-        for filename in os.listdir(folder_path):
-            if filename.endswith(".pdf"):
-                doc_path = os.path.join(folder_path, filename)
-                doc = fitz.open(doc_path)
-                text = ""
-                
-                # Extract text from each page
-                for page in doc:
-                    text += page.get_text("text")
-                
-                # Split text into chunks
-                chunks = [text[i:i+chunk_size] for i in range(0, len(text), chunk_size)]
-                for chunk in chunks:
-                    self.add_document(chunk)
+    def create_index(self, train_size=None):
+        """
+        Create an empty index for the configured spec. Trainable (IVF) indexes
+        are created again with the real training set size once the chunks are
+        embedded, and fall back to a flat index if there are too few chunks.
+        Sets `self.built_spec` to the spec of the index actually built.
+        """
+        spec = self.index_spec
+        if needs_training(spec) and train_size is not None and train_size < min_train_size(spec):
+            print(f"Only {train_size} chunks to train the {spec['type']} index on, using a flat index instead.")
+            spec = index_spec("flat", INDEX_METRIC)
+        faiss_index = create_index(self.dimension, spec, train_size)
+        set_search_params(faiss_index, spec, self.search_params)
+        self.built_spec = spec
+        return faiss_index
+
+    def sync_documents(self, folder_path, incremental=True):
+        """
+        Load the persisted index and update it with the changes in the docs folder:
+        chunks of deleted or modified files are removed and only new or modified
+        files are extracted and embedded. Without `incremental` the index is rebuilt.
+        """
+        stored = self.index_store.load() if incremental else None
+        # Vectors of another model or dimension cannot be searched with this model's queries
+        model_name = embedding_model_id(self.embedding_model)
+        if stored and self.index_store.is_compatible(stored[2], model_name, self.dimension, self.chunker.config(),
+                                                     self.index_spec):
+            self.faiss_index, self.documents, manifest = stored
+            self.index_mapped = True
+            self.built_spec = manifest["built_index"]
+            set_search_params(self.faiss_index, self.built_spec, self.search_params)
+            self.next_id = manifest["next_id"]
+        else:
+            manifest = self.index_store.build_manifest(model_name, self.dimension, self.chunker.config(), self.index_spec)
+
+        known_files = manifest["files"]
+        entries, changed, deleted = scan_docs(folder_path, known_files)
+
+        if any(filename in known_files for filename in deleted + changed) and not supports_removal(self.built_spec):
+            # The index cannot drop vectors, so re-embed everything
+            print(f"{self.built_spec['type']} index does not support removals, rebuilding it.")
+            self.faiss_index = self.create_index()
+            self.index_mapped = False
+            self.documents = ChunkStore()
+            self.next_id = 0
+            known_files = {}
+            entries = {filename: dict(entry, chunk_ids=[]) for filename, entry in entries.items()}
+            changed, deleted = list(entries), []
+
+        # Drop the chunks of files that were deleted or have to be re-embedded
+        for filename in deleted + changed:
+            if filename in known_files:
+                self.remove_documents(known_files[filename]["chunk_ids"])
+
+        # Chunks of all changed files are embedded in shared batches
+        self.ingest = self.create_ingest_pipeline()
+
+        # Extract the changed files on a process pool and chunk/embed each one
+        # as soon as its text is ready
+        doc_paths = [os.path.join(folder_path, filename) for filename in changed]
+        for doc_path, text in iter_pdf_texts(doc_paths, self.extract_workers):
+            filename = os.path.basename(doc_path)
+            entries[filename]["chunk_ids"] = self.add_text(text, source=filename)
+        self.finish_ingest()
+        if self.ingest.chunk_count:
+            print(self.ingest.report())
+
+        if changed or deleted or entries != known_files or stored is None:
+            manifest["files"] = entries
+            manifest["next_id"] = self.next_id
+            manifest["built_index"] = self.built_spec
+            self.index_store.save(self.faiss_index, self.documents, manifest)
+            # Serve from the saved files, so the pages are shared with other processes
+            self.faiss_index = self.index_store.load_index()
+            self.index_mapped = True
+            set_search_params(self.faiss_index, self.built_spec, self.search_params)
+        print(f"Docs synced: {len(changed)} added or modified, {len(deleted)} deleted, {len(entries) - len(changed)} unchanged.")
+
+    def create_ingest_pipeline(self):
+        # An untrained index is trained on all the chunks when the ingest finishes
+        create = None if self.faiss_index.is_trained else self.create_index
+        return IngestPipeline(self.embedding_model, self.faiss_index, self.batch_size, create_index=create)
+
+    def make_index_writable(self):
+        """
+        A memory-mapped index is read-only, swap in an owned copy before changing it.
+        """
+        if self.index_mapped:
+            self.faiss_index = owned_copy(self.faiss_index)
+            self.index_mapped = False
+            self.ingest = self.create_ingest_pipeline()
+
+    def finish_ingest(self):
+        """
+        Embed and index the chunks still queued on the ingest pipeline.
+        """
+        self.ingest.finish()
+        self.faiss_index = self.ingest.faiss_index
+
+    def load_and_chunk_pdfs(self, folder_path):
+        doc_paths = [os.path.join(folder_path, filename) for filename in os.listdir(folder_path) if filename.endswith(".pdf")]
+        for doc_path, text in iter_pdf_texts(doc_paths, self.extract_workers):
+            self.add_text(text, source=os.path.basename(doc_path))
+        self.finish_ingest()
         print("Loading docs complete.")
 
-    def add_document(self, text):
-        self.documents.append(text)
-        embedding = self.embedding_model.encode([text])[0]
-        self.document_embeddings.append(embedding)
-        self.faiss_index.add(np.array([embedding]))
+    def load_and_chunk_pdf(self, doc_path, source=None):
+        """
+        Extract and chunk a single PDF and queue the chunks for embedding.
 
-    def is_relevant_query(self, user_query):
-        # Generate embedding for the user query
-        query_embedding = self.embedding_model.encode([user_query])[0]
-        
-        # Search for the most similar document chunk
-        _, indices = self.faiss_index.search(np.array([query_embedding]), k=1)
-        
-        # Compute similarity with the top chunk
-        top_doc_embedding = self.document_embeddings[indices[0][0]]
-        similarity = util.pytorch_cos_sim(query_embedding, top_doc_embedding).item()
+        Returns:
+            list: The ids of the added chunks.
+        """
+        text = extract_pages(doc_path)
+        return self.add_text(text, source=source)
 
+    def add_text(self, text, source=None):
+        """
+        Chunk the extracted text of a document and queue the chunks for embedding,
+        keeping the pages each chunk came from.
 
-        # Check if the similarity meets the threshold
-        return similarity >= self.similarity_threshold
+        Returns:
+            list: The ids of the added chunks.
+        """
+        chunks = self.chunker.split(text)
+        return self.add_documents([chunk[0] for chunk in chunks], source=source, pages=[chunk[1:] for chunk in chunks])
 
-    def rag_response(self, user_query):
-        # Check for relevance first
-        if not self.is_relevant_query(user_query):
-            return "I'm sorry, I didn't understand that. Could you rephrase or ask something else?"
+    def add_documents(self, texts, source=None, pages=None):
+        """
+        Store chunks and queue them on the ingest pipeline, which embeds and
+        indexes them batch by batch. Call `finish_ingest` to index the rest.
+        `pages` holds the (first_page, last_page) of each chunk, if known.
 
-        # Encode the user query and retrieve top 3 document chunks
-        query_embedding = self.embedding_model.encode([user_query])[0]
-        _, indices = self.faiss_index.search(np.array([query_embedding]), k=3)
-        
-        # Retrieve top document chunks based on indices
-        top_docs = [self.documents[idx] for idx in indices[0]]
-        context = "\n".join(top_docs)  # Combine top chunks as context
+        Returns:
+            list: The ids of the chunks in the FAISS index.
+        """
+        self.make_index_writable()
+        self.invalidate_cache()
+        chunk_ids = list(range(self.next_id, self.next_id + len(texts)))
+        self.next_id += len(texts)
+        self.documents.add(chunk_ids, texts, source, pages)
+        for chunk_id, text in zip(chunk_ids, texts):
+            self.ingest.add(chunk_id, text)
+        return chunk_ids
+
+    def add_document(self, text, source=None):
+        """
+        Embed and index a single chunk right away.
+
+        Returns:
+            int: The id of the chunk in the FAISS index.
+        """
+        chunk_id = self.add_documents([text], source=source)[0]
+        self.finish_ingest()
+        return chunk_id
+
+    def remove_documents(self, chunk_ids):
+        """
+        Remove chunks from the index and the document storage.
+        """
+        if not chunk_ids:
+            return
+        self.make_index_writable()
+        self.invalidate_cache()
+        self.faiss_index.remove_ids(np.array(chunk_ids, dtype=np.int64))
+        self.documents.remove(chunk_ids)
+
+    def invalidate_cache(self):
+        if self.response_cache:
+            self.response_cache.invalidate()
+
+    def encode_query(self, user_query):
+        # Normalized, so inner product with the chunks is the cosine similarity
+        with span("query_embedding", model="rag"):
+            return np.asarray(self.embedding_model.encode([user_query], normalize_embeddings=True), dtype=np.float32)
+
+    def retrieve(self, user_query, k=3, query_embedding=None):
+        """
+        Encode the query once and run a single top-k search. Vectors are
+        normalized and the index uses inner product, so the scores are the
+        cosine similarities between the query and the chunks.
+
+        Returns:
+            list: (score, chunk_id) pairs, best match first.
+        """
+        if self.faiss_index.ntotal == 0:
+            return []
+        if query_embedding is None:
+            query_embedding = self.encode_query(user_query)
+        with span("faiss_search", k=k, vectors=self.faiss_index.ntotal):
+            scores, indices = self.faiss_index.search(query_embedding, k)
+        return [(float(score), int(idx)) for score, idx in zip(scores[0], indices[0]) if idx != -1]
+
+    def is_relevant_query(self, user_query, results=None):
+        # Reuse the results of an earlier search when given
+        if results is None:
+            results = self.retrieve(user_query, k=1)
+
+        # Check if the similarity with the top chunk meets the threshold
+        return bool(results) and results[0][0] >= self.similarity_threshold
+
+    def prepare_response(self, user_query):
+        """
+        Everything before the LLM call: cache lookup, retrieval and relevance check.
+
+        Returns:
+            tuple: (query_embedding, answer, context). `answer` is set when no LLM
+            call is needed (cache hit or irrelevant query), otherwise `context`
+            holds the text of the retrieved chunks for the prompt, fitted to the
+            model's token budget by the context builder.
+        """
+        # The query embedding serves both the response cache and the search
+        query_embedding = self.encode_query(user_query)
+        if self.response_cache:
+            cached = self.response_cache.lookup(query_embedding)
+            if cached is not None:
+                return query_embedding, cached, None
+
+        # Retrieve the candidate chunks, their scores also decide relevance
+        k = CANDIDATE_K if self.context_builder else RETRIEVE_K
+        results = self.retrieve(user_query, k=k, query_embedding=query_embedding)
+        if not self.is_relevant_query(user_query, results):
+            return query_embedding, "I'm sorry, I didn't understand that. Could you rephrase or ask something else?", None
+
+        with span("prompt_build", chunks=len(results)) as stage:
+            if self.context_builder is None:
+                context = "\n".join([self.documents[idx] for _, idx in results])  # Combine top chunks as context
+                stage.set("context_chars", len(context))
+            else:
+                candidates = [(score, self.documents[idx]) for score, idx in results]
+                embeddings = self.chunk_embeddings([idx for _, idx in results], [text for _, text in candidates])
+                context, stats = self.context_builder.build(query_embedding, candidates, embeddings)
+                for key, value in stats.items():
+                    stage.set(key, value)
+                count("rag_prompts_total")
+                count("rag_context_tokens_total", stats["context_tokens"])
+                count("rag_context_tokens_saved_total", stats["selected_tokens"] - stats["context_tokens"])
+        return query_embedding, None, context
+
+    def chunk_embeddings(self, chunk_ids, texts):
+        """
+        Normalized embeddings of stored chunks, read back from the index.
+        Indexes that cannot return their vectors (IVF without a direct map)
+        embed the texts again.
+        """
+        try:
+            return self.faiss_index.reconstruct_batch(np.asarray(chunk_ids, dtype=np.int64))
+        except RuntimeError:
+            return np.asarray(self.embedding_model.encode(texts, normalize_embeddings=True), dtype=np.float32)
+
+    def rag_response(self, user_query):
+        query_embedding, answer, context = self.prepare_response(user_query)
+        if answer is not None:
+            return answer
         
         # Generate answer using the chain
         result = self.chain.invoke({"question": user_query, "context": context})
+        if self.response_cache:
+            self.response_cache.store(query_embedding, result)
+        return result
+
+    async def arag_response(self, user_query):
+        """
+        Async variant of rag_response. Encoding and search run in the CPU
+        pool and the LLM is called with ainvoke.
+        """
+        query_embedding, answer, context = await run_cpu(self.prepare_response, user_query)
+        if answer is not None:
+            return answer
+
+        result = await self.chain.ainvoke({"question": user_query, "context": context})
+        if self.response_cache:
+            self.response_cache.store(query_embedding, result)
         return result
 
+    def stream_response(self, user_query):
+        """
+        Generator variant of rag_response that yields the answer as the LLM
+        produces it. Timing of the call is kept in `self.last_stream_stats`.
+        """
+        self.last_stream_stats = StreamStats()
+        query_embedding, answer, context = self.prepare_response(user_query)
+        if answer is not None:
+            yield from timed_stream([answer], self.last_stream_stats)
+            return
+
+        parts = []
+        for chunk in timed_stream(self.chain.stream({"question": user_query, "context": context}), self.last_stream_stats):
+            parts.append(chunk)
+            yield chunk
+        if self.response_cache:
+            self.response_cache.store(query_embedding, "".join(parts))
+
+    async def astream_response(self, user_query):
+        """
+        Async iterator variant of stream_response.
+        """
+        self.last_stream_stats = StreamStats()
+        query_embedding, answer, context = await run_cpu(self.prepare_response, user_query)
+        if answer is not None:
+            self.last_stream_stats.record(answer)
+            self.last_stream_stats.finish()
+            yield answer
+            return
+
+        parts = []
+        async for chunk in atimed_stream(self.chain.astream({"question": user_query, "context": context}), self.last_stream_stats):
+            parts.append(chunk)
+            yield chunk
+        if self.response_cache:
+            self.response_cache.store(query_embedding, "".join(parts))
+
     def handle_rag_conversation(self):
         
         print("RAG Assistant is ready! Type 'exit_rag' to quit questioning from the docs")
@@ -101,8 +390,8 @@ class RAGTool:
             user_input = input("You: ")
             if user_input.lower() == 'exit_rag':
                 break
-            response = self.rag_response(user_input)
-            print("RAG Bot: ", response)
+            print_stream("RAG Bot: ", self.stream_response(user_input))
+            print(f"({self.last_stream_stats.summary()})")
             
         return "continue"    
 
@@ -1,16 +1,29 @@
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.base import MIMEBase
-from email import encoders
-from datetime import datetime, timedelta
+import concurrent.futures
+from datetime import datetime
 from dotenv import load_dotenv
 import os
+from asyncrunner import ask_console
+from invites import Invite, new_uid, parse_recurrence
+from mailtransport import get_mail_transport
 
 # Load environment variables from the .env file
 load_dotenv()
 
 class MeetingTool:
+    # Questions asked for the meeting details, in the order set_details takes the answers
+    DETAIL_PROMPTS = [
+        ("recipients", "Enter recipient email addresses (comma separated): "),
+        ("agenda", "Enter the agenda for the meeting: "),
+        ("location", "Enter the meeting location: "),
+        ("date", "Enter the meeting date (DD/MM/YY): "),
+        ("time", "Enter the meeting time (HH:MM, 24-hour format): "),
+        ("duration", "Enter the meeting duration in minutes: "),
+        ("recurrence", "Repeat the meeting? (e.g. weekly 10, leave empty for a single meeting): "),
+    ]
+
+    # Invites to more recipients than this are sent as one copy per recipient
+    BULK_THRESHOLD = 10
+
     def __init__(self):
         self.recipients = []
         self.subject = "Meeting Invite"  # Hardcoded subject
@@ -18,10 +31,12 @@ class MeetingTool:
         self.location = ""
         self.start_time = None
         self.duration = 0
+        self.rrule = None
+        self.uid = None
         self.sender_email = os.getenv("EMAIL_USER") 
         self.sender_password = os.getenv("EMAIL_PASSWORD")
         self.smtp_server = os.getenv("SMTP_SERVER")
-        self.smtp_port = int(os.getenv("SMTP_PORT"))
+        self.smtp_port = os.getenv("SMTP_PORT")  # get_mail_transport parses it, 587 when unset
 
     def extract_intent(self, user_message):
         """
@@ -34,85 +49,90 @@ class MeetingTool:
 
     def get_user_input(self):
         """
-        Prompt the user for meeting details: recipients, agenda, location, date, time, and duration.
+        Prompt the user for meeting details: recipients, agenda, location, date, time, duration and recurrence.
         """
         # Collect meeting details from the user
-        recipients_input = input("Enter recipient email addresses (comma separated): ")
+        self.set_details(*[input(prompt) for _, prompt in self.DETAIL_PROMPTS])
+
+    def set_details(self, recipients_input, agenda, location, date_str, time_str, duration, recurrence=""):
+        """
+        Store the meeting details from the answers to DETAIL_PROMPTS. Every
+        call describes a new event, with a new UID.
+        """
         self.recipients = [email.strip() for email in recipients_input.split(",")]
         
-        self.agenda = input("Enter the agenda for the meeting: ")
-        self.location = input("Enter the meeting location: ")
+        self.agenda = agenda
+        self.location = location
 
         # Date and time for the meeting
-        date_str = input("Enter the meeting date (DD/MM/YY): ")
-        time_str = input("Enter the meeting time (HH:MM, 24-hour format): ")
         self.start_time = datetime.strptime(f"{date_str} {time_str}", "%d/%m/%y %H:%M")
 
         # Duration input
-        self.duration = int(input("Enter the meeting duration in minutes: "))
+        self.duration = int(duration)
+        self.rrule = parse_recurrence(recurrence)
+        self.uid = new_uid(self.sender_email)
+
+    def make_invite(self):
+        return Invite(
+            self.sender_email, self.subject, self.start_time, self.duration,
+            attendees=self.recipients, agenda=self.agenda, location=self.location,
+            rrule=self.rrule, uid=self.uid,
+        )
 
     def create_ics_content(self):
-        # Calculate the end time of the meeting
-        end_time = self.start_time + timedelta(minutes=self.duration)
-
-        # Format times for the .ics file in UTC format
-        start_time_str = self.start_time.strftime("%Y%m%dT%H%M%SZ")
-        end_time_str = end_time.strftime("%Y%m%dT%H%M%SZ")
-
-        # Create the .ics calendar invite content
-        ics_content = f"""BEGIN:VCALENDAR
-VERSION:2.0
-PRODID:-//Your Organization//Your Product//EN
-METHOD:REQUEST
-BEGIN:VEVENT
-UID:12345678@example.com
-DTSTAMP:{start_time_str}
-DTSTART:{start_time_str}
-DTEND:{end_time_str}
-SUMMARY:{self.subject}
-DESCRIPTION:{self.agenda}
-LOCATION:{self.location}
-STATUS:CONFIRMED
-SEQUENCE:0
-END:VEVENT
-END:VCALENDAR"""
-        return ics_content
+        # One ATTENDEE line per recipient
+        return self.make_invite().render_ics()
+
+    def build_invite(self):
+        # A single email to all recipients, listing all of them
+        return self.make_invite().build_message()
+
+    def invite_messages(self):
+        """
+        The emails to send: one to all recipients, or for large invites one
+        copy per recipient rendered from a template, listing only them.
+
+        Returns:
+            list: (message, from_addr, to_addrs) items for MailTransport.send_many.
+        """
+        if len(self.recipients) <= self.BULK_THRESHOLD:
+            return [(self.build_invite(), None, self.recipients)]
+        return list(self.make_invite().template(list_attendees=False).messages())
+
+    def get_transport(self):
+        # Pooled connections and background queue shared with the other mail tools
+        return get_mail_transport(self.smtp_server, self.smtp_port, self.sender_email, self.sender_password)
 
     def send_invite(self):
-        # Create email message
-        msg = MIMEMultipart("alternative")
-        msg["From"] = self.sender_email
-        msg["To"] = ", ".join(self.recipients)
-        msg["Subject"] = self.subject
-
-        # Attach the calendar invite (.ics)
-        ics_content = self.create_ics_content()
-        part = MIMEBase("text", "calendar", method="REQUEST", name="invite.ics")
-        part.set_payload(ics_content)
-        encoders.encode_base64(part)
-        part.add_header("Content-Disposition", "attachment; filename=invite.ics")
-        msg.attach(part)
-
-        # Add a simple text body (optional)
-        body = f"Hello,\n\nYou are invited to the following meeting:\n\nSubject: {self.subject}\nLocation: {self.location}\nStart Time: {self.start_time}\nDuration: {self.duration} minutes\n\nAgenda: {self.agenda}"
-        msg.attach(MIMEText(body, "plain"))
-
-        # Send the email
+        """
+        Send the invite in batches through the transport's workers and wait
+        until every batch is delivered or failed.
+
+        Returns:
+            list: Futures of the sent batches, see MailTransport.submit_many,
+                empty if the invite could not be queued.
+        """
         try:
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()  # Enable TLS
-                server.login(self.sender_email, self.sender_password)
-                server.sendmail(self.sender_email, self.recipients, msg.as_string())
-                print("Meeting invite sent successfully!")
+            futures = self.get_transport().submit_many(self.invite_messages())
         except Exception as e:
             print(f"Failed to send invite: {e}")
+            return []
+        print("Sending meeting invite...")
+        concurrent.futures.wait(futures)
+        report_delivery(futures)
+        return futures
             
-    def schedule(self, user_message):
-        
+    def schedule(self, user_message, intent=None):
+        """
+        Gather the meeting details and send the invite. `intent` is the
+        already classified intent; without it the message is checked here.
+        """
         user_input = user_message
 
         # Check for meeting intent
-        if self.extract_intent(user_input) == "schedule_meeting":
+        if intent is None:
+            intent = self.extract_intent(user_input)
+        if intent == "schedule_meeting":
             # If the intent is detected, gather meeting details
             self.get_user_input()
             
@@ -122,7 +142,50 @@ END:VCALENDAR"""
             print("No meeting intent detected.")
             
         return "continue"    
-     
+
+    async def aschedule(self, user_message, intent=None, ask=ask_console):
+        """
+        Async variant of schedule. The details are asked for through the `ask`
+        coroutine and the invite goes through the background send queue. The
+        details are kept on the tool, so each conversation needs its own MeetingTool.
+
+        Returns:
+            str: The outcome to show the user.
+        """
+        if intent is None:
+            intent = self.extract_intent(user_message)
+        if intent != "schedule_meeting":
+            return "No meeting intent detected."
+
+        answers = [await ask(prompt) for _, prompt in self.DETAIL_PROMPTS]
+        try:
+            self.set_details(*answers)
+        except ValueError as e:
+            return f"Invalid meeting details: {e}"
+
+        try:
+            results = await self.get_transport().asend_many(self.invite_messages())
+        except Exception as e:
+            return f"Failed to send invite: {e}"
+        errors = [error for error in results if error is not None]
+        if errors:
+            return f"Failed to send invite to {len(errors)} of {len(results)} recipients: {errors[0]}"
+        return "Meeting invite sent successfully!"
+
+
+def report_delivery(futures):
+    # Outcome of the batches of an invite
+    errors = []
+    for future in futures:
+        if future.exception() is not None:
+            errors.append(future.exception())
+        else:
+            errors.extend(error for error in future.result() if error is not None)
+    if errors:
+        print(f"\nFailed to send invite: {errors[0]}")
+    else:
+        print("\nMeeting invite sent successfully!")
+
 
 if __name__ == "__main__":
     meeting_tool = MeetingTool()
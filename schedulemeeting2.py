@@ -1,11 +1,12 @@
-import smtplib
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.base import MIMEBase
 from email import encoders
-from datetime import datetime, timedelta
+from datetime import datetime
 from dotenv import load_dotenv
 import os
+from invites import Invite, new_uid
+from mailtransport import get_mail_transport
 
 # Load environment variables from the .env file
 load_dotenv()
@@ -18,6 +19,7 @@ class MeetingTool:
         self.location = ""
         self.start_time = None
         self.duration = 0
+        self.uid = None
         self.sender_email = os.getenv("EMAIL_USER") 
         self.sender_password = os.getenv("EMAIL_PASSWORD")
         self.smtp_server = os.getenv("SMTP_SERVER")
@@ -40,35 +42,18 @@ class MeetingTool:
         time_str = input("Enter the meeting time (HH:MM, 24-hour format): ")
         self.start_time = datetime.strptime(f"{date_str} {time_str}", "%d/%m/%y %H:%M")
         self.duration = int(input("Enter the meeting duration in minutes: "))
+        self.uid = new_uid(self.sender_email)
 
     def create_ics_content(self):
-        end_time = self.start_time + timedelta(minutes=self.duration)
-        
-        # Convert to UTC format
-        start_time_str = self.start_time.strftime("%Y%m%dT%H%M%SZ")
-        end_time_str = end_time.strftime("%Y%m%dT%H%M%SZ")
-
-        # Create the .ics calendar invite content
-        ics_content = f"""BEGIN:VCALENDAR
-VERSION:2.0
-PRODID:-//Your Organization//Your Product//EN
-METHOD:REQUEST
-BEGIN:VEVENT
-UID:12345678@example.com
-DTSTAMP:{start_time_str}
-DTSTART:{start_time_str}
-DTEND:{end_time_str}
-SUMMARY:{self.subject}
-DESCRIPTION:{self.agenda}
-LOCATION:{self.location}
-STATUS:CONFIRMED
-ORGANIZER;CN="Organizer":MAILTO:{self.sender_email}
-ATTENDEE;CN="Attendee";RSVP=TRUE:MAILTO:{','.join(self.recipients)}
-END:VEVENT
-END:VCALENDAR"""
-        return ics_content
+        # Unique UID and one ATTENDEE line per recipient
+        invite = Invite(
+            self.sender_email, self.subject, self.start_time, self.duration,
+            attendees=self.recipients, agenda=self.agenda, location=self.location,
+            uid=self.uid, organizer_name="Organizer",
+        )
+        return invite.render_ics()
 
-    def send_invite(self):
+    def build_invite(self):
         msg = MIMEMultipart("mixed")
         msg["From"] = self.sender_email
         msg["To"] = ", ".join(self.recipients)
@@ -85,22 +70,24 @@ END:VCALENDAR"""
         encoders.encode_base64(part)
         part.add_header("Content-Disposition", "attachment; filename=invite.ics")
         msg.attach(part)
+        return msg
 
-        # Send the email
+    def send_invite(self):
+        # Send over the shared pooled SMTP connections
+        transport = get_mail_transport(self.smtp_server, self.smtp_port, self.sender_email, self.sender_password)
         try:
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()  # Enable TLS
-                server.login(self.sender_email, self.sender_password)
-                server.sendmail(self.sender_email, self.recipients, msg.as_string())
-                print("Meeting invite sent successfully!")
+            transport.send(self.build_invite(), to_addrs=self.recipients)
+            print("Meeting invite sent successfully!")
         except Exception as e:
             print(f"Failed to send invite: {e}")
             
-    def schedule(self, user_message):
+    def schedule(self, user_message, intent=None):
         
         user_input = user_message
 
-        if self.extract_intent(user_input) == "schedule_meeting":
+        if intent is None:
+            intent = self.extract_intent(user_input)
+        if intent == "schedule_meeting":
             self.get_user_input()
             self.send_invite()
         else:
@@ -0,0 +1,97 @@
+# Semantic response cache keyed on query embeddings
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class SemanticCache:
+    """
+    Caches LLM responses by the normalized embedding of the query. A lookup
+    hits when a stored query has a cosine similarity of at least `threshold`
+    with the new one, so rephrasings of the same FAQ share an answer.
+    Entries expire after `ttl` seconds and the least recently used entry is
+    evicted once `max_entries` are stored.
+    """
+
+    def __init__(self, threshold=0.92, ttl=3600, max_entries=256):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+
+        # Embeddings live in one preallocated matrix, entries map a row to
+        # (response, expiry time) in LRU order
+        self.embeddings = None
+        self.entries = OrderedDict()
+        self.free_rows = list(range(max_entries))
+
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, embedding):
+        """
+        Return the cached response for the most similar query, or None.
+
+        Args:
+            embedding (numpy.ndarray): Normalized query embedding.
+        """
+        embedding = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        with self.lock:
+            self._expire()
+            if self.entries:
+                rows = np.fromiter(self.entries.keys(), dtype=np.int64, count=len(self.entries))
+                similarities = self.embeddings[rows] @ embedding
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    row = int(rows[best])
+                    self.entries.move_to_end(row)
+                    self.hits += 1
+                    return self.entries[row][0]
+            self.misses += 1
+            return None
+
+    def store(self, embedding, response):
+        """
+        Cache a response under the normalized query embedding.
+        """
+        embedding = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        with self.lock:
+            if self.embeddings is None:
+                self.embeddings = np.zeros((self.max_entries, len(embedding)), dtype=np.float32)
+            self._expire()
+            if not self.free_rows:
+                # Evict the least recently used entry
+                row, _ = self.entries.popitem(last=False)
+                self.free_rows.append(row)
+            row = self.free_rows.pop()
+            self.embeddings[row] = embedding
+            self.entries[row] = (response, time.monotonic() + self.ttl)
+
+    def invalidate(self):
+        """
+        Drop every entry, e.g. because the documents behind the answers changed.
+        """
+        with self.lock:
+            self.entries.clear()
+            self.free_rows = list(range(self.max_entries))
+
+    def _expire(self):
+        now = time.monotonic()
+        expired = [row for row, (_, expires_at) in self.entries.items() if expires_at <= now]
+        for row in expired:
+            del self.entries[row]
+            self.free_rows.append(row)
+
+    def stats(self):
+        """
+        Hit/miss counters and the current size of the cache.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self.entries),
+        }
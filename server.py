@@ -0,0 +1,369 @@
+# HTTP/WebSocket front-end for the chatbot with per-session conversation state
+#
+# POST /chat   {"session_id": optional, "message": "..."}
+#              -> {"session_id": "...", "reply": "...", "awaiting_input": bool}
+# GET  /ws     WebSocket; every text message is a /chat request body (or
+#              plain text) and is answered with the same JSON as /chat
+# GET  /health
+# GET  /metrics  Prometheus metrics of the request stages (CHATBOT_TRACING=1)
+#
+# When a tool needs a follow-up value (an email address, meeting details, a
+# location) the reply is its question with "awaiting_input": true, and the
+# next message of the session is the answer. Sessions live in this process,
+# so a load balancer in front of several servers needs sticky sessions.
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import struct
+import time
+import uuid
+
+import tracing
+from chatbot import Chatbot
+
+MAX_BODY_BYTES = 1024 * 1024
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+SESSION_TTL = 30 * 60  # Seconds an idle session is kept
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large"}
+
+
+class Session:
+    """
+    State of one user's conversation. A conversation runs as a task; when a
+    tool asks a follow-up question the task waits on a future that the
+    session's next message resolves, so the conversation resumes where it
+    stopped instead of blocking on input().
+    """
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.task = None
+        self.answer = None  # Future for the pending follow-up question
+        self.events = asyncio.Queue()  # ("question" | "reply" | "error", text)
+        self.lock = asyncio.Lock()  # One turn at a time per session
+        self.last_seen = time.monotonic()
+
+    @property
+    def awaiting_input(self):
+        return self.answer is not None and not self.answer.done()
+
+    async def ask(self, prompt):
+        # Passed to the tools as their `ask` coroutine
+        self.answer = asyncio.get_running_loop().create_future()
+        self.events.put_nowait(("question", prompt))
+        return await self.answer
+
+    async def converse(self, chatbot, message):
+        try:
+            reply = await chatbot.ahandle_conversation(message, ask=self.ask)
+            self.events.put_nowait(("reply", reply))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.events.put_nowait(("error", f"Sorry, something went wrong: {e}"))
+
+    async def turn(self, chatbot, message):
+        """
+        Handle one message: answer the pending question or start a new
+        conversation, then wait for the next question or the final reply.
+
+        Returns:
+            tuple: (kind, text), kind being "question", "reply" or "error".
+        """
+        async with self.lock:
+            self.last_seen = time.monotonic()
+            if self.awaiting_input:
+                self.answer.set_result(message)
+            else:
+                self.task = asyncio.create_task(self.converse(chatbot, message))
+            event = await self.events.get()
+            self.last_seen = time.monotonic()
+            return event
+
+    def close(self):
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+            # Release a turn that is still waiting for the conversation
+            self.events.put_nowait(("error", "Session closed"))
+
+
+class ChatServer:
+    def __init__(self, chatbot, session_ttl=SESSION_TTL):
+        self.chatbot = chatbot
+        self.session_ttl = session_ttl
+        self.sessions = {}
+        self.routes = {
+            ("POST", "/chat"): self.handle_chat,
+            ("GET", "/health"): self.handle_health,
+            ("GET", "/metrics"): self.handle_metrics,
+        }
+
+    def get_session(self, session_id=None):
+        session = self.sessions.get(session_id) if session_id else None
+        if session is None:
+            session = Session(session_id or uuid.uuid4().hex)
+            self.sessions[session.session_id] = session
+        return session
+
+    def end_session(self, session_id):
+        session = self.sessions.pop(session_id, None)
+        if session is not None:
+            session.close()
+
+    async def expire_sessions(self):
+        while True:
+            await asyncio.sleep(60)
+            now = time.monotonic()
+            for session_id, session in list(self.sessions.items()):
+                if now - session.last_seen > self.session_ttl:
+                    self.end_session(session_id)
+
+    async def chat(self, request):
+        """
+        Run one chat turn for a /chat body or WebSocket message.
+
+        Returns:
+            tuple: (HTTP status, response dict)
+        """
+        message = request.get("message")
+        if not isinstance(message, str) or not message.strip():
+            return 400, {"error": "'message' must be a non-empty string"}
+        session = self.get_session(request.get("session_id"))
+
+        if message.strip().lower() == "exit":
+            self.end_session(session.session_id)
+            return 200, {"session_id": session.session_id, "reply": "Goodbye!", "awaiting_input": False}
+
+        kind, text = await session.turn(self.chatbot, message)
+        return 200, {"session_id": session.session_id, "reply": text, "awaiting_input": kind == "question"}
+
+    async def handle_chat(self, body):
+        try:
+            request = json.loads(body or b"{}")
+        except ValueError:
+            return 400, {"error": "Request body must be JSON"}
+        if not isinstance(request, dict):
+            return 400, {"error": "Request body must be a JSON object"}
+        return await self.chat(request)
+
+    async def handle_health(self, body):
+        return 200, {"status": "ok", "sessions": len(self.sessions)}
+
+    async def handle_metrics(self, body):
+        # Text rather than JSON; only the session gauge while tracing is off
+        sessions = f"{tracing.METRIC_PREFIX}open_sessions"
+        return 200, tracing.prometheus_text() + f"# TYPE {sessions} gauge\n{sessions} {len(self.sessions)}\n"
+
+    async def handle_client(self, reader, writer):
+        """
+        Serve one connection: HTTP/1.1 requests with keep-alive, or a
+        WebSocket after an upgrade request.
+        """
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                    break
+                method, path, version, headers = parse_request_head(head)
+                if method is None:
+                    await send_json(writer, 400, {"error": "Malformed request"}, keep_alive=False)
+                    break
+                path, _, query = path.partition("?")
+
+                if path == "/ws" and headers.get("upgrade", "").lower() == "websocket":
+                    await self.handle_websocket(reader, writer, headers, query)
+                    break
+
+                try:
+                    length = int(headers.get("content-length", 0) or 0)
+                except ValueError:
+                    await send_json(writer, 400, {"error": "Invalid Content-Length"}, keep_alive=False)
+                    break
+                if length > MAX_BODY_BYTES:
+                    await send_json(writer, 413, {"error": "Request body too large"}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                handler = self.routes.get((method, path))
+                if handler is None:
+                    allowed = any(route_path == path for _, route_path in self.routes)
+                    status, response = (405, {"error": "Method not allowed"}) if allowed else (404, {"error": "Not found"})
+                else:
+                    status, response = await handler(body)
+
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                if isinstance(response, str):
+                    await send_response(writer, status, response.encode(), METRICS_CONTENT_TYPE, keep_alive)
+                else:
+                    await send_json(writer, status, response, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def handle_websocket(self, reader, writer, headers, query):
+        key = headers.get("sec-websocket-key")
+        if not key:
+            await send_json(writer, 400, {"error": "Missing Sec-WebSocket-Key"}, keep_alive=False)
+            return
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+        writer.write(
+            "HTTP/1.1 101 Switching Protocols\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept}\r\n\r\n".encode()
+        )
+        await writer.drain()
+
+        # ?session_id=... resumes an existing session
+        params = dict(pair.partition("=")[::2] for pair in query.split("&") if pair)
+        session_id = self.get_session(params.get("session_id")).session_id
+
+        while True:
+            opcode, payload = await read_ws_message(reader, writer)
+            if opcode == 0x8:  # Close
+                await write_ws_frame(writer, 0x8, payload[:2])
+                return
+            if opcode != 0x1:
+                continue
+
+            text = payload.decode("utf-8", errors="replace")
+            try:
+                request = json.loads(text)
+            except ValueError:
+                request = {"message": text}
+            if not isinstance(request, dict):
+                request = {"message": text}
+            request.setdefault("session_id", session_id)
+            _, response = await self.chat(request)
+            await write_ws_frame(writer, 0x1, json.dumps(response).encode())
+
+
+def parse_request_head(head):
+    """
+    Split an HTTP request head into (method, path, version, headers), with
+    header names lower-cased. The method is None for a malformed head.
+    """
+    lines = head.decode("latin-1").split("\r\n")
+    parts = lines[0].split(" ")
+    if len(parts) != 3:
+        return None, None, None, {}
+    headers = {}
+    for line in lines[1:]:
+        name, sep, value = line.partition(":")
+        if sep:
+            headers[name.strip().lower()] = value.strip()
+    return parts[0], parts[1], parts[2], headers
+
+
+async def send_json(writer, status, payload, keep_alive=True):
+    await send_response(writer, status, json.dumps(payload).encode(), "application/json", keep_alive)
+
+
+async def send_response(writer, status, body, content_type, keep_alive=True):
+    writer.write(
+        (
+            f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        ).encode() + body
+    )
+    await writer.drain()
+
+
+async def read_ws_frame(reader):
+    header = await reader.readexactly(2)
+    fin = bool(header[0] & 0x80)
+    opcode = header[0] & 0x0F
+    masked = bool(header[1] & 0x80)
+    length = header[1] & 0x7F
+    if length == 126:
+        length = struct.unpack("!H", await reader.readexactly(2))[0]
+    elif length == 127:
+        length = struct.unpack("!Q", await reader.readexactly(8))[0]
+    if length > MAX_BODY_BYTES:
+        raise ConnectionError("WebSocket frame too large")
+    mask = await reader.readexactly(4) if masked else None
+    payload = await reader.readexactly(length)
+    if mask and length:
+        # XOR the whole payload with the repeated mask at once
+        repeated_mask = (mask * (length // 4 + 1))[:length]
+        payload = (int.from_bytes(payload, "big") ^ int.from_bytes(repeated_mask, "big")).to_bytes(length, "big")
+    return fin, opcode, payload
+
+
+async def read_ws_message(reader, writer):
+    """
+    Read one WebSocket message, joining continuation frames and answering
+    pings on the way.
+
+    Returns:
+        tuple: (opcode, payload), with the opcode of the first frame.
+    """
+    opcode, parts, size = None, [], 0
+    while True:
+        fin, frame_opcode, payload = await read_ws_frame(reader)
+        if frame_opcode == 0x9:  # Ping
+            await write_ws_frame(writer, 0xA, payload)
+            continue
+        if frame_opcode == 0x8:  # Close
+            return frame_opcode, payload
+        if frame_opcode == 0xA:  # Unsolicited pong
+            continue
+        if opcode is None:
+            opcode = frame_opcode
+        parts.append(payload)
+        size += len(payload)
+        if size > MAX_BODY_BYTES:
+            raise ConnectionError("WebSocket message too large")
+        if fin:
+            return opcode, b"".join(parts)
+
+
+async def write_ws_frame(writer, opcode, payload):
+    length = len(payload)
+    if length < 126:
+        header = struct.pack("!BB", 0x80 | opcode, length)
+    elif length < 2**16:
+        header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+    writer.write(header + payload)
+    await writer.drain()
+
+
+async def serve(host, port, prewarm=True):
+    chat_server = ChatServer(Chatbot(prewarm=prewarm))
+    server = await asyncio.start_server(chat_server.handle_client, host, port)
+    expiry = asyncio.create_task(chat_server.expire_sessions())
+    print(f"Chatbot server listening on http://{host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        expiry.cancel()
+        await chat_server.chatbot.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the chatbot over HTTP and WebSocket")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--no-prewarm", action="store_true", help="Build every tool on first use")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, prewarm=not args.no_prewarm))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+# Parsed OpenAPI specs and an index over their operations
+import bisect
+import glob
+import os
+import pickle
+import re
+
+import numpy as np
+import yaml
+
+SPEC_DIR = "swagger_specs"
+SPEC_PATTERNS = ("*.yaml", "*.yml", "*.json")
+CACHE_SUFFIX = ".pickle"
+CACHE_VERSION = 1
+HTTP_METHODS = ("get", "put", "post", "delete", "options", "head", "patch", "trace")
+
+# The C loader is several times faster when PyYAML was built with libyaml
+SpecLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+def load_spec(path):
+    """
+    Parse one spec file. The parsed form is pickled next to the file and
+    reused until the file's mtime or size changes.
+    """
+    stat = os.stat(path)
+    signature = (CACHE_VERSION, stat.st_mtime_ns, stat.st_size)
+    cache_path = path + CACHE_SUFFIX
+    try:
+        with open(cache_path, "rb") as f:
+            cached = pickle.load(f)
+        if cached["signature"] == signature:
+            return cached["spec"]
+    except (OSError, pickle.UnpicklingError, EOFError, KeyError, TypeError):
+        pass
+
+    with open(path, "r") as f:
+        spec = yaml.load(f, Loader=SpecLoader)  # JSON is valid YAML
+    try:
+        with open(cache_path + ".tmp", "wb") as f:
+            pickle.dump({"signature": signature, "spec": spec}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(cache_path + ".tmp", cache_path)
+    except OSError as e:
+        print(f"Could not cache {path}: {e}")
+    return spec
+
+
+def load_specs(spec_dir=SPEC_DIR):
+    """
+    Parse every spec in the folder.
+
+    Returns:
+        dict: Spec name (the file name without extension) to parsed spec.
+    """
+    paths = sorted(path for pattern in SPEC_PATTERNS for path in glob.glob(os.path.join(spec_dir, pattern)))
+    return {os.path.splitext(os.path.basename(path))[0]: load_spec(path) for path in paths}
+
+
+def resolve_ref(spec, item):
+    # Local references only, e.g. "#/components/parameters/key"
+    while isinstance(item, dict) and "$ref" in item:
+        node = spec
+        for part in item["$ref"].lstrip("#/").split("/"):
+            node = node[part]
+        item = node
+    return item
+
+
+def split_identifier(name):
+    # "getWeatherForecast" -> "get Weather Forecast"
+    return re.sub(r"(?<=[a-z0-9])(?=[A-Z])|[_\-]+", " ", name)
+
+
+def spec_operations(name, spec):
+    """
+    Flatten a spec into one dict per operation, with path-level parameters
+    merged into the operation's own and references resolved.
+    """
+    servers = spec.get("servers") or [{"url": ""}]
+    operations = []
+    for path, path_item in (spec.get("paths") or {}).items():
+        path_item = resolve_ref(spec, path_item)
+        shared_parameters = [resolve_ref(spec, param) for param in path_item.get("parameters", [])]
+        for method in HTTP_METHODS:
+            details = path_item.get(method)
+            if details is None:
+                continue
+            parameters = {(param["name"], param["in"]): param for param in shared_parameters}
+            for param in details.get("parameters", []):
+                param = resolve_ref(spec, param)
+                parameters[(param["name"], param["in"])] = param
+            operation_id = details.get("operationId") or f"{method} {path}"
+            operations.append({
+                "operation_id": operation_id,
+                "spec": name,
+                "base_url": servers[0]["url"],
+                "method": method,
+                "path": path,
+                "summary": details.get("summary", ""),
+                "description": details.get("description", ""),
+                "parameters": list(parameters.values()),
+                "details": details,
+            })
+    return operations
+
+
+class OperationIndex:
+    """
+    Index over the operations of all specs: lookup by operationId is a
+    binary search over the sorted ids, and selecting the operation for a
+    message is a single matrix-vector product against the normalized
+    embeddings of the operation summaries.
+    """
+
+    def __init__(self, specs, embedding_model=None):
+        """
+        Parameters:
+            specs (dict): Spec name to parsed spec, as returned by load_specs.
+            embedding_model (SentenceTransformer): Model for the summary embeddings.
+                Without it, operations are matched by the words they share with the message.
+        """
+        operations = [operation for name, spec in specs.items() for operation in spec_operations(name, spec)]
+        operations.sort(key=lambda operation: operation["operation_id"])
+        self.operations = operations
+        self.operation_ids = [operation["operation_id"] for operation in operations]
+        for previous, current in zip(self.operation_ids, self.operation_ids[1:]):
+            if previous == current:
+                print(f"Warning: operationId {current} is defined more than once")
+
+        self.texts = [
+            " ".join(filter(None, [operation["summary"], operation["description"], split_identifier(operation["operation_id"])]))
+            for operation in operations
+        ]
+        self.embedding_model = embedding_model
+        self.embeddings = None
+        if embedding_model is not None and operations:
+            self.embeddings = np.asarray(embedding_model.encode(self.texts, normalize_embeddings=True), dtype=np.float32)
+
+    def __len__(self):
+        return len(self.operations)
+
+    def get(self, operation_id):
+        """
+        Return the operation with the given operationId, or None.
+        """
+        row = bisect.bisect_left(self.operation_ids, operation_id)
+        if row < len(self.operation_ids) and self.operation_ids[row] == operation_id:
+            return self.operations[row]
+        return None
+
+    def search(self, query, k=1, method=None, spec=None, embedding=None):
+        """
+        Rank the operations by how well their summary matches the query.
+
+        Args:
+            query (str): The user's message.
+            k (int): Number of operations to return.
+            method (str): Only consider operations with this HTTP method.
+            spec (str): Only consider operations of this spec.
+            embedding (numpy.ndarray): Normalized embedding of the query, if already computed.
+
+        Returns:
+            list: (score, operation) pairs, best first.
+        """
+        if not self.operations:
+            return []
+        if self.embeddings is not None:
+            if embedding is None:
+                embedding = self.embedding_model.encode([query], normalize_embeddings=True)
+            scores = self.embeddings @ np.asarray(embedding, dtype=np.float32).reshape(-1)
+        else:
+            words = set(re.findall(r"\w+", query.lower()))
+            scores = np.array([
+                len(words & set(re.findall(r"\w+", text.lower()))) / (len(words) or 1)
+                for text in self.texts
+            ], dtype=np.float32)
+
+        mask = np.ones(len(self.operations), dtype=bool)
+        if method is not None:
+            mask &= np.array([operation["method"] == method for operation in self.operations])
+        if spec is not None:
+            mask &= np.array([operation["spec"] == spec for operation in self.operations])
+        scores = np.where(mask, scores, -np.inf)
+
+        best = np.argsort(-scores)[:k]
+        return [(float(scores[row]), self.operations[row]) for row in best if mask[row]]
+
+
+def build_operation_index(spec_dir=SPEC_DIR, embedding_model=None):
+    return OperationIndex(load_specs(spec_dir), embedding_model)
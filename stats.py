@@ -0,0 +1,19 @@
+# Summary statistics shared by the batch runner and the benchmark scripts
+
+
+def percentile(values, fraction):
+    """
+    The value below which `fraction` of the values fall (nearest rank).
+
+    Args:
+        values (list): Latencies or other samples, in any order.
+        fraction (float): 0.5 for the median, 0.95 for p95 and so on.
+
+    Returns:
+        The sample at that rank, or NaN when there are no samples (e.g.
+        every request of a benchmark run failed).
+    """
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
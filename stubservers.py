@@ -0,0 +1,365 @@
+# Local stand-ins for the external services, for testing and load tests
+#
+#   python stubservers.py weather --port 8081
+#   WEATHER_API_BASE_URL=http://127.0.0.1:8081/v1 python chatbot.py
+#   python stubservers.py smtp --port 8025
+#   SMTP_SERVER=127.0.0.1 SMTP_PORT=8025 python chatbot.py
+#   python stubservers.py ollama --port 11435 --delay 0.2
+#   OLLAMA_BASE_URL=http://127.0.0.1:11435 python chatbot.py
+import argparse
+import datetime
+import json
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class StubServer:
+    """
+    Runs a threading server in a background thread. Usable as a context
+    manager; `url` is the base URL of a running HTTP stub.
+    """
+
+    def __init__(self, handler_class, host="127.0.0.1", port=0, delay=0.0, server_class=ThreadingHTTPServer):
+        self.delay = delay  # Seconds the handlers add to every response
+        self.httpd = server_class((host, port), handler_class)
+        self.httpd.daemon_threads = True
+        self.httpd.stub = self
+        self.thread = None
+        self.lock = threading.Lock()
+        self.request_count = 0
+
+    @property
+    def address(self):
+        return self.httpd.server_address[:2]
+
+    @property
+    def url(self):
+        host, port = self.address
+        return f"http://{host}:{port}"
+
+    def count_request(self):
+        with self.lock:
+            self.request_count += 1
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class WeatherStubHandler(BaseHTTPRequestHandler):
+    """
+    Answers /current.json and /forecast.json (under any prefix, e.g. /v1)
+    with weatherapi.com-shaped JSON derived from the `q` parameter.
+    """
+
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real API
+    disable_nagle_algorithm = True  # Headers and body are written separately
+
+    def do_GET(self):
+        stub = self.server.stub
+        stub.count_request()
+        if stub.delay:
+            time.sleep(stub.delay)
+
+        url = urlparse(self.path)
+        params = {name: values[0] for name, values in parse_qs(url.query).items()}
+        if not params.get("key"):
+            return self.send_json(401, {"error": {"code": 1002, "message": "API key is invalid or not provided."}})
+        location = params.get("q")
+        if not location:
+            return self.send_json(400, {"error": {"code": 1003, "message": "Parameter q is missing."}})
+
+        payload = {
+            "location": {"name": location.title(), "region": "Stub Region", "country": "Stub Country"},
+            "current": {"temp_c": 21.0, "condition": {"text": "Sunny"}, "humidity": 40, "wind_kph": 12.0},
+        }
+        if url.path.endswith("/forecast.json"):
+            days = int(params.get("days", 1))
+            today = datetime.date.today()
+            payload["forecast"] = {"forecastday": [
+                {
+                    "date": (today + datetime.timedelta(days=offset)).isoformat(),
+                    "day": {"maxtemp_c": 24.0, "mintemp_c": 14.0, "condition": {"text": "Partly cloudy"}},
+                }
+                for offset in range(days)
+            ]}
+        elif not url.path.endswith("/current.json"):
+            return self.send_json(404, {"error": {"code": 1005, "message": "API request url is invalid."}})
+        self.send_json(200, payload)
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def weather_stub(host="127.0.0.1", port=0, delay=0.0):
+    """
+    Stub of the weather API. `delay` adds latency to every response; the
+    API base URL to configure is `stub.url + "/v1"`.
+    """
+    return StubServer(WeatherStubHandler, host, port, delay)
+
+
+class OllamaStubHandler(BaseHTTPRequestHandler):
+    """
+    Answers the Ollama generate and chat APIs with a canned reply of
+    `stub.tokens` tokens, streamed as NDJSON unless the request sets
+    "stream": false. The reply depends only on the prompt, so runs are
+    repeatable. `stub.delay` plus `stub.prompt_token_delay` per prompt word
+    is the time to the first token, like a model's prefill, and
+    `stub.token_delay` the time between tokens.
+    """
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        if self.path.startswith("/api/tags"):
+            return self.send_json(200, {"models": [{"name": "stub:latest", "model": "stub:latest"}]})
+        if self.path.startswith("/api/version"):
+            return self.send_json(200, {"version": "0.0.0-stub"})
+        self.send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        stub = self.server.stub
+        stub.count_request()
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        except ValueError:
+            return self.send_json(400, {"error": "invalid JSON"})
+
+        if self.path.startswith("/api/generate"):
+            prompt = request.get("prompt", "")
+            make_part = lambda text: {"response": text}
+        elif self.path.startswith("/api/chat"):
+            prompt = " ".join(message.get("content", "") for message in request.get("messages", []))
+            make_part = lambda text: {"message": {"role": "assistant", "content": text}}
+        else:
+            return self.send_json(404, {"error": "not found"})
+
+        model = request.get("model", "stub")
+        tokens = stub.reply_tokens(prompt)
+        done = {
+            "done": True,
+            "done_reason": "stop",
+            "prompt_eval_count": len(prompt.split()),
+            "eval_count": len(tokens),
+        }
+        prefill = stub.delay + stub.prompt_token_delay * done["prompt_eval_count"]
+        if prefill:
+            time.sleep(prefill)
+
+        if request.get("stream", True) is False:
+            time.sleep(stub.token_delay * len(tokens))
+            return self.send_json(200, {"model": model, **make_part("".join(tokens)), **done})
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, token in enumerate(tokens):
+            if i and stub.token_delay:
+                time.sleep(stub.token_delay)
+            self.write_chunk({"model": model, **make_part(token), "done": False})
+        self.write_chunk({"model": model, **make_part(""), **done})
+        self.wfile.write(b"0\r\n\r\n")
+
+    def write_chunk(self, payload):
+        line = json.dumps(payload).encode() + b"\n"
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class OllamaStub(StubServer):
+    """
+    Stub of the Ollama server; point OLLAMA_BASE_URL at `stub.url`.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, delay=0.0, token_delay=0.0, tokens=32, prompt_token_delay=0.0):
+        super().__init__(OllamaStubHandler, host, port, delay)
+        self.token_delay = token_delay
+        self.tokens = tokens
+        self.prompt_token_delay = prompt_token_delay
+
+    def reply_tokens(self, prompt):
+        words = prompt.split()[-8:] or ["nothing"]
+        return [f" {words[i % len(words)]}" if i else "Stub" for i in range(self.tokens)]
+
+
+def ollama_stub(host="127.0.0.1", port=0, delay=0.0, token_delay=0.0, tokens=32, prompt_token_delay=0.0):
+    """
+    Stub of the Ollama server. `delay` is the time to the first token,
+    `token_delay` the time per further token and `prompt_token_delay` the
+    prefill time per prompt word.
+    """
+    return OllamaStub(host, port, delay, token_delay, tokens, prompt_token_delay)
+
+
+class ThreadingSMTPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class SMTPStubHandler(socketserver.StreamRequestHandler):
+    """
+    Minimal ESMTP server: EHLO/HELO, AUTH PLAIN/LOGIN (accepting any
+    credentials), MAIL, RCPT, DATA, NOOP, RSET and QUIT. Received messages
+    are kept in `stub.messages`. No STARTTLS is offered, so clients must
+    only upgrade when the server advertises it.
+    """
+
+    disable_nagle_algorithm = True
+
+    def reply(self, *lines):
+        text = "".join(f"{line[:3]}{'-' if i < len(lines) - 1 else ' '}{line[4:]}\r\n" for i, line in enumerate(lines))
+        self.wfile.write(text.encode())
+
+    def handle(self):
+        stub = self.server.stub
+        mail_from, recipients = None, []
+        self.reply("220 stub ESMTP ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command, _, argument = line.decode("utf-8", "replace").rstrip("\r\n").partition(" ")
+            command = command.upper()
+
+            if command == "EHLO":
+                self.reply("250 stub", "250 AUTH PLAIN LOGIN", "250 8BITMIME", "250 SIZE 52428800")
+            elif command == "HELO":
+                self.reply("250 stub")
+            elif command == "AUTH":
+                if argument.upper().startswith("LOGIN"):
+                    self.reply("334 VXNlcm5hbWU6")
+                    self.rfile.readline()
+                    self.reply("334 UGFzc3dvcmQ6")
+                    self.rfile.readline()
+                stub.count_login()
+                self.reply("235 Authentication successful")
+            elif command == "MAIL":
+                mail_from, recipients = argument.partition(":")[2].strip(), []
+                self.reply("250 OK")
+            elif command == "RCPT":
+                recipients.append(argument.partition(":")[2].strip())
+                self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = bytearray()
+                while True:
+                    data_line = self.rfile.readline()
+                    if not data_line or data_line == b".\r\n":
+                        break
+                    # Undo dot-stuffing
+                    data += data_line[1:] if data_line.startswith(b"..") else data_line
+                stub.count_request()
+                if stub.delay:
+                    time.sleep(stub.delay)
+                if stub.take_failure():
+                    self.reply("451 Temporary failure, try again")
+                else:
+                    stub.store_message(mail_from, recipients, bytes(data))
+                    self.reply("250 OK queued")
+                mail_from, recipients = None, []
+            elif command in ("NOOP", "RSET"):
+                if command == "RSET":
+                    mail_from, recipients = None, []
+                self.reply("250 OK")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class SMTPStub(StubServer):
+    """
+    Stub SMTP server. `fail_next` makes that many DATA commands fail with a
+    temporary 451 error, to exercise retries.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, delay=0.0):
+        super().__init__(SMTPStubHandler, host, port, delay, server_class=ThreadingSMTPServer)
+        self.messages = []
+        self.logins = 0
+        self.fail_next = 0
+
+    def count_login(self):
+        with self.lock:
+            self.logins += 1
+
+    def take_failure(self):
+        with self.lock:
+            if self.fail_next > 0:
+                self.fail_next -= 1
+                return True
+            return False
+
+    def store_message(self, mail_from, recipients, data):
+        with self.lock:
+            self.messages.append({"from": mail_from, "to": recipients, "data": data})
+
+
+def smtp_stub(host="127.0.0.1", port=0, delay=0.0):
+    """
+    Stub of the SMTP server; point SMTP_SERVER/SMTP_PORT at `stub.address`.
+    """
+    return SMTPStub(host, port, delay)
+
+
+STUBS = {
+    "weather": weather_stub,
+    "smtp": smtp_stub,
+    "ollama": ollama_stub,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a stub of an external service")
+    parser.add_argument("service", choices=sorted(STUBS))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds added to every response")
+    args = parser.parse_args()
+
+    stub = STUBS[args.service](args.host, args.port, delay=args.delay)
+    print(f"{args.service} stub listening on {stub.address[0]}:{stub.address[1]}")
+    try:
+        stub.httpd.serve_forever()
+    except KeyboardInterrupt:
+        stub.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
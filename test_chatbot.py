@@ -1,4 +1,7 @@
+# Prints the answers to the benchmark queries; for latency and throughput
+# numbers run "python benchmark.py"
 import time  # Import the time module for response time measurement
+from benchmark_queries import QUERY_SETS  # The queries shared with the benchmark suites
 from generictool import GenericTool  # Generic Tool handler
 from ragtool import RAGTool  # RAG Tool handler
 
@@ -13,24 +16,18 @@ def test_generic_tool():
     generic_tool = GenericTool() 
     
     
-    test_queries = [
-        "Hello!",
-        "How's the weather today?",
-        "What's your favorite color?",
-        "Tell me a joke.",
-        "What are you?"
-    ]
+    test_queries = QUERY_SETS["generic"]
     for query in test_queries:
         print(f"\nUser: {query}")
         
         # Start the timer
-        start_time = time.time()
+        start_time = time.perf_counter()
         
         # Simulate the Generic Tool response
         response = generic_tool.get_response(query)
         
         # Stop the timer
-        end_time = time.time()
+        end_time = time.perf_counter()
         
         # Calculate the elapsed time
         response_time = end_time - start_time
@@ -48,31 +45,18 @@ def test_rag_tool():
     # Create an instance of RAGTool
     rag_tool = RAGTool() 
     
-    test_queries = [
-        "What is Cassandra?",
-        "What are the differences between Cassandra and Dynamo?",
-        "what is spring boot?",
-        "What is Angular?",
-        "What files and folder structure does ng new generate by default, and why are they important?",
-        "how to Create Spring Cloud Configuration Server?",
-        "Can I run multiple Angular projects simultaneously on the same machine? If so, how?",
-        "What are the benefits of Ahead-of-Time (AOT) compilation, and when should it be used?",
-        "What API methods does Cassandra provide?",
-        "What is application runner?",
-        "How does Cassandra handle high availability?",
-        "when is interceptor used in spring boot?"
-    ]
+    test_queries = QUERY_SETS["rag"]
     for query in test_queries:
         print(f"\nUser: {query}")
         
         # Start the timer
-        start_time = time.time()
+        start_time = time.perf_counter()
         
         # Simulate the RAG Tool response
         response = rag_tool.rag_response(query)
         
         # Stop the timer
-        end_time = time.time()
+        end_time = time.perf_counter()
         
         # Calculate the elapsed time
         response_time = end_time - start_time
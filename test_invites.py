@@ -0,0 +1,23 @@
+# Checks of the recurrence answers the meeting tool turns into RRULE values
+from invites import parse_recurrence
+
+
+def test_interval_without_count():
+    """
+    "every 2 weeks" repeats every other week with no end.
+    """
+    assert parse_recurrence("every 2 weeks") == "FREQ=WEEKLY;INTERVAL=2"
+
+
+def test_count():
+    assert parse_recurrence("weekly 10") == "FREQ=WEEKLY;COUNT=10"
+
+
+def test_interval_and_count():
+    assert parse_recurrence("every 2 weeks 6") == "FREQ=WEEKLY;INTERVAL=2;COUNT=6"
+    assert parse_recurrence("every 2 weeks for 6 times") == "FREQ=WEEKLY;INTERVAL=2;COUNT=6"
+
+
+def test_single_meeting():
+    assert parse_recurrence("") is None
+    assert parse_recurrence("no") is None
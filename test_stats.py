@@ -0,0 +1,18 @@
+# Checks of the percentile helper used by the benchmarks and the batch summary
+import math
+
+from stats import percentile
+
+
+def test_nearest_rank():
+    values = [5, 1, 4, 2, 3]
+    assert percentile(values, 0.5) == 3
+    assert percentile(values, 0.95) == 5
+    assert percentile(values, 0) == 1
+
+
+def test_no_samples():
+    """
+    A run where every request failed has no latencies to summarize.
+    """
+    assert math.isnan(percentile([], 0.5))
@@ -0,0 +1,270 @@
+# Spans, counters and a per-request trace log for the stages of a chat turn
+#
+#   CHATBOT_TRACING=1 python server.py     # metrics at GET /metrics, traces in traces.jsonl
+#   CHATBOT_TRACE_LOG=/tmp/traces.jsonl    # where traces are written ("" to keep metrics only)
+#
+# When tracing is off, span() returns a shared no-op object, so an
+# instrumented stage costs one global lookup and a function call.
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+import uuid
+
+ENABLED = os.getenv("CHATBOT_TRACING", "").lower() in ("1", "true", "yes", "on")
+TRACE_LOG = os.getenv("CHATBOT_TRACE_LOG", "traces.jsonl")
+METRIC_PREFIX = "chatbot_"
+
+# Finer than the HTTP client's buckets at the low end, where routing, NER and FAISS searches land
+STAGE_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, float("inf"))
+
+# (trace, id of the active span) of the running request, if any
+_current = contextvars.ContextVar("chatbot_trace", default=None)
+_span_ids = itertools.count(1)
+_histograms = {}  # stage -> LatencyHistogram
+_counters = {}  # (name, sorted label items) -> value
+_metrics_lock = threading.Lock()
+_log_lock = threading.Lock()
+
+
+def enable(trace_log=None):
+    """
+    Turn tracing on in this process, e.g. for a benchmark run. Spans
+    already running when it is called are not recorded.
+    """
+    global ENABLED, TRACE_LOG
+    ENABLED = True
+    if trace_log is not None:
+        TRACE_LOG = trace_log
+
+
+def disable():
+    global ENABLED
+    ENABLED = False
+
+
+class Trace:
+    """
+    The spans of one request, written to the trace log as one JSON line
+    when the request's root span ends.
+    """
+
+    def __init__(self, name):
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.started_at = time.time()
+        self.start_time = time.perf_counter()
+        self.lock = threading.Lock()  # Stages of one request may run in the CPU pool
+        self.spans = []
+
+    def add(self, span, duration, error):
+        entry = {
+            "span_id": span.span_id,
+            "parent_id": span.parent_id,
+            "name": span.name,
+            "start_ms": round((span.start_time - self.start_time) * 1000, 3),
+            "duration_ms": round(duration * 1000, 3),
+        }
+        if span.attributes:
+            entry["attributes"] = span.attributes
+        if error is not None:
+            entry["error"] = error
+        with self.lock:
+            self.spans.append(entry)
+
+    def write(self):
+        if not TRACE_LOG:
+            return
+        with self.lock:
+            spans = sorted(self.spans, key=lambda entry: entry["start_ms"])
+        line = json.dumps({"trace_id": self.trace_id, "name": self.name, "started_at": self.started_at, "spans": spans}, default=str)
+        with _log_lock, open(TRACE_LOG, "a") as f:
+            f.write(line + "\n")
+
+
+class Span:
+    """
+    One timed stage. Used as a context manager, it becomes the parent of
+    the spans started inside it; start(activate=False) and finish() time a
+    stage whose start and end are reported by callbacks instead.
+    """
+
+    def __init__(self, name, attributes, root=False):
+        self.name = name
+        self.attributes = attributes
+        self.root = root
+        self.span_id = next(_span_ids)
+        self.parent_id = None
+        self.trace = None
+        self.owns_trace = False
+        self.token = None
+        self.start_time = None
+        self.error = None
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def fail(self, error):
+        # Mark the stage as failed without an exception, e.g. an error response
+        self.error = str(error)
+
+    def start(self, activate=True):
+        current = _current.get()
+        if current is not None:
+            self.trace, self.parent_id = current
+        elif self.root:
+            self.trace = Trace(self.name)
+            self.owns_trace = True
+        if activate and self.trace is not None:
+            self.token = _current.set((self.trace, self.span_id))
+        self.start_time = time.perf_counter()
+        return self
+
+    def finish(self, error=None):
+        error = error or self.error
+        duration = time.perf_counter() - self.start_time
+        if self.token is not None:
+            _current.reset(self.token)
+            self.token = None
+        record(self.name, duration, error=error is not None)
+        if self.trace is not None:
+            self.trace.add(self, duration, error)
+            if self.owns_trace:
+                self.trace.write()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.finish(f"{exc_type.__name__}: {exc}" if exc_type is not None else None)
+        return False
+
+
+class NullSpan:
+    """
+    Stand-in for Span while tracing is off.
+    """
+
+    def set(self, key, value):
+        pass
+
+    def fail(self, error):
+        pass
+
+    def start(self, activate=True):
+        return self
+
+    def finish(self, error=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+def span(name, **attributes):
+    """
+    Time a stage of the current request, e.g. `with span("faiss_search", k=3):`.
+    Outside a request the stage only updates the metrics.
+    """
+    if not ENABLED:
+        return NULL_SPAN
+    return Span(name, attributes)
+
+
+def trace(name, **attributes):
+    """
+    Root span of a request: the spans started inside it are written to the
+    trace log together when it ends.
+    """
+    if not ENABLED:
+        return NULL_SPAN
+    return Span(name, attributes, root=True)
+
+
+def record(stage, seconds, error=False):
+    """
+    Add a stage duration measured elsewhere to the metrics.
+    """
+    histogram = _histograms.get(stage)
+    if histogram is None:
+        # Imported on first use, it pulls in requests
+        from httpclient import LatencyHistogram
+        with _metrics_lock:
+            histogram = _histograms.setdefault(stage, LatencyHistogram(STAGE_BUCKETS_MS))
+    histogram.observe(seconds * 1000, error=error)
+
+
+def count(name, value=1, **labels):
+    """
+    Increase a counter, e.g. count("llm_completion_tokens_total", 120, model="orca-mini").
+    """
+    if not ENABLED:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _metrics_lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def reset():
+    with _metrics_lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def format_labels(labels):
+    return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in labels) + "}" if labels else ""
+
+
+def format_bound(bound_ms):
+    return "+Inf" if bound_ms == float("inf") else repr(bound_ms / 1000)
+
+
+def prometheus_text():
+    """
+    All metrics in the Prometheus text exposition format: a duration
+    histogram and an error counter per stage, then the counters.
+    """
+    with _metrics_lock:
+        histograms = sorted(_histograms.items())
+        counters = sorted(_counters.items())
+
+    duration = f"{METRIC_PREFIX}stage_duration_seconds"
+    errors = f"{METRIC_PREFIX}stage_errors_total"
+    lines = [
+        f"# HELP {duration} Time spent in each stage of a request.",
+        f"# TYPE {duration} histogram",
+    ]
+    error_lines = [f"# HELP {errors} Stages that ended with an error.", f"# TYPE {errors} counter"]
+    for stage, histogram in histograms:
+        with histogram.lock:
+            counts, total, total_ms, stage_errors = list(histogram.counts), histogram.count, histogram.total_ms, histogram.errors
+        label = escape_label(stage)
+        cumulative = 0
+        for bound, bucket_count in zip(histogram.BUCKETS_MS, counts):
+            cumulative += bucket_count
+            lines.append(f'{duration}_bucket{{stage="{label}",le="{format_bound(bound)}"}} {cumulative}')
+        lines.append(f'{duration}_sum{{stage="{label}"}} {total_ms / 1000}')
+        lines.append(f'{duration}_count{{stage="{label}"}} {total}')
+        error_lines.append(f'{errors}{{stage="{label}"}} {stage_errors}')
+    lines += error_lines
+
+    typed = set()
+    for (name, labels), value in counters:
+        metric = METRIC_PREFIX + name
+        if metric not in typed:
+            lines.append(f"# TYPE {metric} counter")
+            typed.add(metric)
+        lines.append(f"{metric}{format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"